@@ -0,0 +1,94 @@
+"""Per-user catch aggregates, kept current as catches are written so reading them costs O(buckets).
+
+Every catch counts once in each dimension it has a value for. A bucket row
+holds the number of catches plus size and weight totals, so averages come
+straight from the row without rescanning a user's history.
+"""
+import math
+import os
+
+DIMENSIONS = ('moon_phase', 'tide', 'lure', 'month', 'hour', 'location')
+TIDE_BUCKET_FT = float(os.environ.get('ANALYTICS_TIDE_BUCKET_FT', 1.0))
+LOCATION_GRID = float(os.environ.get('ANALYTICS_LOCATION_GRID', 0.05))
+MOON_ORDER = ('New Moon', 'Waxing Crescent', 'First Quarter', 'Waxing Gibbous', 'Full Moon',
+              'Waning Gibbous', 'Last Quarter', 'Waning Crescent')
+UPSERT_STATS = '''INSERT INTO catch_stats (user_id, dimension, bucket, catches, sized, size_total, weighed, weight_total)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, dimension, bucket) DO UPDATE SET
+        catches = catch_stats.catches + excluded.catches,
+        sized = catch_stats.sized + excluded.sized,
+        size_total = catch_stats.size_total + excluded.size_total,
+        weighed = catch_stats.weighed + excluded.weighed,
+        weight_total = catch_stats.weight_total + excluded.weight_total'''
+
+def tide_bucket(tide_ft):
+    """Return the lower edge of a tide height's TIDE_BUCKET_FT-wide bucket as text, or None."""
+    if tide_ft is None:
+        return None
+    return f"{math.floor(tide_ft / TIDE_BUCKET_FT) * TIDE_BUCKET_FT:g}"
+
+def location_bucket(latitude, longitude):
+    """Return the centre of the LOCATION_GRID cell a catch falls in as 'lat,lon', or None."""
+    if latitude is None or longitude is None:
+        return None
+    return f"{round(latitude / LOCATION_GRID) * LOCATION_GRID:.2f},{round(longitude / LOCATION_GRID) * LOCATION_GRID:.2f}"
+
+def catch_buckets(caught_at, moon_phase, tide_ft, lure, latitude, longitude):
+    """Return the (dimension, bucket) pairs a catch counts towards, starting with its user's total."""
+    lure = ' '.join(str(lure or '').split()).lower()
+    pairs = (
+        ('total', 'all'),
+        ('moon_phase', moon_phase if moon_phase in MOON_ORDER else None),
+        ('tide', tide_bucket(tide_ft)),
+        ('lure', lure or None),
+        ('month', f"{caught_at.month:02d}" if caught_at else None),
+        ('hour', f"{caught_at.hour:02d}" if caught_at else None),
+        ('location', location_bucket(latitude, longitude)),
+    )
+    return [(dimension, bucket) for dimension, bucket in pairs if bucket is not None]
+
+def tally(entries):
+    """Sum ``(user_id, pairs, size_value, weight_value, sign)`` entries into upsert parameter tuples.
+
+    A batch of inserts touches each bucket once, however many catches share it.
+    """
+    totals = {}
+    for user_id, pairs, size_value, weight_value, sign in entries:
+        for dimension, bucket in pairs:
+            total = totals.setdefault((user_id, dimension, bucket), [0, 0, 0.0, 0, 0.0])
+            total[0] += sign
+            if size_value is not None:
+                total[1] += sign
+                total[2] += sign * size_value
+            if weight_value is not None:
+                total[3] += sign
+                total[4] += sign * weight_value
+    return [key + tuple(total) for key, total in totals.items()]
+
+def _sort_key(dimension, row):
+    if dimension == 'moon_phase':
+        return (MOON_ORDER.index(row['bucket']),)
+    if dimension == 'tide':
+        return (float(row['bucket']),)
+    if dimension in ('month', 'hour'):
+        return (row['bucket'],)
+    return (-row['catches'], row['bucket'])
+
+def summarize(rows):
+    """Turn catch_stats rows into {'total', 'by': {dimension: [bucket dicts]}} for the API."""
+    by = {dimension: [] for dimension in DIMENSIONS}
+    total = 0
+    for dimension, bucket, catches, sized, size_total, weighed, weight_total in rows:
+        if dimension == 'total':
+            total = catches
+        if catches <= 0 or dimension not in by:
+            continue
+        by[dimension].append({
+            'bucket': bucket,
+            'catches': catches,
+            'avg_size': round(size_total / sized, 2) if sized else None,
+            'avg_weight': round(weight_total / weighed, 2) if weighed else None,
+        })
+    for dimension, buckets in by.items():
+        buckets.sort(key=lambda row: _sort_key(dimension, row))
+    return {'total': total, 'by': by}
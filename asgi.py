@@ -0,0 +1,73 @@
+"""ASGI entry point serving the same app as ``project:create_app()``, with upstream-bound routes on an event loop.
+
+/weather awaits OpenWeatherMap through aiohttp, so one worker process can hold
+hundreds of cache misses open at once instead of one per thread. Every other
+route runs in the Flask app on a pool of ``ASGI_WSGI_THREADS`` threads. Run
+it with uvicorn::
+
+    uvicorn asgi:app --workers 2
+"""
+import json
+import logging
+import os
+import time
+from urllib.parse import parse_qs
+from a2wsgi import WSGIMiddleware
+import metrics
+import upstream
+from project import create_app, weather_cache
+from weather import WeatherUnavailable
+
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 10))
+
+async def weather(scope):
+    """/weather as in project.py, awaiting the cache instead of blocking a thread on it."""
+    query = parse_qs(scope['query_string'].decode('latin-1'))
+    lat, lon = query.get('lat', [''])[0], query.get('lon', [''])[0]
+    if not lat or not lon:
+        return 400, {'error': 'Missing lat or lon'}, []
+    try:
+        data, source = await weather_cache.aget(float(lat), float(lon))
+    except ValueError:
+        return 400, {'error': 'Invalid lat or lon'}, []
+    except WeatherUnavailable as e:
+        logging.error(f"Weather API error: {e}")
+        return 500, {'error': 'Weather API error'}, []
+    return 200, data, [(b'x-cache', source.upper().encode())]
+
+# (method, path) -> coroutine returning (status, JSON body, extra headers)
+ASYNC_ROUTES = {('GET', '/weather'): weather}
+
+flask_wsgi = WSGIMiddleware(create_app(), workers=ASGI_WSGI_THREADS)
+
+async def send_json(send, status, body, headers):
+    # Same bytes as Flask's jsonify
+    payload = (json.dumps(body, sort_keys=True, separators=(',', ':')) + '\n').encode()
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode()), *headers]})
+    await send({'type': 'http.response.body', 'body': payload})
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await upstream.http.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    handler = ASYNC_ROUTES.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+    if handler is None:
+        return await flask_wsgi(scope, receive, send)
+    started = time.perf_counter()
+    status = 500
+    try:
+        status, body, headers = await handler(scope)
+        await send_json(send, status, body, headers)
+    finally:
+        metrics.registry.observe('http_request', time.perf_counter() - started, error=status >= 500,
+                                 route=scope['path'], method=scope['method'])
@@ -0,0 +1,232 @@
+"""Build-once static asset pipeline: fingerprinted names, precompressed variants and rewritten pages.
+
+A build reads the pages in public/ and the files under public/static/ (not
+the old sample uploads) and writes them to a directory named after a digest
+of those inputs:
+
+    static/fish.<hash>.jpg        plus fish.<hash>.jpg.webp
+    static/suncalc.<hash>.js      plus .br and .gz
+    pages/dashboard.html          /public/static/ references rewritten, plus .br and .gz
+    manifest.json                 {'/public/static/fish.jpg': '/assets/fish.<hash>.jpg', ...}
+
+Fingerprinted files are served from /assets/ and never change, so browsers
+keep them for a year without revalidating. Pages keep their URLs and are
+revalidated with their ETag. Each response is the smallest variant the
+client accepts: brotli or gzip for text, WebP for JPEG and PNG.
+
+Run ``python assets.py build`` at deploy time; the app builds on startup
+when the current build is missing.
+"""
+import gzip
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import sys
+import tempfile
+from flask import send_file, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # gzip variants only
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(ROOT, 'public')
+ASSETS_DIR = os.environ.get('ASSETS_DIR', os.path.join(ROOT, 'build', 'assets'))
+ASSETS_URL = '/assets/'
+SOURCE_URL = '/public/static/'
+WEBP_QUALITY = int(os.environ.get('ASSETS_WEBP_QUALITY', 80))
+FINGERPRINT_LENGTH = 12
+TEXT_TYPES = ('.html', '.js', '.css', '.svg', '.json', '.txt')
+RASTER_TYPES = ('.jpg', '.jpeg', '.png')
+ASSET_TYPES = TEXT_TYPES + RASTER_TYPES + ('.gif', '.webp', '.ico', '.woff2')
+SKIP_DIRS = ('uploads', '__pycache__')
+# Variants that save less than this fraction of the original are not kept
+MIN_SAVING = 0.05
+BUILDS_KEPT = 2
+PIPELINE_VERSION = 1
+IMMUTABLE = 'public, max-age=31536000, immutable'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+REFERENCE_RE = re.compile(re.escape(SOURCE_URL) + r'[\w./-]+')
+
+def source_files(source=SOURCE_DIR):
+    """Return ``(pages, assets)``: the HTML pages in ``source`` and the static files under it, as relative paths."""
+    pages = sorted(name for name in os.listdir(source) if name.endswith('.html'))
+    static = os.path.join(source, 'static')
+    assets = []
+    for dirpath, dirnames, filenames in os.walk(static):
+        dirnames[:] = sorted(name for name in dirnames if name not in SKIP_DIRS)
+        for name in sorted(filenames):
+            if name.lower().endswith(ASSET_TYPES):
+                assets.append(os.path.relpath(os.path.join(dirpath, name), static).replace(os.sep, '/'))
+    return pages, assets
+
+def source_digest(source=SOURCE_DIR):
+    """Digest of every input file and pipeline setting, which names the build directory."""
+    digest = hashlib.sha256(f"{PIPELINE_VERSION}:{WEBP_QUALITY}:{brotli is not None}".encode())
+    pages, assets = source_files(source)
+    for rel in pages + [f'static/{name}' for name in assets]:
+        with open(os.path.join(source, rel), 'rb') as f:
+            digest.update(rel.encode() + b'\0' + hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()[:FINGERPRINT_LENGTH]
+
+def compressed_variants(data):
+    """Return ``[(suffix, bytes)]`` for the brotli and gzip encodings of ``data`` worth keeping."""
+    variants = [('.br', brotli.compress(data, quality=11))] if brotli is not None else []
+    variants.append(('.gz', gzip.compress(data, 9, mtime=0)))
+    return [(suffix, body) for suffix, body in variants if len(body) <= len(data) * (1 - MIN_SAVING)]
+
+def webp_variant(data):
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as image:
+        buffer = io.BytesIO()
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=6)
+    return buffer.getvalue()
+
+def rewrite(html, manifest):
+    """Point /public/static/ references in a page at their fingerprinted URLs."""
+    return REFERENCE_RE.sub(lambda match: manifest.get(match.group(0), match.group(0)), html)
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def _build_into(tmp, source):
+    pages, assets = source_files(source)
+    manifest = {}
+    for rel in assets:
+        with open(os.path.join(source, 'static', rel), 'rb') as f:
+            data = f.read()
+        stem, ext = os.path.splitext(rel)
+        name = f"{stem}.{hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH]}{ext}"
+        variants = compressed_variants(data) if ext.lower() in TEXT_TYPES else []
+        if ext.lower() in RASTER_TYPES:
+            webp = webp_variant(data)
+            if len(webp) <= len(data) * (1 - MIN_SAVING):
+                variants.append(('.webp', webp))
+        for suffix, body in [('', data)] + variants:
+            _write(os.path.join(tmp, 'static', name + suffix), body)
+        manifest[SOURCE_URL + rel] = ASSETS_URL + name
+    for page in pages:
+        with open(os.path.join(source, page), encoding='utf-8') as f:
+            data = rewrite(f.read(), manifest).encode('utf-8')
+        for suffix, body in [('', data)] + compressed_variants(data):
+            _write(os.path.join(tmp, 'pages', page + suffix), body)
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+def build(source=SOURCE_DIR, out=ASSETS_DIR):
+    """Build ``source`` into ``out``/<digest> unless that build exists, and return its path.
+
+    The build is written to a temporary directory and renamed into place, so
+    workers starting together never see half a build; if another one wins the
+    rename its build is used. Only the newest BUILDS_KEPT builds are kept.
+    """
+    digest = source_digest(source)
+    target = os.path.join(out, digest)
+    if os.path.exists(os.path.join(target, 'manifest.json')):
+        return target
+    os.makedirs(out, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f'.{digest}-', dir=out)
+    try:
+        _build_into(tmp, source)
+        os.rename(tmp, target)
+        logging.info(f"Built static assets into {target}")
+    except OSError:
+        if not os.path.exists(os.path.join(target, 'manifest.json')):
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    builds = sorted((entry for entry in os.scandir(out) if entry.is_dir() and not entry.name.startswith('.')),
+                    key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for stale in builds[BUILDS_KEPT:]:
+        if stale.name != digest:
+            shutil.rmtree(stale.path, ignore_errors=True)
+    return target
+
+class AssetStore:
+    """Serves a build's fingerprinted files and rewritten pages, or public/ as it is when there is no build.
+
+    The file list is read once by load(), so choosing a variant never touches
+    the filesystem; only names in it can be served.
+    """
+
+    def __init__(self, source=SOURCE_DIR, directory=ASSETS_DIR):
+        self.source = source
+        self.directory = directory
+        self.root = None
+        self.manifest = {}
+        self.files = frozenset()
+
+    def load(self, build_missing=True):
+        """Switch to the build for the current sources, building it first if ``build_missing``; True if one is in use."""
+        try:
+            if build_missing:
+                root = build(self.source, self.directory)
+            else:
+                root = os.path.join(self.directory, source_digest(self.source))
+            with open(os.path.join(root, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError, ImportError) as e:
+            logging.warning(f"Serving unbuilt pages and static files from {self.source}: {e}")
+            return False
+        files = frozenset(os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, '/')
+                          for dirpath, _, names in os.walk(root) for name in names)
+        self.root, self.manifest, self.files = root, manifest, files
+        return True
+
+    @property
+    def pages_dir(self):
+        return os.path.join(self.root, 'pages') if self.root else self.source
+
+    def url(self, path):
+        """Return the fingerprinted URL for a /public/static/ path, or the path itself."""
+        return self.manifest.get(path, path)
+
+    def _send(self, rel, request, cache_control):
+        mimetype = mimetypes.guess_type(rel)[0] or 'application/octet-stream'
+        chosen, encoding, vary = rel, None, []
+        if any(rel + suffix in self.files for _, suffix in ENCODINGS):
+            vary.append('Accept-Encoding')
+            accepted = {value for value, quality in request.accept_encodings if quality > 0}
+            for name, suffix in ENCODINGS:
+                if name in accepted and rel + suffix in self.files:
+                    chosen, encoding = rel + suffix, name
+                    break
+        if rel + '.webp' in self.files:
+            vary.append('Accept')
+            # Only an explicit image/webp counts; browsers without WebP still send */*
+            if 'image/webp' in request.headers.get('Accept', ''):
+                chosen, mimetype = rel + '.webp', 'image/webp'
+        response = send_file(os.path.join(self.root, chosen), mimetype=mimetype, conditional=True)
+        response.headers['Cache-Control'] = cache_control
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if vary:
+            response.headers['Vary'] = ', '.join(vary)
+        return response
+
+    def asset(self, filename, request):
+        """Response for /assets/<filename>, or None when it is not in the build."""
+        rel = f'static/{filename}'
+        if self.root is None or rel not in self.files:
+            return None
+        return self._send(rel, request, IMMUTABLE)
+
+    def page(self, name, request):
+        """Response for a page in public/: its rewritten copy from the build, revalidated on every load."""
+        if self.root is None or f'pages/{name}' not in self.files:
+            return send_from_directory(self.source, name)
+        return self._send(f'pages/{name}', request, 'no-cache')
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['build']:
+        sys.exit('usage: python assets.py build')
+    logging.basicConfig(level=logging.INFO)
+    print(build())
@@ -0,0 +1,262 @@
+"""Sun and moon data for arrays of times and places: moon phase, illumination, rise and set.
+
+The positions are the low-precision formulas suncalc.js uses (good to a
+minute or two for rise and set), written with NumPy so a million catches
+cost one batched call instead of a million Python calls. Phase names use the
+same reference new moon and boundaries as the app always has.
+
+Rise and set times depend only on the local day and roughly where you are,
+so AstronomyTable keeps a per-day table for each grid cell.
+"""
+import os
+from datetime import date as date_type, datetime, timezone
+import numpy as np
+from cache import TTLCache
+from tides import to_unix_seconds
+
+NEW_MOON_EPOCH = datetime(2000, 1, 6, 18, 14, tzinfo=timezone.utc)
+SYNODIC_MONTH = 29.53058867  # days
+PHASE_BOUNDS = (0.02, 0.23, 0.27, 0.48, 0.52, 0.73, 0.77, 0.98)
+PHASE_NAMES = ('New Moon', 'Waxing Crescent', 'First Quarter', 'Waxing Gibbous', 'Full Moon',
+               'Waning Gibbous', 'Last Quarter', 'Waning Crescent', 'New Moon')
+ASTRONOMY_GRID = float(os.environ.get('ASTRONOMY_GRID_DEGREES', 0.1))
+ASTRONOMY_CACHE_BLOCKS = int(os.environ.get('ASTRONOMY_CACHE_BLOCKS', 16384))
+ASTRONOMY_BLOCK_DAYS = 16
+TABLE_FIELDS = ('sunrise', 'sunset', 'moonrise', 'moonset', 'illumination', 'phase')
+
+RAD = np.pi / 180
+J2000_DAY = 10957.5  # 2000-01-01 12:00 UTC in days since the UNIX epoch
+OBLIQUITY = RAD * 23.4397
+SUN_ALTITUDE = -0.833 * RAD  # upper limb touching the horizon, with refraction
+MOON_ALTITUDE = 0.133 * RAD
+SUN_DISTANCE = 149598000  # km
+MOON_STEP = 1200  # seconds between moon altitude samples
+MOON_CHUNK = 4096  # days per vectorized moon rise/set pass
+
+_EPOCH_SECONDS = NEW_MOON_EPOCH.timestamp()
+
+def phase_name(phase):
+    """Return the phase name for a phase fraction (0 new, 0.5 full), or an array of names for an array."""
+    names = np.array(PHASE_NAMES, dtype=object)[np.digitize(phase, PHASE_BOUNDS)]
+    return names if np.ndim(names) else str(names)
+
+def moon_phase(date):
+    """Return the phase name at a timezone-aware datetime; naive datetimes and non-dates raise TypeError."""
+    days = (date - NEW_MOON_EPOCH).total_seconds() / (24 * 3600)
+    return phase_name((days % SYNODIC_MONTH) / SYNODIC_MONTH)
+
+def phase_fraction(times):
+    """Return the mean-lunation phase fraction for datetimes, datetime64 values or UNIX seconds."""
+    days = (to_unix_seconds(times) - _EPOCH_SECONDS) / (24 * 3600)
+    return (days % SYNODIC_MONTH) / SYNODIC_MONTH
+
+def moon_phases(times):
+    """Vectorized moon_phase: an array of phase names, one per time."""
+    return phase_name(phase_fraction(times))
+
+def _days(seconds):
+    return seconds / 86400.0 - J2000_DAY
+
+def _right_ascension(l, b):
+    return np.arctan2(np.sin(l) * np.cos(OBLIQUITY) - np.tan(b) * np.sin(OBLIQUITY), np.cos(l))
+
+def _declination(l, b):
+    return np.arcsin(np.sin(b) * np.cos(OBLIQUITY) + np.cos(b) * np.sin(OBLIQUITY) * np.sin(l))
+
+def _solar_mean_anomaly(d):
+    return RAD * (357.5291 + 0.98560028 * d)
+
+def _ecliptic_longitude(M):
+    center = RAD * (1.9148 * np.sin(M) + 0.02 * np.sin(2 * M) + 0.0003 * np.sin(3 * M))
+    return M + center + RAD * 102.9372 + np.pi
+
+def _sun_coords(d):
+    L = _ecliptic_longitude(_solar_mean_anomaly(d))
+    return _right_ascension(L, 0), _declination(L, 0)
+
+def _moon_coords(d):
+    L = RAD * (218.316 + 13.176396 * d)
+    M = RAD * (134.963 + 13.064993 * d)
+    F = RAD * (93.272 + 13.229350 * d)
+    l = L + RAD * 6.289 * np.sin(M)
+    b = RAD * 5.128 * np.sin(F)
+    return _right_ascension(l, b), _declination(l, b), 385001 - 20905 * np.cos(M)
+
+def moon_illumination(times):
+    """Return ``(fraction, phase)``: the illuminated fraction of the disc and the true phase (0 new, 0.5 full)."""
+    d = _days(to_unix_seconds(times))
+    sun_ra, sun_dec = _sun_coords(d)
+    moon_ra, moon_dec, moon_distance = _moon_coords(d)
+    elongation = np.arccos(np.clip(np.sin(sun_dec) * np.sin(moon_dec)
+                                   + np.cos(sun_dec) * np.cos(moon_dec) * np.cos(sun_ra - moon_ra), -1, 1))
+    incidence = np.arctan2(SUN_DISTANCE * np.sin(elongation), moon_distance - SUN_DISTANCE * np.cos(elongation))
+    angle = np.arctan2(np.cos(sun_dec) * np.sin(sun_ra - moon_ra),
+                       np.sin(sun_dec) * np.cos(moon_dec) - np.cos(sun_dec) * np.sin(moon_dec) * np.cos(sun_ra - moon_ra))
+    fraction = (1 + np.cos(incidence)) / 2
+    phase = 0.5 + 0.5 * incidence * np.where(angle < 0, -1.0, 1.0) / np.pi
+    return fraction, phase
+
+def sun_times(days, lat, lon):
+    """Return ``(sunrise, sunset)`` UNIX seconds for local days (days since 1970-01-01) at lat/lon.
+
+    Arguments broadcast against each other. Days without a sunrise or
+    sunset (polar day or night) are NaN.
+    """
+    days, lat, lon = np.broadcast_arrays(np.asarray(days, dtype=np.float64), lat, lon)
+    lw, phi = -RAD * lon, RAD * lat
+    # Solar transit nearest to local noon, then the hour angle of the horizon crossing either side of it
+    cycle = np.round(_days(days * 86400 + 43200) - 0.0009 - lw / (2 * np.pi))
+    transit = 0.0009 + lw / (2 * np.pi) + cycle
+    M = _solar_mean_anomaly(transit)
+    L = _ecliptic_longitude(M)
+    dec = _declination(L, 0)
+    noon = transit + 0.0053 * np.sin(M) - 0.0069 * np.sin(2 * L)
+    with np.errstate(invalid='ignore'):
+        w = np.arccos((np.sin(SUN_ALTITUDE) - np.sin(phi) * np.sin(dec)) / (np.cos(phi) * np.cos(dec)))
+    setting = 0.0009 + (w + lw) / (2 * np.pi) + cycle
+    sunset = setting + 0.0053 * np.sin(M) - 0.0069 * np.sin(2 * L)
+    sunrise = noon - (sunset - noon)
+    return (sunrise + J2000_DAY) * 86400, (sunset + J2000_DAY) * 86400
+
+def moon_altitude(times, lat, lon):
+    """Return the moon's apparent altitude in radians, refraction included."""
+    d = _days(to_unix_seconds(times))
+    lw, phi = -RAD * np.asarray(lon), RAD * np.asarray(lat)
+    ra, dec, _ = _moon_coords(d)
+    H = RAD * (280.16 + 360.9856235 * d) - lw - ra
+    h = np.arcsin(np.sin(phi) * np.sin(dec) + np.cos(phi) * np.cos(dec) * np.cos(H))
+    clipped = np.maximum(h, 0)
+    return h + 0.0002967 / np.tan(clipped + 0.00312536 / (clipped + 0.08901179))
+
+def _first_crossing(seconds, above, rising):
+    """Linearly interpolate the first upward (or downward) crossing along each row, NaN where there is none."""
+    crosses = (above[:, 1:] > 0) & (above[:, :-1] <= 0) if rising else (above[:, 1:] <= 0) & (above[:, :-1] > 0)
+    index = np.argmax(crosses, axis=1)
+    rows = np.arange(len(index))
+    h0, h1 = above[rows, index], above[rows, index + 1]
+    t0 = seconds[rows, index]
+    when = t0 + (seconds[rows, index + 1] - t0) * h0 / (h0 - h1)
+    return np.where(crosses.any(axis=1), when, np.nan)
+
+def moon_times(days, lat, lon, step=MOON_STEP):
+    """Return ``(moonrise, moonset)`` UNIX seconds for local days at lat/lon, NaN when the moon does not rise or set.
+
+    The local day runs from mean solar midnight at the longitude. The moon's
+    altitude is sampled every ``step`` seconds across every day at once, in
+    chunks so memory stays bounded.
+    """
+    days, lat, lon = (a.ravel() for a in np.broadcast_arrays(np.asarray(days, dtype=np.float64), lat, lon))
+    offsets = np.arange(0, 86400 + step, step, dtype=np.float64)
+    rise, set_ = np.empty(len(days)), np.empty(len(days))
+    for start in range(0, len(days), MOON_CHUNK):
+        part = slice(start, start + MOON_CHUNK)
+        midnight = days[part] * 86400 - lon[part] / 15 * 3600
+        seconds = midnight[:, None] + offsets
+        above = moon_altitude(seconds, lat[part, None], lon[part, None]) - MOON_ALTITUDE
+        rise[part] = _first_crossing(seconds, above, rising=True)
+        set_[part] = _first_crossing(seconds, above, rising=False)
+    return rise, set_
+
+def day_numbers(values):
+    """Convert dates, datetimes or datetime64 values to integer days since 1970-01-01 (local calendar days)."""
+    values = np.asarray(values)
+    if not np.issubdtype(values.dtype, np.datetime64):
+        values = np.array([v.date() if isinstance(v, datetime) else v for v in values.ravel()],
+                          dtype='datetime64[D]').reshape(values.shape)
+    return values.astype('datetime64[D]').astype(np.int64)
+
+class AstronomyTable:
+    """Precomputed per-day sun and moon rows for the grid cells and dates users ask about.
+
+    Rows are cached in blocks of ``block_days`` consecutive local days per
+    cell, so a lookup only ever computes the blocks its days fall in, however
+    far apart they are. ``lookup`` takes arrays of days and coordinates,
+    computes every missing block in one vectorized batch and gathers a column
+    per TABLE_FIELDS entry with plain indexing. Illumination and phase are
+    for local noon; per-timestamp phases come from moon_phases.
+    """
+
+    def __init__(self, grid=ASTRONOMY_GRID, maxsize=ASTRONOMY_CACHE_BLOCKS, block_days=ASTRONOMY_BLOCK_DAYS):
+        self.grid = grid
+        self.block_days = block_days
+        self.blocks = TTLCache(maxsize, ttl=float('inf'))
+        self.computed_days = 0
+
+    def compute(self, days, lat, lon):
+        """Compute table rows, shape (len, len(TABLE_FIELDS)), for arrays of days and coordinates."""
+        days, lat, lon = np.broadcast_arrays(np.asarray(days, dtype=np.float64), lat, lon)
+        sunrise, sunset = sun_times(days, lat, lon)
+        moonrise, moonset = moon_times(days, lat, lon)
+        illumination, phase = moon_illumination(days * 86400 + 43200 - lon / 15 * 3600)
+        return np.stack((sunrise, sunset, moonrise.reshape(days.shape), moonset.reshape(days.shape),
+                         illumination, phase), axis=-1)
+
+    def lookup(self, days, lat, lon):
+        """Return a dict of column arrays for every (day, lat, lon), broadcasting the arguments."""
+        days, lat, lon = (a.ravel() for a in np.broadcast_arrays(np.asarray(days, dtype=np.int64), lat, lon))
+        result = np.empty((len(days), len(TABLE_FIELDS)))
+        if len(days):
+            keys = np.stack((np.round(lat / self.grid).astype(np.int64), np.round(lon / self.grid).astype(np.int64),
+                             days // self.block_days))
+            order = np.lexsort(keys[::-1])
+            keys = keys[:, order]
+            bounds = np.flatnonzero(np.r_[True, (keys[:, 1:] != keys[:, :-1]).any(axis=0), True])
+            groups = [(tuple(keys[:, a].tolist()), order[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+            for (key, rows), table in zip(groups, self._blocks([key for key, _ in groups])):
+                result[rows] = table[days[rows] - key[2] * self.block_days]
+        return {field: result[:, column] for column, field in enumerate(TABLE_FIELDS)}
+
+    def _blocks(self, keys):
+        """Return the rows of each (lat cell, lon cell, block) key, computing the missing blocks in one batch."""
+        tables = [self.blocks.get(key) for key in keys]
+        missing = [key for key, table in zip(keys, tables) if table is None]
+        if missing:
+            days = np.concatenate([np.arange(block * self.block_days, (block + 1) * self.block_days)
+                                   for _, _, block in missing])
+            lat = np.repeat([lat_cell * self.grid for lat_cell, _, _ in missing], self.block_days)
+            lon = np.repeat([lon_cell * self.grid for _, lon_cell, _ in missing], self.block_days)
+            rows = self.compute(days, lat, lon).reshape(len(missing), self.block_days, len(TABLE_FIELDS))
+            self.computed_days += len(days)
+            computed = {}
+            for key, table in zip(missing, rows):
+                computed[key] = table.copy()
+                self.blocks.set(key, computed[key])
+            tables = [computed[key] if table is None else table for key, table in zip(keys, tables)]
+        return tables
+
+    def day(self, day, lat, lon):
+        """Return one day's row as a dict, with times as aware UTC datetimes (None when there is no event)."""
+        if isinstance(day, date_type):
+            day = int(day_numbers([day])[0])
+        row = {field: values[0] for field, values in self.lookup([day], lat, lon).items()}
+        result = {field: None if np.isnan(row[field]) else datetime.fromtimestamp(row[field], timezone.utc)
+                  for field in TABLE_FIELDS[:4]}
+        result['illumination'] = float(row['illumination'])
+        result['phase'] = float(row['phase'])
+        return result
+
+    def stats(self):
+        stats = self.blocks.stats()
+        stats['computed_days'] = self.computed_days
+        return stats
+
+def catch_astronomy(times, lats, lons, table=None):
+    """Everything the app records about the sky for a batch of catches, in one call.
+
+    ``times`` are the catches' wall-clock times (treated as UTC for the
+    phase, as the app always has); rows without coordinates get NaN
+    rise/set times. Returns a dict of equal-length arrays.
+    """
+    seconds = to_unix_seconds(times)
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    illumination, _ = moon_illumination(seconds)
+    result = {'moon_phase': moon_phases(seconds), 'illumination': illumination}
+    known = ~(np.isnan(lats) | np.isnan(lons))
+    days = np.floor(seconds / 86400).astype(np.int64)
+    rows = (table or AstronomyTable()).lookup(days[known], lats[known], lons[known])
+    for field in TABLE_FIELDS[:4]:
+        column = np.full(len(seconds), np.nan)
+        column[known] = rows[field]
+        result[field] = column
+    return result
@@ -0,0 +1,77 @@
+"""Compare /analytics reads from the catch_stats aggregates with rescanning a user's catches.
+
+Grows one user's log in a throwaway SQLite database (other users' catches
+alongside) and, at each size, times reading the summary from catch_stats
+against selecting every one of the user's catches and aggregating them.
+
+Run from the repository root: python -m benchmarks.bench_analytics [largest]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from analytics import catch_buckets, summarize, tally
+from db import SQLiteConnections
+from migrations import migrate
+from repository import CatchRepository, parse_catch_time
+
+USER = 1
+LURES = ['Bucktail', 'SP Minnow', 'Eel', 'Pencil Popper', 'Darter', 'Needlefish', 'Bomber', 'Tin']
+PHASES = ['New Moon', 'Waxing Crescent', 'First Quarter', 'Waxing Gibbous', 'Full Moon', 'Waning Gibbous',
+          'Last Quarter', 'Waning Crescent']
+READS = 20
+
+def synthetic_catches(count, seed):
+    rng = random.Random(seed)
+    start = datetime(2015, 1, 1)
+    for _ in range(count):
+        caught = start + timedelta(minutes=rng.randrange(10 * 365 * 24 * 60))
+        lat, lon = 41.3 + rng.uniform(0, 1), -71.6 + rng.uniform(0, 1.5)
+        yield (USER if rng.random() < 0.8 else rng.randrange(2, 50), '', caught.strftime('%Y-%m-%dT%H:%M'),
+               f"{lat:.4f}, {lon:.4f}", rng.choice(LURES), f"{rng.randint(20, 50)} in", f"{rng.randint(5, 40)} lb",
+               f"{rng.uniform(-1, 5):.3f} ft", rng.choice(PHASES), lat, lon, 'ready')
+
+def rescan(catches):
+    conn = catches.pool.connect()
+    try:
+        rows = conn.execute('''SELECT date, moon_phase, tide_ft, lure, latitude, longitude, size_value, weight_value
+            FROM catches WHERE user_id = ?''', (USER,)).fetchall()
+    finally:
+        conn.close()
+    entries = ((USER, catch_buckets(parse_catch_time(r[0]), *r[1:6]), r[6], r[7], 1) for r in rows)
+    return summarize([row[1:] for row in tally(entries)])
+
+def median_ms(fn, reads=READS):
+    times = []
+    for _ in range(reads):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000
+
+def main(largest=500_000):
+    sizes = [size for size in (1_000, 10_000, 100_000, 500_000, 1_000_000) if size <= largest]
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = SQLiteConnections(os.path.join(tmp, 'fishing.db'))
+        migrate(pool)
+        catches = CatchRepository(pool)
+        loaded = 0
+        for seed, size in enumerate(sizes):
+            batch = list(synthetic_catches(size - loaded, seed))
+            started = time.perf_counter()
+            catches.add_many(batch)
+            insert = (time.perf_counter() - started) / len(batch) * 1e6
+            loaded = size
+            own = sum(1 for row in batch if row[0] == USER)
+            summary = summarize(catches.analytics(USER))
+            assert summary == rescan(catches), 'aggregates drifted from the catches table'
+            aggregate = median_ms(lambda: summarize(catches.analytics(USER)))
+            scan = median_ms(lambda: rescan(catches), reads=max(3, READS * 1000 // size))
+            print(f"{size:>9,} catches ({summary['total']:,} for the user, +{own:,} in this step): "
+                  f"catch_stats {aggregate:.2f} ms, rescan {scan:.1f} ms, insert {insert:.1f} us per catch")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
@@ -0,0 +1,85 @@
+"""Bytes on the wire for a first and a repeat visit to the login page and dashboard, before and after the asset pipeline.
+
+Starts the app twice as a subprocess on a throwaway SQLite database: once
+with ASSETS_BUILD=0, serving public/ as it is, and once serving the asset
+build. A client that sends a current browser's Accept headers loads each
+page and every image it references. On the repeat visit it behaves like a
+browser cache: responses that are still fresh (max-age or immutable) are not
+requested again and the rest are revalidated with their validators.
+
+Run from the repository root: python -m benchmarks.bench_assets
+"""
+import gzip
+import os
+import re
+import tempfile
+import brotli
+import requests
+from benchmarks.bench_login_storm import PASSWORD, free_port, start_app
+
+ACCEPT_ENCODING = 'gzip, deflate, br'
+ACCEPT_PAGE = 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8'
+ACCEPT_IMAGE = 'image/avif,image/webp,image/apng,image/*,*/*;q=0.8'
+REFERENCE_RE = re.compile(r'''(?:url\(\s*['"]?|src=["'])(/(?:public|assets)/[^'")\s]+)''')
+DECODERS = {'br': brotli.decompress, 'gzip': gzip.decompress}
+
+def wire_bytes(response, body):
+    headers = sum(len(name) + len(value) + 4 for name, value in response.headers.items())
+    return len(f'HTTP/1.1 {response.status_code} {response.reason}\r\n\r\n') + headers + len(body)
+
+def fresh(headers):
+    cache_control = headers.get('Cache-Control', '')
+    max_age = re.search(r'max-age=(\d+)', cache_control)
+    return 'no-cache' not in cache_control and ('immutable' in cache_control or bool(max_age and int(max_age.group(1))))
+
+def fetch(session, base, path, accept, cookie, cache):
+    """GET ``path`` as a browser would given ``cache``; return (bytes on the wire, requests made, decoded body)."""
+    cached = cache.get(path)
+    if cached is not None and fresh(cached[0]):
+        return 0, 0, cached[1]
+    headers = {'Accept': accept, 'Accept-Encoding': ACCEPT_ENCODING, 'Cookie': cookie}
+    if cached is not None:
+        for validator, conditional in (('ETag', 'If-None-Match'), ('Last-Modified', 'If-Modified-Since')):
+            if validator in cached[0]:
+                headers[conditional] = cached[0][validator]
+    response = session.get(base + path, headers=headers, stream=True)
+    raw = response.raw.read(decode_content=False)
+    if response.status_code == 200:
+        encoding = response.headers.get('Content-Encoding')
+        cache[path] = (response.headers, DECODERS[encoding](raw) if encoding in DECODERS else raw)
+    return wire_bytes(response, raw), 1, cache[path][1]
+
+def visit(session, base, cookie, cache):
+    """Load / and every image it references; return (bytes on the wire, requests made)."""
+    total, requested, html = fetch(session, base, '/', ACCEPT_PAGE, cookie, cache)
+    for path in dict.fromkeys(REFERENCE_RE.findall(html.decode())):
+        size, made, _ = fetch(session, base, path, ACCEPT_IMAGE, cookie, cache)
+        total, requested = total + size, requested + made
+    return total, requested
+
+def log_in(base):
+    data = {'username': 'angler', 'password': PASSWORD, 'confirm_password': PASSWORD}
+    requests.post(f'{base}/register', data=data, allow_redirects=False)
+    response = requests.post(f'{base}/login', data=data, allow_redirects=False)
+    return 'session=' + response.cookies['session']
+
+def main():
+    print(f"{'mode':<10} {'page':<10} {'first KB':>9} {'requests':>9} {'repeat KB':>10} {'requests':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, build in (('unbuilt', '0'), ('pipeline', '1')):
+            os.environ.update(ASSETS_BUILD=build, ASSETS_DIR=os.path.join(tmp, 'assets'), JOB_WORKER='0')
+            proc, base = start_app(tmp, free_port(), 0)
+            try:
+                for page, cookie in (('login', ''), ('dashboard', log_in(base))):
+                    with requests.Session() as session:
+                        cache = {}
+                        first, first_requests = visit(session, base, cookie, cache)
+                        repeat, repeat_requests = visit(session, base, cookie, cache)
+                    print(f"{mode:<10} {page:<10} {first / 1024:>9.1f} {first_requests:>9} "
+                          f"{repeat / 1024:>10.1f} {repeat_requests:>9}")
+            finally:
+                proc.terminate()
+                proc.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Compare per-catch moon phases with the batched astronomy module on synthetic historical catches.
+
+Run from the repository root: python -m benchmarks.bench_astronomy [count]
+"""
+import sys
+import time
+from datetime import datetime, timezone
+import numpy as np
+from astronomy import AstronomyTable, catch_astronomy, moon_phase, moon_phases
+
+def synthetic_catches(count, seed=7):
+    """Catch times over five years spread over a few hundred spots along the New England coast."""
+    rng = np.random.default_rng(seed)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc).timestamp()
+    seconds = start + rng.integers(0, 5 * 365 * 86400, count)
+    spots = rng.integers(0, 300, count)
+    lats = 40.5 + (spots % 30) * 0.1
+    lons = -74.0 + (spots // 30) * 0.4
+    return seconds.astype('datetime64[s]'), lats, lons
+
+def main(count=1_000_000):
+    times, lats, lons = synthetic_catches(count)
+    sample = min(count, 100_000)
+    started = time.perf_counter()
+    for t in times[:sample].astype(datetime):
+        moon_phase(t.replace(tzinfo=timezone.utc))
+    loop = (time.perf_counter() - started) * count / sample
+    print(f"per-catch moon_phase loop: {loop:.2f} s for {count:,} catches (extrapolated from {sample:,})")
+
+    started = time.perf_counter()
+    moon_phases(times)
+    print(f"batched moon_phases: {time.perf_counter() - started:.2f} s")
+
+    table = AstronomyTable()
+    started = time.perf_counter()
+    catch_astronomy(times, lats, lons, table)
+    cold = time.perf_counter() - started
+    started = time.perf_counter()
+    catch_astronomy(times, lats, lons, table)
+    warm = time.perf_counter() - started
+    print(f"catch_astronomy (phase, illumination, sun and moon rise/set): {cold:.2f} s cold, {warm:.2f} s warm, "
+          f"{table.computed_days:,} days computed for {table.stats()['size']:,} cells")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
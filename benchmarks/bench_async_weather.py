@@ -0,0 +1,115 @@
+"""Requests per second for /weather against a slow OpenWeatherMap stand-in, sync gunicorn vs the ASGI app.
+
+Starts the app as one sync gunicorn worker (``gunicorn project:app``, as in
+the Procfile) and then as one uvicorn worker (``uvicorn asgi:app``), each on
+a throwaway SQLite database and pointed at a local fake OpenWeatherMap that
+answers after UPSTREAM_DELAY. Every request asks for a new grid cell, so
+each one is a cache miss that waits on the fake upstream. Load comes from
+CONCURRENCY clients looping for a few seconds at each level.
+
+Run from the repository root: python -m benchmarks.bench_async_weather [seconds]
+"""
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import aiohttp
+import numpy as np
+from benchmarks.bench_login_storm import ROOT, free_port
+
+UPSTREAM_DELAY = 0.1
+CONCURRENCY = (1, 10, 50, 200)
+MODES = {
+    'sync': [sys.executable, '-m', 'gunicorn', '--workers', '1', '--bind', '127.0.0.1:{port}', 'project:app'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:app', '--workers', '1', '--port', '{port}',
+             '--log-level', 'warning', '--no-access-log'],
+}
+
+async def slow_weather(reader, writer):
+    """A keep-alive HTTP/1.1 stand-in for OpenWeatherMap that takes UPSTREAM_DELAY per answer."""
+    body = json.dumps({'name': 'Narragansett', 'main': {'temp': 61.5}}).encode()
+    try:
+        while await reader.readuntil(b'\r\n\r\n'):
+            await asyncio.sleep(UPSTREAM_DELAY)
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                         b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+def start_server(mode, tmp, port, weather_port):
+    env = dict(os.environ, FLASK_ENV='development', SECRET_KEY='bench', PYTHONPATH=ROOT,
+               SQLITE_PATH=os.path.join(tmp, f'bench-{mode}.db'), STATION_REFRESH='0', JOB_WORKER='0',
+               STATION_CATALOG_PATH=os.path.join(tmp, 'stations.npy'),
+               TIDE_CONSTITUENTS_PATH=os.path.join(tmp, 'tides.json'), WEATHER_API_KEY='bench',
+               WEATHER_API_URL=f'http://127.0.0.1:{weather_port}/weather')
+    command = [part.format(port=port) for part in MODES[mode]]
+    proc = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return proc, f'http://127.0.0.1:{port}'
+
+async def wait_until_up(client, base):
+    for _ in range(400):
+        try:
+            async with client.get(f'{base}/stats'):
+                return
+        except aiohttp.ClientConnectionError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError('app did not start')
+
+async def load(client, base, concurrency, seconds, cells):
+    latencies, errors = [], 0
+    stop = time.monotonic() + seconds
+
+    async def worker():
+        nonlocal errors
+        while time.monotonic() < stop:
+            cell = next(cells)
+            started = time.perf_counter()
+            params = {'lat': f"{20 + (cell // 1000) * 0.05:.2f}", 'lon': f"{-80 + (cell % 1000) * 0.05:.2f}"}
+            try:
+                async with client.get(f'{base}/weather', params=params) as response:
+                    await response.read()
+                    ok = response.status == 200 and response.headers.get('X-Cache') == 'MISS'
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return np.array(latencies) * 1000, errors, time.perf_counter() - started
+
+async def run(seconds):
+    upstream = await asyncio.start_server(slow_weather, '127.0.0.1', 0, backlog=1024)
+    weather_port = upstream.sockets[0].getsockname()[1]
+    print(f"fake OpenWeatherMap answers in {UPSTREAM_DELAY * 1000:.0f} ms; one worker process per mode, "
+          f"{seconds:.0f}s per level, every request a cache miss")
+    print(f"{'mode':<6} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in MODES:
+            proc, base = start_server(mode, tmp, free_port(), weather_port)
+            try:
+                async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=max(CONCURRENCY)),
+                                                 timeout=aiohttp.ClientTimeout(total=120)) as client:
+                    await wait_until_up(client, base)
+                    cells = itertools.count()
+                    for concurrency in CONCURRENCY:
+                        latencies, errors, elapsed = await load(client, base, concurrency, seconds, cells)
+                        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (float('nan'),) * 2
+                        print(f"{mode:<6} {concurrency:>7} {len(latencies) / elapsed:>8.1f} {p50:>8.0f} {p99:>8.0f} "
+                              f"{errors:>7}")
+            finally:
+                proc.terminate()
+                proc.wait()
+    upstream.close()
+
+if __name__ == '__main__':
+    asyncio.run(run(float(sys.argv[1]) if len(sys.argv) > 1 else 5))
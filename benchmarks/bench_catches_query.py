@@ -0,0 +1,73 @@
+"""Compare the /catches day query before and after the typed, indexed catches schema.
+
+Builds two SQLite databases with the same synthetic catches (a million by
+default): one with the original TEXT schema queried with ``date LIKE``, one
+migrated and queried as a range scan on (user_id, caught_at).
+
+Run from the repository root: python -m benchmarks.bench_catches_query [catch_count]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from db import SQLiteConnections
+from migrations import create_tables, migrate
+from repository import CatchRepository
+
+USERS = 1000
+QUERIES = 200
+
+def synthetic_catches(count, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2022, 1, 1)
+    for _ in range(count):
+        caught = start + timedelta(minutes=rng.randrange(3 * 365 * 24 * 60))
+        yield (rng.randrange(1, USERS + 1), '', caught.strftime('%Y-%m-%dT%H:%M'), '41.5, -71.3', 'Bucktail',
+               f"{rng.randint(20, 50)} in", f"{rng.randint(5, 40)} lb", f"{rng.uniform(-1, 5):.3f} ft",
+               'Full Moon', 41.5, -71.3)
+
+def load(pool, count):
+    conn = pool.connect()
+    create_tables(conn.cursor(), 'sqlite')
+    conn.executemany('''INSERT INTO catches (user_id, image, date, location, lure, size, weight, tide,
+        moon_phase, latitude, longitude) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', synthetic_catches(count))
+    conn.commit()
+    conn.close()
+
+def time_queries(fn):
+    rng = random.Random(1)
+    days = [(rng.randrange(1, USERS + 1), (datetime(2022, 1, 1) + timedelta(days=rng.randrange(3 * 365))).strftime('%Y-%m-%d'))
+            for _ in range(QUERIES)]
+    started = time.perf_counter()
+    found = sum(len(fn(user_id, day)) for user_id, day in days)
+    return (time.perf_counter() - started) / QUERIES, found
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = SQLiteConnections(os.path.join(tmp, 'legacy.db'))
+        typed = SQLiteConnections(os.path.join(tmp, 'typed.db'))
+        print(f"loading {count} synthetic catches into each database...")
+        load(legacy, count)
+        load(typed, count)
+        started = time.perf_counter()
+        migrate(typed)
+        migration = time.perf_counter() - started
+
+        conn = legacy.connect()
+        def like_query(user_id, day):
+            return conn.execute('SELECT * FROM catches WHERE user_id = ? AND date LIKE ?', (user_id, day + '%')).fetchall()
+        legacy_time, legacy_found = time_queries(like_query)
+        repository = CatchRepository(typed)
+        typed_time, typed_found = time_queries(repository.for_user_on_date)
+        assert legacy_found == typed_found
+
+        print(f"migration + backfill:        {migration:8.2f} s")
+        print(f"LIKE scan (old schema):      {legacy_time * 1e3:8.3f} ms/query")
+        print(f"indexed range (new schema):  {typed_time * 1e3:8.3f} ms/query")
+        print(f"speedup:                     {legacy_time / typed_time:8.1f}x ({typed_found} catches matched)")
+
+if __name__ == '__main__':
+    main()
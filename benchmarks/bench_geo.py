@@ -0,0 +1,111 @@
+"""Time "my catches within 1 and 5 km" and season hotspots against per-catch haversine scans.
+
+Loads one user's catches (other users' alongside), scattered around a few
+dozen fishing spots on the Rhode Island coast, into a throwaway SQLite
+database. The radius query reads the geohash cells covering the circle and
+is compared with selecting all of the user's catches and calling haversine
+once per catch. Hotspot clustering of a season is compared with linking every
+pair of catches closer than 150 m with one haversine call per pair, on a
+sample small enough for that to finish.
+
+Run from the repository root: python -m benchmarks.bench_geo [catches]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from math import atan2, cos, radians, sin, sqrt
+from db import SQLiteConnections
+from geo import hotspots
+from migrations import migrate
+from repository import CatchRepository
+
+USER = 1
+SPOTS = 40
+RADII_KM = (1, 5)
+PAIRWISE_SAMPLE = 2000
+READS = 20
+
+def haversine(lat1, lon1, lat2, lon2):
+    """The per-pair distance in project.py."""
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 6371 * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+def synthetic_catches(count, seed=0):
+    rng = random.Random(seed)
+    spots = [(41.3 + rng.uniform(0, 0.4), -71.9 + rng.uniform(0, 0.8)) for _ in range(SPOTS)]
+    start = datetime(2015, 1, 1)
+    for _ in range(count):
+        lat, lon = rng.choice(spots)
+        lat, lon = lat + rng.gauss(0, 0.003), lon + rng.gauss(0, 0.003)
+        caught = start + timedelta(minutes=rng.randrange(10 * 365 * 24 * 60))
+        yield (USER if rng.random() < 0.8 else rng.randrange(2, 50), '', caught.strftime('%Y-%m-%dT%H:%M'),
+               f"{lat:.5f}, {lon:.5f}", rng.choice(['Eel', 'Bucktail', 'SP Minnow']), f"{rng.randint(20, 50)} in",
+               '', '', 'Full Moon', lat, lon, 'ready')
+
+def scan_near(catches, lat, lon, radius_km):
+    within = []
+    for catch in catches.for_user(USER):
+        if catch.latitude is not None:
+            distance = haversine(lat, lon, catch.latitude, catch.longitude)
+            if distance <= radius_km:
+                within.append((distance, catch.id))
+    return sorted(within)
+
+def pairwise_clusters(points, eps_km=0.15):
+    """Connected components of the 'closer than eps_km' graph, one haversine per pair."""
+    parent = list(range(len(points)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    for i in range(len(points)):
+        for j in range(i + 1, len(points)):
+            if haversine(points[i][0], points[i][1], points[j][0], points[j][1]) <= eps_km:
+                parent[find(i)] = find(j)
+    return len({find(i) for i in range(len(points))})
+
+def median_ms(fn, reads=READS):
+    times = []
+    for _ in range(reads):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000
+
+def main(count=500_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = SQLiteConnections(os.path.join(tmp, 'fishing.db'))
+        migrate(pool)
+        catches = CatchRepository(pool)
+        catches.add_many(list(synthetic_catches(count)))
+        # Centred on a logged catch, so the circles take in one of the spots
+        first = catches.by_id(1)
+        lat, lon = first.latitude, first.longitude
+        for radius_km in RADII_KM:
+            near = catches.near(USER, lat, lon, radius_km)
+            assert sorted(c.id for c, _ in near) == sorted(i for _, i in scan_near(catches, lat, lon, radius_km))
+            indexed = median_ms(lambda: catches.near(USER, lat, lon, radius_km))
+            scan = median_ms(lambda: scan_near(catches, lat, lon, radius_km), reads=3)
+            print(f"{count:,} catches: {len(near):,} of the user's within {radius_km} km; "
+                  f"geohash cells {indexed:.1f} ms, haversine per catch {scan:.0f} ms")
+        season = catches.points_between(USER, datetime(2024, 6, 1), datetime(2024, 9, 1))
+        grid = median_ms(lambda: hotspots(season), reads=5)
+        sample = season[:PAIRWISE_SAMPLE]
+        started = time.perf_counter()
+        components = pairwise_clusters(sample)
+        pairwise = (time.perf_counter() - started) * 1000
+        sample_grid = median_ms(lambda: hotspots(sample, min_catches=1, limit=None))
+        print(f"summer 2024 hotspots from {len(season):,} catches: {len(hotspots(season))} hotspots in {grid:.1f} ms; "
+              f"{len(sample):,}-catch sample {sample_grid:.1f} ms vs {pairwise:,.0f} ms pairwise "
+              f"({components} groups)")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
@@ -0,0 +1,84 @@
+"""Time a 100k-row bulk import against logging the same catches one at a time through /catch.
+
+Starts the app as a subprocess on a throwaway SQLite database with a small
+station catalog and local tide constituents, so tides are predicted without
+NOAA. The one-at-a-time rate, including the job worker's enrichment of each
+catch, is measured on a sample and extrapolated.
+
+Run from the repository root: python -m benchmarks.bench_import [rows]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import requests
+from benchmarks.bench_login_storm import free_port, start_app
+from stations import save_catalog
+
+PASSWORD = 'Striper2024!'
+SAMPLE = 300
+STATIONS = [('8443970', 'Boston', 42.3539, -71.0503), ('8454000', 'Providence', 41.8071, -71.4012),
+            ('8447930', 'Woods Hole', 41.5236, -70.6711), ('8452660', 'Newport', 41.5044, -71.3261)]
+CONSTITUENTS = {'M2': [4.52, 110.9], 'N2': [1.03, 79.4], 'S2': [0.71, 151.6], 'K1': [0.46, 200.1],
+                'O1': [0.37, 185.0], 'K2': [0.19, 148.2], 'M4': [0.09, 47.3]}
+
+def synthetic_rows(count, seed=3):
+    rng = random.Random(seed)
+    for i in range(count):
+        _, _, lat, lon = rng.choice(STATIONS)
+        lat, lon = lat + rng.uniform(-0.1, 0.1), lon + rng.uniform(-0.1, 0.1)
+        yield {'date': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}",
+               'location': f"{lat:.5f}, {lon:.5f}", 'lure': f"Lure {i % 9}",
+               'size': f"{rng.randint(20, 45)} in", 'weight': f"{rng.randint(5, 40)} lb"}
+
+def write_fixtures(tmp):
+    save_catalog([{'id': sid, 'name': name, 'lat': lat, 'lng': lon} for sid, name, lat, lon in STATIONS],
+                 os.path.join(tmp, 'stations.npy'))
+    stations = {sid: {'name': name, 'datum_offset': 5.0, 'utc_offset': -5, 'observes_dst': True,
+                      'constituents': CONSTITUENTS} for sid, name, _, _ in STATIONS}
+    with open(os.path.join(tmp, 'tides.json'), 'w') as f:
+        json.dump({'stations': stations}, f)
+
+def wait_for_jobs(s, base):
+    """Wait until the app's job worker has enriched every queued catch."""
+    while s.get(f'{base}/stats').json()['jobs']['queue'].get('queued'):
+        time.sleep(0.05)
+
+def main(count=100_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        write_fixtures(tmp)
+        port = free_port()
+        proc, base = start_app(tmp, port, workers=0)
+        try:
+            s = requests.Session()
+            s.post(f'{base}/register', data={'username': 'importer', 'password': PASSWORD, 'confirm_password': PASSWORD})
+            login = s.post(f'{base}/login', data={'username': 'importer', 'password': PASSWORD}, allow_redirects=False)
+            # The session cookie is Secure, so send it by hand over plain HTTP
+            s.headers['Cookie'] = f"session={login.cookies['session']}"
+
+            started = time.perf_counter()
+            for row in synthetic_rows(SAMPLE, seed=4):
+                s.post(f'{base}/catch', data=row, allow_redirects=False).raise_for_status()
+            wait_for_jobs(s, base)
+            single = (time.perf_counter() - started) / SAMPLE
+            print(f"one at a time via /catch: {single * 1000:.1f} ms per catch, "
+                  f"~{single * count:.0f} s for {count:,} (measured on {SAMPLE})")
+
+            lines = ['date,location,lure,size,weight']
+            lines += [f"{r['date']},\"{r['location']}\",{r['lure']},{r['size']},{r['weight']}" for r in synthetic_rows(count)]
+            body = ('\n'.join(lines) + '\n').encode()
+            started = time.perf_counter()
+            response = s.post(f'{base}/catches/import', data=body, headers={'Content-Type': 'text/csv'})
+            response.raise_for_status()
+            elapsed = time.perf_counter() - started
+            report = response.json()
+            print(f"bulk import: {elapsed:.2f} s for {report['imported']:,} catches ({len(body) / 1e6:.1f} MB CSV), "
+                  f"{report['pending']} waiting on NOAA, {report['error_count']} errors")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,336 @@
+"""End-to-end load test: the app on a seeded SQLite database, fake NOAA and OpenWeatherMap, a mixed workload.
+
+Seeds a throwaway SQLite database with users and their catch logs, starts
+the fake upstreams (benchmarks/fake_upstreams.py) with the given latencies,
+and starts the app against both, the way it is deployed (gunicorn, or
+uvicorn with ``--server asgi``). The station catalog and tide predictions come
+from the fake NOAA, as they would on a fresh server.
+
+Each of ``--clients`` logged-in clients then runs requests back to back for
+``--duration`` seconds after a ``--warmup``. Each request is drawn from WORKLOAD
+by weight, from a per-client seeded generator, so two runs send the same kind
+of traffic. Per route it reports requests, errors (5xx or connection
+failures), throughput and p50/p95/p99/max latency, printed as a table and
+written as JSON with ``--output``.
+
+Give ``--baseline`` an earlier JSON result to compare against. The exit status
+is 1 when any route's p95 is more than ``--tolerance`` worse (and at least
+``--min-delta-ms`` slower) or its throughput drops by more than ``--tolerance``.
+
+Run from the repository root:
+    python -m benchmarks.bench_load --output before.json
+    python -m benchmarks.bench_load --baseline before.json --output after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import aiohttp
+import bcrypt
+import numpy as np
+from benchmarks.bench_login_storm import PASSWORD, ROOT, free_port
+from benchmarks.fake_upstreams import FakeUpstreams
+from db import SQLiteConnections
+from migrations import migrate
+from repository import CatchRepository, UserRepository
+
+SERVERS = {
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '--workers', '{workers}', '--threads', '{threads}',
+                 '--bind', '127.0.0.1:{port}', 'project:app'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:app', '--workers', '{workers}', '--port', '{port}',
+             '--log-level', 'warning', '--no-access-log'],
+}
+SPOTS = [(41.43, -71.45), (41.37, -71.49), (41.49, -71.31), (41.62, -71.21), (41.55, -70.62), (41.29, -70.10)]
+LURES = ['Bucktail', 'SP Minnow', 'Eel', 'Pencil Popper', 'Darter', 'Needlefish', 'Bomber', 'Tin']
+PHASES = ['New Moon', 'Waxing Crescent', 'First Quarter', 'Waxing Gibbous', 'Full Moon', 'Waning Gibbous',
+          'Last Quarter', 'Waning Crescent']
+HISTORY_DAYS = 2 * 365
+# Distinct /weather locations; fewer cells means more cache hits
+WEATHER_POINTS = 400
+
+def near_spot(rng, spread=0.01):
+    lat, lon = rng.choice(SPOTS)
+    return lat + rng.gauss(0, spread), lon + rng.gauss(0, spread)
+
+def history_day(rng, today):
+    return today - timedelta(days=rng.randrange(HISTORY_DAYS))
+
+def catches_month(rng, today, user):
+    start = history_day(rng, today).replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return 'GET', '/catches', {'params': {'start': start.isoformat(), 'end': end.isoformat()}}
+
+def catches_day(rng, today, user):
+    return 'GET', '/catches', {'params': {'date': history_day(rng, today).isoformat()}}
+
+def weather(rng, today, user):
+    point = rng.randrange(WEATHER_POINTS)
+    lat, lon = SPOTS[point % len(SPOTS)]
+    return 'GET', '/weather', {'params': {'lat': f'{lat + (point // 20) * 0.06:.3f}',
+                                          'lon': f'{lon + (point % 20) * 0.06:.3f}'}}
+
+def log_catch(rng, today, user):
+    lat, lon = near_spot(rng)
+    caught = datetime.combine(today, datetime.min.time()) - timedelta(minutes=rng.randrange(3 * 24 * 60))
+    return 'POST', '/catch', {'data': {
+        'date': caught.strftime('%Y-%m-%dT%H:%M'), 'location': f'{lat:.5f}, {lon:.5f}', 'lure': rng.choice(LURES),
+        'size': f'{rng.randint(20, 48)} in', 'weight': f'{rng.randint(4, 40)} lb'}}
+
+def analytics(rng, today, user):
+    return 'GET', '/analytics', {}
+
+def nearby(rng, today, user):
+    lat, lon = near_spot(rng)
+    return 'GET', '/catches/nearby', {'params': {'lat': f'{lat:.4f}', 'lon': f'{lon:.4f}', 'radius_km': '3'}}
+
+def hotspots(rng, today, user):
+    return 'GET', '/hotspots', {'params': {'season': rng.choice(['spring', 'summer', 'fall']),
+                                           'year': str(today.year - rng.randrange(2))}}
+
+def astronomy(rng, today, user):
+    lat, lon = near_spot(rng)
+    return 'GET', '/astronomy', {'params': {'lat': f'{lat:.3f}', 'lon': f'{lon:.3f}',
+                                            'date': history_day(rng, today).isoformat(), 'days': '7'}}
+
+def login(rng, today, user):
+    return 'POST', '/login', {'data': {'username': user, 'password': PASSWORD}}
+
+def dashboard(rng, today, user):
+    return 'GET', '/', {}
+
+# route name: (request builder, weight)
+WORKLOAD = {
+    'GET /catches (month)': (catches_month, 22),
+    'GET /catches (day)': (catches_day, 14),
+    'GET /weather': (weather, 20),
+    'POST /catch': (log_catch, 10),
+    'GET /analytics': (analytics, 8),
+    'GET /catches/nearby': (nearby, 8),
+    'GET /hotspots': (hotspots, 4),
+    'GET /astronomy': (astronomy, 6),
+    'GET /': (dashboard, 6),
+    'POST /login': (login, 2),
+}
+
+def seed(path, users, catches_per_user, rounds, today, seed=0):
+    """Create ``users`` users sharing one password and ``catches_per_user`` past catches each."""
+    rng = random.Random(seed)
+    pool = SQLiteConnections(path)
+    migrate(pool)
+    password_hash = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds)).decode()
+    user_repo, catch_repo = UserRepository(pool), CatchRepository(pool)
+    names = []
+    for i in range(users):
+        name = f'angler{i:04d}'
+        user_id = user_repo.create(name, password_hash)
+        rows = []
+        for _ in range(catches_per_user):
+            lat, lon = near_spot(rng)
+            caught = datetime.combine(history_day(rng, today), datetime.min.time()) + timedelta(
+                minutes=rng.randrange(24 * 60))
+            rows.append((user_id, '', caught.strftime('%Y-%m-%dT%H:%M'), f'{lat:.5f}, {lon:.5f}', rng.choice(LURES),
+                         f'{rng.randint(20, 50)} in', f'{rng.randint(5, 40)} lb', f'{rng.uniform(-1, 5):.3f} ft',
+                         rng.choice(PHASES), lat, lon, 'ready'))
+        catch_repo.add_many(rows)
+        names.append(name)
+    pool.close()
+    return names
+
+def start_server(args, tmp, port, upstream_base):
+    env = dict(os.environ, FLASK_ENV='development', SECRET_KEY='load-test', PYTHONPATH=ROOT,
+               SQLITE_PATH=os.path.join(tmp, 'fishing.db'), STATION_REFRESH='1',
+               STATION_CATALOG_PATH=os.path.join(tmp, 'stations.npy'),
+               TIDE_CONSTITUENTS_PATH=os.path.join(tmp, 'tides.json'), ASSETS_DIR=os.path.join(tmp, 'assets'),
+               BCRYPT_ROUNDS=str(args.bcrypt_rounds), WEATHER_API_KEY='load-test', NOAA_API_URL=upstream_base,
+               WEATHER_API_URL=f'{upstream_base}/data/2.5/weather')
+    command = [part.format(port=port, workers=args.workers, threads=args.threads) for part in SERVERS[args.server]]
+    proc = subprocess.Popen(command, cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return proc, f'http://127.0.0.1:{port}'
+
+async def wait_until_ready(client, base, timeout=60):
+    """Wait for the app to answer and to have loaded the station catalog from the fake NOAA."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with client.get(f'{base}/stats') as response:
+                if response.status == 200 and (await response.json())['station_catalog']['stations']:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError('app did not become ready')
+
+async def log_in(client, base, user):
+    for _ in range(100):
+        async with client.post(f'{base}/login', data={'username': user, 'password': PASSWORD},
+                               allow_redirects=False) as response:
+            if response.status == 302:
+                return f"session={response.cookies['session'].value}"
+            if response.status != 503:
+                raise RuntimeError(f'login failed for {user}: {response.status}')
+        await asyncio.sleep(float(response.headers.get('Retry-After', 1)))
+    raise RuntimeError(f'login kept being refused for {user}')
+
+async def run_clients(client, base, sessions, seconds, seed, today):
+    """Run every session's client for ``seconds``; return {route: (latencies in ms, statuses)}."""
+    names = list(WORKLOAD)
+    weights = [WORKLOAD[name][1] for name in names]
+    results = {name: ([], []) for name in names}
+    stop = time.monotonic() + seconds
+
+    async def run(index, user, cookie):
+        rng = random.Random(seed * 1000 + index)
+        while time.monotonic() < stop:
+            name = rng.choices(names, weights)[0]
+            method, path, kwargs = WORKLOAD[name][0](rng, today, user)
+            started = time.perf_counter()
+            try:
+                async with client.request(method, base + path, headers={'Cookie': cookie}, allow_redirects=False,
+                                          **kwargs) as response:
+                    await response.read()
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status = 0
+            results[name][0].append((time.perf_counter() - started) * 1000)
+            results[name][1].append(status)
+
+    await asyncio.gather(*(run(i, user, cookie) for i, (user, cookie) in enumerate(sessions)))
+    return results
+
+def summarize(latencies, statuses, seconds):
+    latencies = np.array(latencies)
+    errors = sum(1 for status in statuses if status == 0 or status >= 500)
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (float('nan'),) * 3
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / seconds, 2),
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'max_ms': round(float(latencies.max()), 2) if len(latencies) else None,
+        'statuses': dict(sorted(counts.items())),
+    }
+
+def git_revision():
+    def git(*command):
+        try:
+            return subprocess.run(['git', *command], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+async def load_test(args):
+    today = datetime.now().date()
+    upstreams = FakeUpstreams(args.noaa_latency_ms / 1000, args.weather_latency_ms / 1000, seed=args.seed)
+    upstream_base = upstreams.start()
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        users = seed(os.path.join(tmp, 'fishing.db'), args.users, args.catches, args.bcrypt_rounds, today, args.seed)
+        print(f"seeded {args.users} users x {args.catches:,} catches in {time.perf_counter() - started:.1f}s",
+              file=sys.stderr)
+        proc, base = start_server(args, tmp, free_port(), upstream_base)
+        try:
+            connector = aiohttp.TCPConnector(limit=args.clients * 2)
+            async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60),
+                                             cookie_jar=aiohttp.DummyCookieJar()) as client:
+                await wait_until_ready(client, base)
+                sessions = []
+                for i in range(args.clients):
+                    user = users[i % len(users)]
+                    sessions.append((user, await log_in(client, base, user)))
+                if args.warmup:
+                    await run_clients(client, base, sessions, args.warmup, args.seed + 1, today)
+                upstream_before = dict(upstreams.requests)
+                results = await run_clients(client, base, sessions, args.duration, args.seed, today)
+                async with client.get(f'{base}/stats') as response:
+                    server_stats = await response.json()
+        finally:
+            proc.terminate()
+            proc.wait()
+            upstreams.stop()
+    routes = {name: summarize(latencies, statuses, args.duration)
+              for name, (latencies, statuses) in results.items()}
+    every = [value for latencies, _ in results.values() for value in latencies]
+    return {
+        'meta': {**git_revision(), 'timestamp': datetime.now().isoformat(timespec='seconds'),
+                 'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'config': vars(args) | {'output': None, 'baseline': None},
+        'routes': routes,
+        'total': summarize(every, [s for _, statuses in results.values() for s in statuses], args.duration),
+        'upstream_requests': {name: count - upstream_before.get(name, 0) for name, count in upstreams.requests.items()},
+        'server_stats': {key: server_stats.get(key) for key in ('weather_cache', 'tide_cache', 'jobs', 'db_pool')},
+    }
+
+def print_results(result):
+    print(f"{'route':<22} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8}")
+    for name, row in list(result['routes'].items()) + [('total', result['total'])]:
+        print(f"{name:<22} {row['requests']:>9} {row['errors']:>7} {row['throughput_rps']:>8.1f} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms'] or 0:>8.1f}")
+
+def compare(result, baseline, tolerance, min_delta_ms):
+    """Print each route's p95 and throughput against ``baseline`` and return the names of regressed routes."""
+    regressed = []
+    print(f"\nagainst {(baseline['meta'].get('commit') or 'baseline')[:12]}:")
+    print(f"{'route':<22} {'p95 ms':>16} {'change':>8} {'req/s':>16} {'change':>8}")
+    for name, row in list(result['routes'].items()) + [('total', result['total'])]:
+        before = baseline['total'] if name == 'total' else baseline['routes'].get(name)
+        if not before or not before['requests'] or not row['requests']:
+            continue
+        latency = row['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0.0
+        throughput = row['throughput_rps'] / before['throughput_rps'] - 1 if before['throughput_rps'] else 0.0
+        worse = ((latency > tolerance and row['p95_ms'] - before['p95_ms'] >= min_delta_ms)
+                 or throughput < -tolerance)
+        if worse:
+            regressed.append(name)
+        print(f"{name:<22} {before['p95_ms']:>7.1f} -> {row['p95_ms']:>6.1f} {latency:>+8.0%} "
+              f"{before['throughput_rps']:>7.1f} -> {row['throughput_rps']:>6.1f} {throughput:>+8.0%}"
+              f"{'  REGRESSED' if worse else ''}")
+    return regressed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a mixed workload against the app and report per-route latency.')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds of load before measuring')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent logged-in clients')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--catches', type=int, default=2000, help='seeded catches per user')
+    parser.add_argument('--server', choices=sorted(SERVERS), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='threads per gunicorn worker')
+    parser.add_argument('--noaa-latency-ms', type=float, default=150)
+    parser.add_argument('--weather-latency-ms', type=float, default=100)
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='earlier JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed fractional p95/throughput change')
+    parser.add_argument('--min-delta-ms', type=float, default=2, help='ignore p95 changes smaller than this')
+    args = parser.parse_args(argv)
+    result = asyncio.run(load_test(args))
+    print_results(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressed = compare(result, baseline, args.tolerance, args.min_delta_ms)
+        if regressed:
+            print(f"\nregressions: {', '.join(regressed)}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Measure non-auth route latency while a storm of logins hits the app.
+
+Starts the app twice as a subprocess on a throwaway SQLite database: once
+hashing inline on the request threads (PASSWORD_HASH_WORKERS=0, the old
+behaviour) and once through the bounded bcrypt process pool. In each run
+LOGIN_THREADS clients log in back to back while a probe fetches GET /login
+and records its latency.
+
+Run from the repository root: python -m benchmarks.bench_login_storm [seconds]
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import requests
+
+LOGIN_THREADS = 16
+PROBE_INTERVAL = 0.02
+PASSWORD = 'Striper2024!'
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_app(tmp, port, workers):
+    env = dict(os.environ, FLASK_ENV='development', SECRET_KEY='bench', PORT=str(port),
+               SQLITE_PATH=os.path.join(tmp, f'bench-{port}.db'), STATION_REFRESH='0',
+               STATION_CATALOG_PATH=os.path.join(tmp, 'stations.npy'),
+               TIDE_CONSTITUENTS_PATH=os.path.join(tmp, 'tides.json'),
+               PASSWORD_HASH_WORKERS=str(workers))
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'project.py')], cwd=tmp, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    for _ in range(200):
+        try:
+            requests.get(f'{base}/stats', timeout=1)
+            return proc, base
+        except requests.ConnectionError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError('app did not start')
+
+def storm(base, seconds):
+    requests.post(f'{base}/register', data={'username': 'storm', 'password': PASSWORD, 'confirm_password': PASSWORD})
+    stop = time.monotonic() + seconds
+    statuses = []
+    probes = []
+
+    def login():
+        with requests.Session() as s:
+            while time.monotonic() < stop:
+                r = s.post(f'{base}/login', data={'username': 'storm', 'password': PASSWORD}, allow_redirects=False)
+                statuses.append(r.status_code)
+
+    def probe():
+        with requests.Session() as s:
+            while time.monotonic() < stop:
+                started = time.perf_counter()
+                s.get(f'{base}/login')
+                probes.append(time.perf_counter() - started)
+                time.sleep(PROBE_INTERVAL)
+
+    threads = [threading.Thread(target=login) for _ in range(LOGIN_THREADS)] + [threading.Thread(target=probe)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return np.array(probes) * 1000, statuses
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print(f"{LOGIN_THREADS} login clients for {seconds:.0f}s per run, probing GET /login every {PROBE_INTERVAL * 1000:.0f} ms")
+    print(f"{'mode':<8} {'probe p50':>10} {'p95':>9} {'p99':>9} {'max':>9} {'logins ok':>10} {'503s':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, workers in (('inline', 0), ('pool', int(os.environ.get('PASSWORD_HASH_WORKERS', 2)))):
+            proc, base = start_app(tmp, free_port(), workers)
+            try:
+                probes, statuses = storm(base, seconds)
+            finally:
+                proc.terminate()
+                proc.wait()
+            p50, p95, p99 = np.percentile(probes, [50, 95, 99])
+            ok = sum(1 for status in statuses if status == 302)
+            busy = sum(1 for status in statuses if status == 503)
+            print(f"{mode:<8} {p50:>8.1f}ms {p95:>7.1f}ms {p99:>7.1f}ms {probes.max():>7.1f}ms {ok:>10} {busy:>6}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Compare the vectorized logo_maker against its original per-pixel loop.
+
+Times keying white out of one phone-camera sized image both ways, then a
+folder of images processed serially and across cores.
+
+Run from the repository root: python -m benchmarks.bench_logo_maker [width height]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+from public.static.logo_maker import key_out, process_directory
+
+FOLDER_IMAGES = 16
+FOLDER_SIZE = (1600, 1200)
+
+def legacy_make_background_transparent(img):
+    """The getdata()/putdata() loop logo_maker used to run."""
+    img = img.convert("RGBA")
+    new_data = []
+    for item in img.getdata():
+        if item[0] == 255 and item[1] == 255 and item[2] == 255:
+            new_data.append((255, 255, 255, 0))
+        else:
+            new_data.append(item)
+    img.putdata(new_data)
+    return img
+
+def synthetic_photo(width, height, seed=0):
+    """Noise with a white border, so about a third of the pixels are keyed out."""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 250, size=(height, width, 3), dtype=np.uint8)
+    pixels[:height // 6], pixels[-height // 6:] = 255, 255
+    return Image.fromarray(pixels, 'RGB')
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+def main():
+    width, height = (int(sys.argv[1]), int(sys.argv[2])) if len(sys.argv) > 2 else (4000, 3000)
+    img = synthetic_photo(width, height)
+    print(f"keying white out of a {width}x{height} image")
+    legacy_time, legacy = timed(lambda: legacy_make_background_transparent(img))
+    vector_time, vector = timed(lambda: key_out(img))
+    assert np.array_equal(np.asarray(legacy), np.asarray(vector))
+    print(f"  per-pixel loop: {legacy_time * 1000:9.1f} ms")
+    print(f"  numpy:          {vector_time * 1000:9.1f} ms  ({legacy_time / vector_time:.0f}x faster, identical output)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'src')
+        os.makedirs(src)
+        for i in range(FOLDER_IMAGES):
+            synthetic_photo(*FOLDER_SIZE, seed=i).save(os.path.join(src, f"photo_{i}.jpg"), quality=90)
+        print(f"folder of {FOLDER_IMAGES} {FOLDER_SIZE[0]}x{FOLDER_SIZE[1]} JPEGs, tolerance 8, fit to 512px, {os.cpu_count()} cores")
+        serial, _ = timed(lambda: process_directory(src, os.path.join(tmp, 'serial'), 8, max_size=512, workers=1))
+        parallel, _ = timed(lambda: process_directory(src, os.path.join(tmp, 'parallel'), 8, max_size=512))
+        print(f"  serial:         {serial * 1000:9.1f} ms")
+        print(f"  process pool:   {parallel * 1000:9.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Time importing project and creating the app, then gunicorn worker boot and memory with and without --preload.
+
+Fixtures are a 3000-station catalog and harmonic constituents for every
+station, so create_app() has real shared state to load. The first part runs
+``import project`` and ``create_app()`` in fresh interpreters and reports the
+timings the app records in /stats. The second starts gunicorn with
+gunicorn.conf.py twice, preloading and with GUNICORN_PRELOAD=0, and reports
+how long all workers took to become ready, each worker's fork-to-ready time
+and the workers' private and proportional (PSS) memory from /proc.
+
+Run from the repository root: python -m benchmarks.bench_startup [workers]
+"""
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.bench_login_storm import ROOT, free_port
+from benchmarks.fake_upstreams import synthetic_stations
+from stations import save_catalog
+from tides import CONSTITUENTS
+
+IMPORT_RUNS = 5
+STATIONS = 3000
+BOOT_TIMEOUT = 60
+
+def write_fixtures(tmp):
+    stations = synthetic_stations(STATIONS)
+    save_catalog(stations, os.path.join(tmp, 'stations.npy'))
+    rng = random.Random(0)
+    constituents = {s['id']: {'datum_offset': 5.0, 'utc_offset': -5, 'observes_dst': True,
+                              'constituents': {name: [round(rng.uniform(0, 2), 3), round(rng.uniform(0, 360), 1)]
+                                               for name in CONSTITUENTS}} for s in stations}
+    with open(os.path.join(tmp, 'tides.json'), 'w') as f:
+        json.dump({'stations': constituents}, f)
+
+def app_env(tmp):
+    return dict(os.environ, FLASK_ENV='development', SECRET_KEY='bench', PYTHONPATH=ROOT,
+                SQLITE_PATH=os.path.join(tmp, 'bench.db'), STATION_REFRESH='0',
+                STATION_CATALOG_PATH=os.path.join(tmp, 'stations.npy'),
+                TIDE_CONSTITUENTS_PATH=os.path.join(tmp, 'tides.json'))
+
+def time_import(tmp, create):
+    """Startup timings from a fresh interpreter that imports project and, if ``create``, calls create_app()."""
+    code = ("import json, project\n"
+            + ("project.create_app(start_threads=False)\n" if create else "")
+            + "print(json.dumps(project.startup))")
+    out = subprocess.run([sys.executable, '-c', code], cwd=tmp, env=app_env(tmp), check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def memory_kb(pid):
+    """Return (private, pss) memory of a process in KB, from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields['Private_Clean'] + fields['Private_Dirty'], fields['Pss']
+
+def boot(tmp, workers, preload):
+    """Start gunicorn, wait for every worker to be ready and return (seconds, worker ready ms, memory per worker)."""
+    log_path = os.path.join(tmp, f'gunicorn-{preload}.log')
+    env = dict(app_env(tmp), GUNICORN_PRELOAD='1' if preload else '0')
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+                             '--workers', str(workers), '--bind', f'127.0.0.1:{free_port()}',
+                             '--error-logfile', log_path], cwd=tmp, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            log = ''
+            if os.path.exists(log_path):
+                with open(log_path) as f:
+                    log = f.read()
+            ready = [float(ms) for ms in re.findall(r'Worker ready (\d+) ms after fork', log)]
+            if len(ready) >= workers:
+                break
+            if proc.poll() is not None or time.perf_counter() - started > BOOT_TIMEOUT:
+                raise RuntimeError(f'gunicorn did not start:\n{log}')
+            time.sleep(0.01)
+        seconds = time.perf_counter() - started
+        pids = [int(pid) for pid in re.findall(r'Booting worker with pid: (\d+)', log)]
+        return seconds, ready, [memory_kb(pid) for pid in pids]
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    with tempfile.TemporaryDirectory() as tmp:
+        write_fixtures(tmp)
+        print(f"{STATIONS} stations with {len(CONSTITUENTS)} constituents each, median of {IMPORT_RUNS} fresh interpreters")
+        imports = [time_import(tmp, create=False) for _ in range(IMPORT_RUNS)]
+        created = [time_import(tmp, create=True) for _ in range(IMPORT_RUNS)]
+        print(f"  import project            {statistics.median(r['import_seconds'] for r in imports) * 1000:>7.0f} ms")
+        print(f"  create_app()              {statistics.median(r['create_app_seconds'] for r in created) * 1000:>7.0f} ms")
+        print(f"\ngunicorn, {workers} workers")
+        print(f"{'mode':<10} {'all ready':>10} {'worker p50':>11} {'max':>7} {'private/worker':>15} {'PSS total':>10}")
+        for preload in (True, False):
+            seconds, ready, memory = boot(tmp, workers, preload)
+            private = statistics.mean(kb for kb, _ in memory) / 1024
+            pss = sum(kb for _, kb in memory) / 1024
+            print(f"{'preload' if preload else 'per-worker':<10} {seconds * 1000:>8.0f}ms {statistics.median(ready):>9.0f}ms "
+                  f"{max(ready):>5.0f}ms {private:>12.1f} MB {pss:>7.1f} MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Compare the StationIndex against the original linear haversine scan.
+
+Run from the repository root: python -m benchmarks.bench_stations
+"""
+import random
+import timeit
+from math import radians, sin, cos, sqrt, atan2
+from stations import StationIndex
+
+STATION_COUNT = 3000
+QUERY_COUNT = 500
+
+def haversine(lat1, lon1, lat2, lon2):
+    R = 6371
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
+    return R * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+def linear_scan(lat, lon, stations):
+    """The find_nearest_station implementation this index replaces."""
+    min_distance = float('inf')
+    nearest_station = None
+    for station in stations:
+        distance = haversine(lat, lon, float(station['lat']), float(station['lng']))
+        if distance < min_distance:
+            min_distance = distance
+            nearest_station = station
+    return nearest_station
+
+def best_of(fn, repeat=3):
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+def main():
+    rng = random.Random(0)
+    stations = [{'id': str(i), 'lat': str(rng.uniform(-60, 70)), 'lng': str(rng.uniform(-180, 180))}
+                for i in range(STATION_COUNT)]
+    queries = [(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(QUERY_COUNT)]
+
+    build = timeit.timeit(lambda: StationIndex.from_stations(stations), number=5) / 5
+    index = StationIndex.from_stations(stations)
+    scan = best_of(lambda: [linear_scan(lat, lon, stations) for lat, lon in queries])
+    nearest = best_of(lambda: [index.nearest(lat, lon) for lat, lon in queries])
+    nearest_k = best_of(lambda: [index.nearest(lat, lon, k=5) for lat, lon in queries])
+    lats, lons = zip(*queries)
+    batch = best_of(lambda: index.query_many(lats, lons))
+
+    print(f"stations: {STATION_COUNT}, queries: {QUERY_COUNT}")
+    print(f"index build:        {build * 1e3:8.2f} ms")
+    print(f"linear scan:        {scan / QUERY_COUNT * 1e6:8.1f} us/query")
+    print(f"index nearest-1:    {nearest / QUERY_COUNT * 1e6:8.1f} us/query")
+    print(f"index nearest-5:    {nearest_k / QUERY_COUNT * 1e6:8.1f} us/query")
+    print(f"index batch:        {batch / QUERY_COUNT * 1e6:8.1f} us/query")
+
+if __name__ == '__main__':
+    main()
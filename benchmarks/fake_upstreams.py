@@ -0,0 +1,123 @@
+"""Local stand-ins for NOAA and OpenWeatherMap that answer after a configurable delay, for load tests.
+
+Serves the three upstream calls the app makes, on one port:
+
+    /mdapi/v1.0/webapi/stations.json    the tide station list (synthetic East Coast stations)
+    /api/prod/datagetter                a day of 6-minute predictions for any station
+    /data/2.5/weather                   current weather for any coordinates
+
+Point the app at it with NOAA_API_URL=<base> and WEATHER_API_URL=<base>/data/2.5/weather.
+Each answer waits its upstream's latency, varied by up to ``jitter`` either
+way, on an event loop, so slow answers never hold a thread.
+
+Run on its own: python -m benchmarks.fake_upstreams [port]
+"""
+import asyncio
+import math
+import random
+import sys
+import threading
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from aiohttp import web
+
+TIDE_PERIOD_HOURS = 12.42
+
+def synthetic_stations(count, seed=0):
+    """NOAA-style station dicts scattered along the coast from Florida to Maine."""
+    rng = random.Random(seed)
+    stations = []
+    for i in range(count):
+        t = rng.random()
+        lat = 25 + 20 * t + rng.uniform(-0.3, 0.3)
+        lon = -80.5 + 14 * t ** 1.5 + rng.uniform(-0.5, 0.5)
+        stations.append({'id': str(8400000 + i), 'name': f'Station {i}', 'lat': round(lat, 4), 'lng': round(lon, 4)})
+    return stations
+
+class FakeUpstreams:
+    """The stand-in server; ``start()`` runs it on a background event loop and returns its base URL."""
+
+    def __init__(self, noaa_latency=0.15, weather_latency=0.1, jitter=0.2, stations=3000, seed=0):
+        self.latency = {'noaa': noaa_latency, 'weather': weather_latency}
+        self.jitter = jitter
+        self.stations = synthetic_stations(stations, seed)
+        self.requests = Counter()
+        self.rng = random.Random(seed)
+        self.base = None
+        self._loop = None
+        self._thread = None
+
+    async def _delay(self, upstream):
+        self.requests[upstream] += 1
+        await asyncio.sleep(max(0.0, self.latency[upstream] * (1 + self.rng.uniform(-self.jitter, self.jitter))))
+
+    async def station_list(self, request):
+        await self._delay('noaa')
+        return web.json_response({'count': len(self.stations), 'stations': self.stations})
+
+    async def predictions(self, request):
+        await self._delay('noaa')
+        try:
+            begin = datetime.strptime(request.query['begin_date'], '%Y%m%d %H:%M')
+            end = datetime.strptime(request.query['end_date'], '%Y%m%d %H:%M')
+        except (KeyError, ValueError):
+            return web.json_response({'error': {'message': 'Bad begin_date or end_date'}})
+        # Every station gets its own phase so tides differ along the coast
+        phase = zlib.crc32(request.query.get('station', '').encode()) % 1000 / 1000 * 2 * math.pi
+        predictions, at = [], begin
+        while at <= end:
+            hours = (at - datetime(2000, 1, 1)).total_seconds() / 3600
+            height = 2.5 + 2 * math.sin(2 * math.pi * hours / TIDE_PERIOD_HOURS + phase)
+            predictions.append({'t': at.strftime('%Y-%m-%d %H:%M'), 'v': f'{height:.3f}'})
+            at += timedelta(minutes=6)
+        return web.json_response({'predictions': predictions})
+
+    async def weather(self, request):
+        await self._delay('weather')
+        lat, lon = float(request.query.get('lat', 0)), float(request.query.get('lon', 0))
+        return web.json_response({
+            'coord': {'lat': lat, 'lon': lon},
+            'weather': [{'main': 'Clouds', 'description': 'broken clouds'}],
+            'main': {'temp': round(55 + 10 * math.sin(lat), 1), 'pressure': 1015, 'humidity': 70},
+            'wind': {'speed': 4.6, 'deg': 220},
+            'name': 'Stand-in',
+        })
+
+    def application(self):
+        app = web.Application()
+        app.router.add_get('/mdapi/v1.0/webapi/stations.json', self.station_list)
+        app.router.add_get('/api/prod/datagetter', self.predictions)
+        app.router.add_get('/data/2.5/weather', self.weather)
+        return app
+
+    def start(self, port=0):
+        """Serve on 127.0.0.1:``port`` (0 picks a free one) from a daemon thread and return the base URL."""
+        ready = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            runner = web.AppRunner(self.application(), access_log=None)
+            self._loop.run_until_complete(runner.setup())
+            site = web.TCPSite(runner, '127.0.0.1', port, backlog=1024)
+            self._loop.run_until_complete(site.start())
+            self.base = f"http://127.0.0.1:{runner.addresses[0][1]}"
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(runner.cleanup())
+
+        self._thread = threading.Thread(target=serve, name='fake-upstreams', daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.base
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+if __name__ == '__main__':
+    upstreams = FakeUpstreams()
+    base = upstreams.start(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    print(f"NOAA_API_URL={base} WEATHER_API_URL={base}/data/2.5/weather")
+    threading.Event().wait()
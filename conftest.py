@@ -0,0 +1,19 @@
+import os
+import pytest
+from db import SQLiteConnections
+from migrations import migrate
+from repository import CatchRepository
+
+# Tests import project as the development app, which needs no SECRET_KEY or DATABASE_URL
+os.environ.setdefault('FLASK_ENV', 'development')
+
+@pytest.fixture
+def pool(tmp_path):
+    """A migrated SQLite database in the test's temporary directory."""
+    pool = SQLiteConnections(str(tmp_path / 'fishing.db'))
+    migrate(pool)
+    return pool
+
+@pytest.fixture
+def catches(pool):
+    return CatchRepository(pool)
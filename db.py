@@ -0,0 +1,266 @@
+"""Pooled database connections for the Postgres and SQLite backends."""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+SQLITE_PATH = os.environ.get(
+    'SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fishing.db'))
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available within the checkout timeout."""
+
+class PooledConnection:
+    """Connection proxy whose close() hands the connection back to its pool instead of closing it."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+class ConnectionPool:
+    """Thread-safe per-process pool of Postgres connections.
+
+    Checkouts reuse the most recently returned connection, ping it with
+    ``SELECT 1`` when it has sat idle longer than ``check_after`` seconds and
+    wait up to ``timeout`` seconds when ``maxsize`` connections are in use.
+    Connections idle for more than ``max_idle`` seconds are closed on the next
+    checkout or release. The pool notices when it has been forked and starts
+    over, so a gunicorn worker never shares a socket with its parent.
+    """
+
+    backend = 'postgres'
+
+    def __init__(self, connect, maxsize=10, timeout=30, max_idle=300, check_after=30):
+        self._connect = connect
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self._cond = threading.Condition()
+        self._idle = []  # (connection, returned_at), most recently returned last
+        self._size = 0
+        self._pid = os.getpid()
+        self._inherited = []
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.discarded = 0
+
+    @property
+    def IntegrityError(self):
+        """psycopg2's IntegrityError, so callers can catch it without importing the driver themselves."""
+        import psycopg2
+        return psycopg2.IntegrityError
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:
+            # Keep the parent's connections referenced but untouched; closing them would end its sessions
+            self._inherited.extend(conn for conn, _ in self._idle)
+            self._idle = []
+            self._size = 0
+            self._pid = os.getpid()
+
+    def _reap(self, now):
+        fresh = []
+        for conn, returned_at in self._idle:
+            if now - returned_at > self.max_idle:
+                self._discard(conn)
+            else:
+                fresh.append((conn, returned_at))
+        self._idle = fresh
+
+    def _discard(self, conn):
+        self._size -= 1
+        self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, conn, idle_for):
+        if getattr(conn, 'closed', 0):
+            return False
+        if idle_for < self.check_after:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            conn.rollback()
+            return True
+        except Exception as e:
+            logging.warning(f"Discarding unhealthy pooled connection: {e}")
+            return False
+
+    def connect(self):
+        """Check out a connection wrapped in a PooledConnection."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        while True:
+            with self._cond:
+                self._check_fork()
+                self._reap(time.monotonic())
+                while not self._idle and self._size >= self.maxsize:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                    waited = True
+                    self._cond.wait(remaining)
+                    self._check_fork()
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                else:
+                    conn, returned_at = None, None
+                    self._size += 1
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._healthy(conn, time.monotonic() - returned_at):
+                with self._cond:
+                    self._discard(conn)
+                    self._cond.notify()
+                continue
+            self._record_checkout(time.monotonic() - started, waited)
+            return PooledConnection(self, conn)
+
+    def _record_checkout(self, wait, waited):
+        with self._cond:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+            self.wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any transaction left open."""
+        healthy = not getattr(conn, 'closed', 0)
+        if healthy:
+            try:
+                conn.rollback()
+            except Exception:
+                healthy = False
+        with self._cond:
+            if os.getpid() != self._pid:
+                return
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+            self._reap(time.monotonic())
+            self._cond.notify()
+
+    def close(self):
+        """Close every idle connection."""
+        with self._cond:
+            for conn, _ in self._idle:
+                self._discard(conn)
+            self._idle = []
+
+    def stats(self):
+        with self._cond:
+            return {
+                'backend': self.backend,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'maxsize': self.maxsize,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'discarded': self.discarded,
+                'avg_wait_ms': round(self.wait_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait_seconds * 1000, 3),
+            }
+
+class SQLiteConnections:
+    """One long-lived SQLite connection per thread, opened in WAL mode.
+
+    SQLite connections are cheap but not free to open, and WAL lets the
+    development server's reader threads run alongside a writer.
+    """
+
+    backend = 'sqlite'
+    IntegrityError = sqlite3.IntegrityError
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.checkouts = 0
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._open()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        with self._lock:
+            self.checkouts += 1
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def stats(self):
+        with self._lock:
+            return {'backend': self.backend, 'path': self.path, 'connections': self.opened, 'checkouts': self.checkouts}
+
+_preparing_connection = None
+
+def connect_postgres():
+    """Open a connection to DATABASE_URL that remembers which statements it has prepared."""
+    global _preparing_connection
+    import psycopg2
+    import psycopg2.extensions
+    if _preparing_connection is None:
+        class PreparingConnection(psycopg2.extensions.connection):
+            """psycopg2 connection that remembers which statements it has prepared."""
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.prepared = set()
+        _preparing_connection = PreparingConnection
+    return psycopg2.connect(os.environ['DATABASE_URL'], connection_factory=_preparing_connection)
+
+def create_pool():
+    """Create the connection source for the configured backend; nothing connects until the first checkout."""
+    if os.environ.get('FLASK_ENV') == 'development':
+        return SQLiteConnections(SQLITE_PATH)
+    return ConnectionPool(
+        connect_postgres,
+        maxsize=int(os.environ.get('DB_POOL_SIZE', 10)),
+        timeout=float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        max_idle=float(os.environ.get('DB_POOL_MAX_IDLE', 300)))
@@ -0,0 +1,39 @@
+"""Streaming serializers for catch exports."""
+import csv
+import io
+import json
+
+EXPORT_FIELDS = ('id', 'date', 'location', 'lure', 'size', 'weight', 'tide', 'moon_phase', 'latitude', 'longitude', 'image')
+CHUNK_ROWS = 500
+
+def iter_jsonl(catches, chunk_rows=CHUNK_ROWS):
+    """Yield JSON Lines text for catches, ``chunk_rows`` lines per chunk."""
+    lines = []
+    for catch in catches:
+        lines.append(json.dumps({field: getattr(catch, field) for field in EXPORT_FIELDS}))
+        if len(lines) >= chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def iter_csv(catches, chunk_rows=CHUNK_ROWS):
+    """Yield CSV text for catches, header first, ``chunk_rows`` rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    rows = 0
+    for catch in catches:
+        writer.writerow([getattr(catch, field) for field in EXPORT_FIELDS])
+        rows += 1
+        if rows >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    yield buffer.getvalue()
+
+FORMATS = {
+    'jsonl': (iter_jsonl, 'application/x-ndjson'),
+    'csv': (iter_csv, 'text/csv'),
+}
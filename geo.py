@@ -0,0 +1,177 @@
+"""Geohash grid over catch coordinates: an indexable cell per catch, radius covers and vectorized hotspot clustering.
+
+Every catch stores the geohash of its coordinates (GEOHASH_PRECISION
+characters, cells of about 5 m). A geohash prefix is a grid cell, and all the
+catches in it are one contiguous range of an index on ``(user_id, geohash)``,
+so a radius query is a few B-tree range scans plus an exact distance check.
+The same grid, at HOTSPOT_PRECISION, groups a season's catches into hotspots
+without comparing catches pairwise.
+"""
+import math
+import os
+from collections import Counter
+import numpy as np
+from stations import EARTH_RADIUS_KM, to_unit_vectors
+
+GEOHASH_PRECISION = 9
+ALPHABET = np.array(list('0123456789bcdefghjkmnpqrstuvwxyz'))
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+COVER_CELLS = 16
+HOTSPOT_PRECISION = int(os.environ.get('HOTSPOT_PRECISION', 7))
+HOTSPOT_MIN_CATCHES = int(os.environ.get('HOTSPOT_MIN_CATCHES', 3))
+# Past 'z', so prefix <= geohash < prefix + PREFIX_END covers every hash starting with prefix
+PREFIX_END = '~'
+
+def grid_bits(precision):
+    """Return (latitude bits, longitude bits) of a geohash with ``precision`` characters."""
+    lat_bits = 5 * precision // 2
+    return lat_bits, 5 * precision - lat_bits
+
+def cell_size(precision):
+    """Return a cell's (height, width) in degrees."""
+    lat_bits, lon_bits = grid_bits(precision)
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+def grid_indices(lats, lons, precision):
+    """Return the integer (row, column) of each point's cell on the geohash grid."""
+    lat_bits, lon_bits = grid_bits(precision)
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = (np.asarray(lons, dtype=np.float64) + 180) % 360 - 180
+    rows = np.clip(np.floor((lats + 90) / 180 * 2 ** lat_bits), 0, 2 ** lat_bits - 1).astype(np.int64)
+    cols = np.clip(np.floor((lons + 180) / 360 * 2 ** lon_bits), 0, 2 ** lon_bits - 1).astype(np.int64)
+    return rows, cols
+
+def encode_many(lats, lons, precision=GEOHASH_PRECISION):
+    """Return the geohash of every point as a list, with None where a coordinate is missing."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    missing = np.isnan(lats) | np.isnan(lons)
+    lat_bits, lon_bits = grid_bits(precision)
+    rows, cols = grid_indices(np.where(missing, 0, lats), np.where(missing, 0, lons), precision)
+    # Interleave the bits, longitude first, then read them five at a time
+    value = np.zeros(len(lats), dtype=np.int64)
+    for k in range(5 * precision):
+        index, bits = (cols, lon_bits) if k % 2 == 0 else (rows, lat_bits)
+        value = (value << 1) | ((index >> (bits - 1 - k // 2)) & 1)
+    codes = np.column_stack([(value >> (5 * (precision - 1 - i))) & 31 for i in range(precision)])
+    hashes = np.ascontiguousarray(ALPHABET[codes]).view(f'<U{precision}').ravel()
+    return [None if gap else str(cell) for cell, gap in zip(hashes, missing)]
+
+def encode(lat, lon, precision=GEOHASH_PRECISION):
+    if lat is None or lon is None:
+        return None
+    return encode_many([lat], [lon], precision)[0]
+
+def cover(lat, lon, radius_km, max_precision=GEOHASH_PRECISION, max_cells=COVER_CELLS):
+    """Return the geohash prefixes whose cells cover every point within ``radius_km`` of (lat, lon).
+
+    Uses the finest precision at which the circle's bounding box takes at
+    most ``max_cells`` cells, so few catches outside the circle are read.
+    Radii that reach a pole or need coarser cells than one character get
+    the single prefix '' (everything).
+    """
+    half_height = radius_km / KM_PER_DEGREE
+    if abs(lat) + half_height >= 90:
+        return ['']
+    half_width = min(half_height / math.cos(math.radians(abs(lat) + half_height)), 180)
+    for precision in range(max_precision, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor((lat + half_height + 90) / height) - math.floor((lat - half_height + 90) / height) + 1
+        cols = math.floor((lon + half_width + 180) / width) - math.floor((lon - half_width + 180) / width) + 1
+        if rows * cols <= max_cells:
+            break
+    else:
+        return ['']
+    first_row = math.floor((lat - half_height + 90) / height)
+    first_col = math.floor((lon - half_width + 180) / width)
+    # Sample each cell at its centre; columns past the antimeridian wrap around in encode_many
+    lats = [(first_row + r + 0.5) * height - 90 for r in range(rows) for _ in range(cols)]
+    lons = [(first_col + c + 0.5) * width - 180 for _ in range(rows) for c in range(cols)]
+    return sorted(set(encode_many(lats, lons, precision)))
+
+def distances_km(lat, lon, lats, lons):
+    """Great-circle distance in km from (lat, lon) to each point, as one vectorized haversine."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(np.asarray(lats, dtype=np.float64)), np.radians(np.asarray(lons, dtype=np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def cluster(lats, lons, precision=HOTSPOT_PRECISION):
+    """Label each point with its hotspot: a group of occupied cells joined through their 8 neighbours.
+
+    Points are binned into cells once, the neighbour links between occupied
+    cells are found with a sorted search, and labels spread along the links
+    in whole-array passes until they settle. Cost is O(n log n), never a
+    comparison per pair of points. Returns labels numbered from 0.
+    """
+    lat_bits, lon_bits = grid_bits(precision)
+    rows, cols = grid_indices(lats, lons, precision)
+    columns = 2 ** lon_bits
+    cells, point_cells = np.unique(rows * columns + cols, return_inverse=True)
+    cell_rows, cell_cols = cells // columns, cells % columns
+    sources, targets = [], []
+    # Half the neighbourhood is enough because links go both ways
+    for dr, dc in ((0, 1), (1, -1), (1, 0), (1, 1)):
+        neighbours = (cell_rows + dr) * columns + (cell_cols + dc) % columns
+        found = np.minimum(np.searchsorted(cells, neighbours), len(cells) - 1)
+        linked = (cells[found] == neighbours) & (cell_rows + dr < 2 ** lat_bits)
+        sources.append(np.nonzero(linked)[0])
+        targets.append(found[linked])
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+    labels = np.arange(len(cells))
+    while True:
+        lowest = np.minimum(labels[sources], labels[targets])
+        spread = labels.copy()
+        np.minimum.at(spread, sources, lowest)
+        np.minimum.at(spread, targets, lowest)
+        spread = spread[spread]
+        if np.array_equal(spread, labels):
+            break
+        labels = spread
+    return np.unique(labels, return_inverse=True)[1][point_cells]
+
+def hotspots(points, precision=HOTSPOT_PRECISION, min_catches=HOTSPOT_MIN_CATCHES, limit=20):
+    """Summarize ``(latitude, longitude, size_value, weight_value, lure)`` rows as hotspots, busiest first.
+
+    Each hotspot has its centre, catch count, the distance from the centre to
+    its farthest catch, average size and weight, and most common lure.
+    Groups of fewer than ``min_catches`` catches are left out.
+    """
+    if not points:
+        return []
+    lats, lons, sizes, weights = (np.array([np.nan if p[i] is None else p[i] for p in points], dtype=np.float64)
+                                  for i in range(4))
+    labels = cluster(lats, lons, precision)
+    count = labels.max() + 1
+    catches = np.bincount(labels, minlength=count)
+    # Centres are mean unit vectors, so a group across the antimeridian stays together
+    xyz = to_unit_vectors(lats, lons)
+    sums = np.column_stack([np.bincount(labels, xyz[:, axis], count) for axis in range(3)])
+    centre_lats = np.degrees(np.arctan2(sums[:, 2], np.hypot(sums[:, 0], sums[:, 1])))
+    centre_lons = np.degrees(np.arctan2(sums[:, 1], sums[:, 0]))
+    spread = distances_km(centre_lats[labels], centre_lons[labels], lats, lons)
+    radius = np.zeros(count)
+    np.maximum.at(radius, labels, spread)
+
+    def average(values):
+        known = ~np.isnan(values)
+        totals = np.bincount(labels[known], values[known], count)
+        counts = np.bincount(labels[known], minlength=count)
+        return [round(total / n, 2) if n else None for total, n in zip(totals.tolist(), counts.tolist())]
+
+    avg_sizes, avg_weights = average(sizes), average(weights)
+    order = [int(i) for i in np.argsort(-catches, kind='stable') if catches[i] >= min_catches][:limit]
+    lures = {i: Counter() for i in order}
+    for label, point in zip(labels.tolist(), points):
+        lure = ' '.join(str(point[4] or '').split()).lower()
+        if label in lures and lure:
+            lures[label][lure] += 1
+    return [{
+        'latitude': round(float(centre_lats[i]), 5),
+        'longitude': round(float(centre_lons[i]), 5),
+        'catches': int(catches[i]),
+        'radius_km': round(float(radius[i]), 3),
+        'avg_size': avg_sizes[i],
+        'avg_weight': avg_weights[i],
+        'top_lure': lures[i].most_common(1)[0][0] if lures[i] else None,
+    } for i in order]
@@ -0,0 +1,31 @@
+"""gunicorn settings: build the app once in the master and start each worker's threads after the fork.
+
+    gunicorn -c gunicorn.conf.py
+
+With ``preload_app`` the master imports project and runs create_app(), so
+the station index, tide constituents and asset manifest are loaded once and
+shared copy-on-write by every worker, and a new worker is ready as soon as it
+has forked. Set GUNICORN_PRELOAD=0 to have each worker import and build the
+app itself, for instance to pick up code changes on a HUP.
+"""
+import gc
+import os
+import time
+
+wsgi_app = 'project:create_app(start_threads=False)'
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+def when_ready(server):
+    # Everything the master built is never collected, so the collector does not touch (and copy) its pages in workers
+    if preload_app:
+        gc.freeze()
+
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+def post_worker_init(worker):
+    import project
+    project.create_app(start_threads=False)
+    project.start_worker(worker.forked_at)
+    worker.log.info(f"Worker ready {project.startup['worker_ready_seconds'] * 1000:.0f} ms after fork "
+                    f"(preloaded: {project.startup['preloaded']})")
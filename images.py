@@ -0,0 +1,115 @@
+"""Catch photo storage: content-addressed originals plus WebP and JPEG thumbnails."""
+import hashlib
+import logging
+import os
+import re
+import threading
+from pools import ProcessPool
+
+UPLOADS_DIR = os.path.join('static', 'uploads')
+THUMBNAIL_WIDTHS = (320, 1024)
+THUMBNAIL_FORMATS = (('webp', 'WEBP', {'quality': 80, 'method': 4}),
+                     ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}))
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 1))
+IMAGE_TIMEOUT = float(os.environ.get('IMAGE_TIMEOUT', 120))
+HASH_CHUNK = 1024 * 1024
+CONTENT_NAME_RE = re.compile(r'^([0-9a-f]{32})(?:_(\d+))?\.(png|jpg|gif|webp)$')
+
+def file_digest(path):
+    """Return the first 32 hex digits of a file's SHA-256, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+def is_content_addressed(filename):
+    """True for names this module generates, which never change content and can be cached forever."""
+    return bool(filename and CONTENT_NAME_RE.match(filename))
+
+def thumbnail_names(filename, widths=THUMBNAIL_WIDTHS):
+    """Return [(width, {extension: name})] for a stored original, or [] for older uploads."""
+    match = CONTENT_NAME_RE.match(filename or '')
+    if not match or match.group(2):
+        return []
+    return [(width, {ext: f"{match.group(1)}_{width}.{ext}" for ext, _, _ in THUMBNAIL_FORMATS}) for width in widths]
+
+def _save_atomic(image, path, pil_format, options):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    image.save(tmp_path, pil_format, **options)
+    os.replace(tmp_path, path)
+
+def store_photo(src_path, directory=UPLOADS_DIR, widths=THUMBNAIL_WIDTHS):
+    """Move a sniffed upload into ``directory`` under its content hash and write any missing thumbnails.
+
+    Returns the original's filename. A photo that is already stored is
+    deduplicated: the upload is dropped and existing thumbnails are reused.
+    """
+    from PIL import Image, ImageOps
+    digest = file_digest(src_path)
+    filename = f"{digest}{os.path.splitext(src_path)[1]}"
+    original = os.path.join(directory, filename)
+    if os.path.exists(original):
+        os.remove(src_path)
+    else:
+        os.replace(src_path, original)
+    missing = [(width, names) for width, names in thumbnail_names(filename, widths)
+               if not all(os.path.exists(os.path.join(directory, name)) for name in names.values())]
+    if not missing:
+        return filename
+    try:
+        with Image.open(original) as image:
+            # Let JPEG decode at a reduced scale when the largest thumbnail allows it
+            image.draft('RGB', (max(widths), max(widths)))
+            image = ImageOps.exif_transpose(image)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            for width, names in sorted(missing, reverse=True):
+                thumb = image.copy()
+                thumb.thumbnail((width, width), Image.LANCZOS)
+                for ext, pil_format, options in THUMBNAIL_FORMATS:
+                    _save_atomic(thumb, os.path.join(directory, names[ext]), pil_format, options)
+    except Exception as e:
+        # The original is still served; pages fall back to it when a thumbnail is missing
+        logging.warning(f"Could not make thumbnails for {filename}: {e}")
+    return filename
+
+class ImageProcessor:
+    """Runs store_photo in ``workers`` processes so decoding and resizing never hold up the web process.
+
+    ``workers=0`` processes photos inline on the calling thread.
+    """
+
+    def __init__(self, directory=UPLOADS_DIR, workers=IMAGE_WORKERS, timeout=IMAGE_TIMEOUT, widths=THUMBNAIL_WIDTHS):
+        self.directory = directory
+        self.workers = workers
+        self.timeout = timeout
+        self.widths = widths
+        self._pool = ProcessPool(workers)
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.failed = 0
+
+    def store(self, src_path):
+        """Store a spooled photo and return its content-addressed filename."""
+        try:
+            if self.workers:
+                future = self._pool.submit(store_photo, src_path, self.directory, self.widths)
+                filename = future.result(timeout=self.timeout)
+            else:
+                filename = store_photo(src_path, self.directory, self.widths)
+        except Exception as e:
+            logging.error(f"Error processing photo {src_path}: {e}")
+            with self._lock:
+                self.failed += 1
+            raise
+        with self._lock:
+            self.stored += 1
+        return filename
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+    def stats(self):
+        with self._lock:
+            return {'workers': self.workers, 'stored': self.stored, 'failed': self.failed}
@@ -0,0 +1,145 @@
+"""Streaming parsing and validation for bulk catch imports (CSV or JSON Lines, as exported)."""
+import csv
+import io
+import json
+import os
+from itertools import islice
+from typing import NamedTuple, Optional
+from repository import parse_catch_time
+
+IMPORT_MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', 200000))
+IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS', 100))
+IMPORT_BATCH_ROWS = int(os.environ.get('IMPORT_BATCH_ROWS', 5000))
+REQUIRED_FIELDS = ('date', 'location', 'lure', 'size', 'weight')
+MAX_FIELD_LENGTH = 200
+CONTENT_TYPES = {'text/csv': 'csv', 'application/x-ndjson': 'jsonl', 'application/jsonl': 'jsonl'}
+
+class ImportRowError(Exception):
+    """A row that cannot be imported; the rest of the import carries on without it."""
+
+class ImportedCatch(NamedTuple):
+    line: int
+    date: str
+    location: str
+    lure: str
+    size: str
+    weight: str
+    latitude: Optional[float]
+    longitude: Optional[float]
+
+def import_format(content_type, requested=None):
+    """Return 'csv' or 'jsonl' from an explicit ?format= or the request's Content-Type, or None."""
+    if requested:
+        return requested if requested in ('csv', 'jsonl') else None
+    return CONTENT_TYPES.get((content_type or '').split(';')[0].strip().lower())
+
+def iter_records(stream, fmt):
+    """Yield ``(line, record)`` pairs from a binary stream, decoding it as it is read.
+
+    ``record`` is a dict, or an ImportRowError for a line that is not a JSON object.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line, raw in enumerate(text, start=1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError as e:
+            yield line, ImportRowError(f"Invalid JSON: {e}")
+            continue
+        yield line, record if isinstance(record, dict) else ImportRowError('Expected a JSON object')
+
+def _coordinate(value, limit, name):
+    if value in (None, ''):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ImportRowError(f"{name} must be a number")
+    if not -limit <= number <= limit:
+        raise ImportRowError(f"{name} must be between -{limit} and {limit}")
+    return number
+
+def validate_record(line, record):
+    """Return an ImportedCatch for a parsed record, or raise ImportRowError explaining what is wrong.
+
+    Coordinates come from latitude/longitude fields when present, otherwise
+    from a 'lat, lon' location like the catch form records.
+    """
+    values = {}
+    for field in REQUIRED_FIELDS:
+        value = record.get(field)
+        value = '' if value is None else str(value).strip()
+        if not value:
+            raise ImportRowError(f"Missing {field}")
+        if len(value) > MAX_FIELD_LENGTH:
+            raise ImportRowError(f"{field} is longer than {MAX_FIELD_LENGTH} characters")
+        values[field] = value
+    caught_at = parse_catch_time(values['date'])
+    if caught_at is None:
+        raise ImportRowError(f"Invalid date {values['date']!r}; expected YYYY-MM-DDTHH:MM")
+    values['date'] = caught_at.strftime('%Y-%m-%dT%H:%M')
+    lat = _coordinate(record.get('latitude'), 90, 'latitude')
+    lon = _coordinate(record.get('longitude'), 180, 'longitude')
+    if lat is None and lon is None and ',' in values['location']:
+        try:
+            lat, lon = (_coordinate(part.strip(), limit, name) for part, limit, name
+                        in zip(values['location'].split(',', 1), (90, 180), ('latitude', 'longitude')))
+        except ImportRowError:
+            lat = lon = None  # a place name with a comma, not coordinates
+    if (lat is None) != (lon is None):
+        raise ImportRowError('latitude and longitude must be given together')
+    return ImportedCatch(line, latitude=lat, longitude=lon, **values)
+
+class ImportReport:
+    """Counts and the first ``max_errors`` per-row problems of one import."""
+
+    def __init__(self, max_errors=IMPORT_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.imported = 0
+        self.pending = 0
+        self.errors = []
+        self.error_count = 0
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        return {'imported': self.imported, 'pending': self.pending,
+                'error_count': self.error_count, 'errors': self.errors}
+
+def iter_valid(records, report, max_rows=IMPORT_MAX_ROWS):
+    """Yield ImportedCatch rows from ``iter_records`` output, recording bad rows in ``report``.
+
+    Reading stops after ``max_rows`` records; the first record past the limit is reported.
+    """
+    rows = 0
+    for line, record in records:
+        if rows >= max_rows:
+            report.error(line, f"Imports are limited to {max_rows} rows; the rest were not read")
+            return
+        rows += 1
+        try:
+            if isinstance(record, ImportRowError):
+                raise record
+            catch = validate_record(line, record)
+        except ImportRowError as e:
+            report.error(line, str(e))
+            continue
+        yield catch
+
+def batched(rows, size=IMPORT_BATCH_ROWS):
+    """Yield lists of up to ``size`` rows."""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,206 @@
+"""Durable background jobs kept in the database and run by an in-process worker thread."""
+import json
+import logging
+import os
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+from repository import Repository, Statement
+
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 6))
+JOB_BACKOFF = float(os.environ.get('JOB_BACKOFF_SECONDS', 30))
+JOB_BACKOFF_MAX = float(os.environ.get('JOB_BACKOFF_MAX_SECONDS', 60 * 60))
+JOB_LEASE = float(os.environ.get('JOB_LEASE_SECONDS', 5 * 60))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 2))
+
+class Job(NamedTuple):
+    id: int
+    kind: str
+    payload: dict
+    attempts: int
+
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def backoff_seconds(attempts, base=JOB_BACKOFF, cap=JOB_BACKOFF_MAX):
+    """Exponential backoff for the given attempt number, jittered into [delay/2, delay]."""
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return delay / 2 + random.random() * delay / 2
+
+class JobQueue(Repository):
+    """Jobs table access: enqueue, claim under a lease, then finish, retry or fail.
+
+    A claimed job is marked running with ``run_after`` pushed out by the lease,
+    so a job whose worker died becomes claimable again once the lease expires.
+    Postgres workers claim with ``FOR UPDATE SKIP LOCKED``; SQLite claims
+    inside ``BEGIN IMMEDIATE``.
+    """
+
+    statements = (
+        Statement('insert_job', '''INSERT INTO jobs (kind, payload, status, attempts, run_after, created_at)
+            VALUES (?, ?, 'queued', 0, ?, ?)'''),
+        Statement('next_job', '''SELECT id, kind, payload, attempts FROM jobs
+            WHERE status IN ('queued', 'running') AND run_after <= ? ORDER BY run_after, id LIMIT 1'''),
+        Statement('lease_job', "UPDATE jobs SET status = 'running', attempts = attempts + 1, run_after = ? WHERE id = ?"),
+        Statement('claim_job', '''UPDATE jobs SET status = 'running', attempts = attempts + 1, run_after = ?
+            WHERE id = (SELECT id FROM jobs WHERE status IN ('queued', 'running') AND run_after <= ?
+                        ORDER BY run_after, id LIMIT 1 FOR UPDATE SKIP LOCKED)
+            RETURNING id, kind, payload, attempts'''),
+        Statement('delete_job', 'DELETE FROM jobs WHERE id = ?'),
+        Statement('retry_job', "UPDATE jobs SET status = 'queued', run_after = ?, last_error = ? WHERE id = ?"),
+        Statement('fail_job', "UPDATE jobs SET status = 'failed', last_error = ? WHERE id = ?"),
+        Statement('job_counts', 'SELECT status, COUNT(*) FROM jobs GROUP BY status'),
+    )
+
+    def __init__(self, pool, clock=utc_now):
+        super().__init__(pool)
+        self.clock = clock
+
+    def enqueue(self, kind, payload, delay=0, conn=None):
+        """Queue a job; with ``conn`` it joins the caller's transaction and the caller commits."""
+        now = self.clock()
+        with self.connection(conn) as c:
+            self.execute(c.cursor(), 'insert_job', (
+                kind, json.dumps(payload), self.timestamp(now + timedelta(seconds=delay)), self.timestamp(now)))
+            if conn is None:
+                c.commit()
+
+    def claim(self, lease=JOB_LEASE):
+        """Claim the next due job, or return None when nothing is due."""
+        now = self.clock()
+        until = self.timestamp(now + timedelta(seconds=lease))
+        with self.connection() as conn:
+            c = conn.cursor()
+            if self.backend == 'postgres':
+                row = self.execute(c, 'claim_job', (until, self.timestamp(now))).fetchone()
+            else:
+                c.execute('BEGIN IMMEDIATE')
+                row = self.execute(c, 'next_job', (self.timestamp(now),)).fetchone()
+                if row:
+                    self.execute(c, 'lease_job', (until, row[0]))
+                    row = (*row[:3], row[3] + 1)
+            conn.commit()
+        return Job(row[0], row[1], json.loads(row[2]), row[3]) if row else None
+
+    def finish(self, job):
+        with self.connection() as conn:
+            self.execute(conn.cursor(), 'delete_job', (job.id,))
+            conn.commit()
+
+    def retry(self, job, delay, error):
+        with self.connection() as conn:
+            self.execute(conn.cursor(), 'retry_job', (
+                self.timestamp(self.clock() + timedelta(seconds=delay)), str(error), job.id))
+            conn.commit()
+
+    def fail(self, job, error):
+        with self.connection() as conn:
+            self.execute(conn.cursor(), 'fail_job', (str(error), job.id))
+            conn.commit()
+
+    def counts(self):
+        with self.connection() as conn:
+            return dict(self.execute(conn.cursor(), 'job_counts').fetchall())
+
+class JobWorker:
+    """Runs queued jobs on a daemon thread, one at a time.
+
+    Handlers are called as ``handler(payload, last_attempt)``. A handler that
+    raises is retried with exponential backoff until ``max_attempts`` runs
+    have failed, after which the job is kept as failed with its last error.
+    """
+
+    def __init__(self, queue, handlers, max_attempts=JOB_MAX_ATTEMPTS, poll_interval=JOB_POLL_INTERVAL,
+                 backoff=backoff_seconds):
+        self.queue = queue
+        self.handlers = handlers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.backoff = backoff
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.thread = None
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def run_once(self):
+        """Claim and run one due job; return it, or None when the queue has nothing due."""
+        job = self.queue.claim()
+        if job is None:
+            return None
+        handler = self.handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for job kind '{job.kind}'")
+            handler(job.payload, job.attempts >= self.max_attempts)
+        except Exception as e:
+            if handler is not None and job.attempts < self.max_attempts:
+                delay = self.backoff(job.attempts)
+                logging.warning(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed, retrying in {delay:.0f}s: {e}")
+                self.queue.retry(job, delay, e)
+                with self._lock:
+                    self.retried += 1
+            else:
+                logging.error(f"Job {job.id} ({job.kind}) failed after {job.attempts} attempts: {e}")
+                self.queue.fail(job, e)
+                with self._lock:
+                    self.failed += 1
+        else:
+            self.queue.finish(job)
+            with self._lock:
+                self.processed += 1
+        return job
+
+    def run_pending(self):
+        """Run jobs until none are due and return how many ran."""
+        ran = 0
+        while self.run_once() is not None:
+            ran += 1
+        return ran
+
+    def notify(self):
+        """Wake the worker thread so a job queued just now runs without waiting for the next poll."""
+        self._wake.set()
+
+    def start(self):
+        """Start the worker thread for this process, if it is not already running."""
+        with self._lock:
+            if self.thread is not None and self.thread.is_alive() and self._pid == os.getpid():
+                return self.thread
+            self._pid = os.getpid()
+            self._stop.clear()
+            self.thread = threading.Thread(target=self._loop, name='job-worker', daemon=True)
+            self.thread.start()
+            return self.thread
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            # Clear before looking so a notify() that races with an empty claim is not lost
+            self._wake.clear()
+            try:
+                job = self.run_once()
+            except Exception as e:
+                logging.error(f"Job worker error: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+
+    def stats(self):
+        with self._lock:
+            stats = {'processed': self.processed, 'retried': self.retried, 'failed': self.failed,
+                     'alive': self.thread is not None and self.thread.is_alive()}
+        try:
+            stats['queue'] = self.queue.counts()
+        except Exception as e:
+            logging.warning(f"Could not count jobs: {e}")
+        return stats
@@ -0,0 +1,216 @@
+"""Request, phase, database and upstream timings in Prometheus text format, plus an opt-in slow-request profiler.
+
+Each process keeps its own metrics; under gunicorn every worker reports the
+requests it served, so scrape each worker or sum them on the Prometheus side.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from upstream import LATENCY_BUCKETS, LatencyHistogram
+
+PREFIX = 'striperlog'
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+# name: (help text, label names, bucket bounds)
+FAMILIES = {
+    'http_request': ('Flask request latency by route', ('route', 'method'), LATENCY_BUCKETS),
+    'phase': ('Time spent in each phase of a hot path', ('operation', 'phase'), LATENCY_BUCKETS),
+    'db_query': ('Database statement latency', ('statement',), QUERY_BUCKETS),
+    'upstream_request': ('NOAA and OpenWeatherMap call latency', ('upstream',), LATENCY_BUCKETS),
+}
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 0))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 100))
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(pairs):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+def render_histogram(family, series):
+    """Render ``{label tuple: LatencyHistogram snapshot}`` as a Prometheus histogram and an errors counter."""
+    help_text, names, _ = FAMILIES[family]
+    base = f"{PREFIX}_{family}"
+    lines = [f"# HELP {base}_duration_seconds {help_text}.", f"# TYPE {base}_duration_seconds histogram"]
+    errors = [f"# HELP {base}_errors_total {help_text}: failed calls.", f"# TYPE {base}_errors_total counter"]
+    for values, snapshot in sorted(series.items()):
+        pairs = list(zip(names, values))
+        for bound, count in snapshot['buckets'].items():
+            lines.append(f"{base}_duration_seconds_bucket{_labels(pairs + [('le', bound)])} {count}")
+        lines.append(f"{base}_duration_seconds_sum{_labels(pairs)} {snapshot['sum']}")
+        lines.append(f"{base}_duration_seconds_count{_labels(pairs)} {snapshot['count']}")
+        errors.append(f"{base}_errors_total{_labels(pairs)} {snapshot['errors']}")
+    return lines + errors
+
+def render_stats(stats):
+    """Render the numeric leaves of /stats as one gauge family labelled by component and key."""
+    name = f"{PREFIX}_component_stat"
+    lines = [f"# HELP {name} Numeric values from /stats.", f"# TYPE {name} gauge"]
+    def walk(component, key, value):
+        if isinstance(value, dict):
+            for child, item in value.items():
+                walk(component, f"{key}.{child}" if key else str(child), item)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and value == value:
+            lines.append(f"{name}{_labels([('component', component), ('key', key)])} {value}")
+    for component, value in sorted(stats.items()):
+        walk(component, '', value)
+    return lines
+
+class Metrics:
+    """Latency histograms keyed by family and label values, created on first use."""
+
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, family, **labels):
+        key = (family, tuple(str(labels[name]) for name in FAMILIES[family][1]))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, LatencyHistogram(FAMILIES[family][2]))
+        return histogram
+
+    def observe(self, family, seconds, error=False, **labels):
+        self.histogram(family, **labels).observe(seconds, error)
+
+    @contextmanager
+    def timer(self, family, **labels):
+        """Time the block into ``family``; an exception escaping it counts as an error."""
+        histogram = self.histogram(family, **labels)
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            histogram.observe(time.perf_counter() - started, error=True)
+            raise
+        histogram.observe(time.perf_counter() - started)
+
+    def phase(self, operation, phase):
+        return self.timer('phase', operation=operation, phase=phase)
+
+    def render(self, upstream_latency=None, stats=None):
+        """Return the Prometheus text exposition of every family, with upstream snapshots and /stats gauges."""
+        with self._lock:
+            histograms = dict(self.histograms)
+        series = {family: {} for family in FAMILIES}
+        for (family, values), histogram in histograms.items():
+            series[family][values] = histogram.snapshot()
+        for name, snapshot in (upstream_latency or {}).items():
+            series['upstream_request'][(name,)] = snapshot
+        lines = []
+        for family in FAMILIES:
+            lines += render_histogram(family, series[family])
+        if stats:
+            lines += render_stats(stats)
+        return '\n'.join(lines) + '\n'
+
+def fold_stack(frame):
+    """Return a frame's stack root-first as 'function (file:line);...', the collapsed format flame graphs read."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class SlowRequestProfiler:
+    """Samples the stacks of in-flight requests and writes the slow ones out as collapsed stacks.
+
+    Disabled unless ``threshold_ms`` is positive. While enabled and any
+    request is in flight, a daemon thread wakes every ``interval_ms`` and
+    counts the current stack of each thread that is serving a request. When a request finishes after at least
+    ``threshold_ms`` its counts are written to ``directory`` as a .folded
+    file (one ``stack count`` line each), ready for flamegraph.pl or
+    speedscope; only the newest ``keep`` files are kept.
+    """
+
+    def __init__(self, threshold_ms=PROFILE_SLOW_MS, interval_ms=PROFILE_INTERVAL_MS, directory=PROFILE_DIR,
+                 keep=PROFILE_KEEP):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self.keep = keep
+        self.active = {}
+        self.profiled = 0
+        self.dumped = 0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def begin(self):
+        """Start counting samples for the calling thread's request; returns a token for end(), or None."""
+        if not self.enabled:
+            return None
+        samples = Counter()
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._sample, name='slow-request-profiler', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+            self.active[threading.get_ident()] = samples
+        return samples
+
+    def end(self, token, name, seconds):
+        """Stop sampling the calling thread and return the path written if the request was slow."""
+        if token is None:
+            return None
+        with self._lock:
+            self.active.pop(threading.get_ident(), None)
+            self.profiled += 1
+        if seconds < self.threshold or not token:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_') or 'root'
+        path = os.path.join(self.directory, f"{datetime.now():%Y%m%dT%H%M%S.%f}-{int(seconds * 1000)}ms-{slug}.folded")
+        with open(path, 'w') as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in token.most_common())
+        with self._lock:
+            self.dumped += 1
+        self._prune()
+        return path
+
+    def _prune(self):
+        try:
+            names = sorted(n for n in os.listdir(self.directory) if n.endswith('.folded'))
+            for stale in names[:-self.keep] if self.keep else []:
+                os.remove(os.path.join(self.directory, stale))
+        except OSError:
+            pass
+
+    def _sample(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self.active.items())
+                if not active:
+                    # Exit while idle; the next request's begin() starts a new sampler
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for ident, samples in active:
+                frame = frames.get(ident)
+                if frame is not None and ident != me:
+                    samples[fold_stack(frame)] += 1
+
+    def stats(self):
+        with self._lock:
+            return {'enabled': self.enabled, 'threshold_ms': self.threshold * 1000, 'in_flight': len(self.active),
+                    'profiled': self.profiled, 'dumped': self.dumped}
+
+# The process-wide registry and profiler
+registry = Metrics()
+timer = registry.timer
+phase = registry.phase
+profiler = SlowRequestProfiler()
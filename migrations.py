@@ -0,0 +1,188 @@
+"""Versioned schema migrations for the SQLite and Postgres backends.
+
+Each migration runs once, in order, and records its version in the
+``schema_version`` table. Run them with ``python migrations.py``.
+"""
+import logging
+from analytics import UPSERT_STATS, catch_buckets, tally
+from geo import encode_many
+from repository import parse_catch_time, parse_number
+
+BACKFILL_BATCH = 5000
+POSTGRES_LOCK_KEY = 4242001
+
+def create_tables(c, backend):
+    """Create the original users and catches tables."""
+    key = 'INTEGER PRIMARY KEY AUTOINCREMENT' if backend == 'sqlite' else 'SERIAL PRIMARY KEY'
+    c.execute(f'''CREATE TABLE IF NOT EXISTS users (
+        id {key},
+        username TEXT UNIQUE,
+        password TEXT
+    )''')
+    c.execute(f'''CREATE TABLE IF NOT EXISTS catches (
+        id {key},
+        user_id INTEGER,
+        image TEXT,
+        date TEXT,
+        location TEXT,
+        lure TEXT,
+        size TEXT,
+        weight TEXT,
+        tide TEXT,
+        moon_phase TEXT,
+        latitude REAL,
+        longitude REAL,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )''')
+
+def columns(c, backend, table):
+    if backend == 'sqlite':
+        c.execute(f'PRAGMA table_info({table})')
+        return {row[1] for row in c.fetchall()}
+    c.execute('SELECT column_name FROM information_schema.columns WHERE table_name = %s', (table,))
+    return {row[0] for row in c.fetchall()}
+
+def add_typed_catch_columns(c, backend):
+    """Add a real timestamp and numeric size/weight/tide columns, backfill them and index by user and time.
+
+    The free-text columns stay as entered for display; the typed copies are
+    what queries filter and aggregate on.
+    """
+    existing = columns(c, backend, 'catches')
+    for name, kind in (('caught_at', 'TIMESTAMP'), ('size_value', 'REAL'), ('weight_value', 'REAL'), ('tide_ft', 'REAL')):
+        if name not in existing:
+            c.execute(f'ALTER TABLE catches ADD COLUMN {name} {kind}')
+    ph = '?' if backend == 'sqlite' else '%s'
+    last_id = 0
+    while True:
+        c.execute(f'SELECT id, date, size, weight, tide FROM catches WHERE id > {ph} ORDER BY id LIMIT {BACKFILL_BATCH}', (last_id,))
+        rows = c.fetchall()
+        if not rows:
+            break
+        updates = []
+        for catch_id, date, size, weight, tide in rows:
+            caught_at = parse_catch_time(date)
+            if caught_at is not None and backend == 'sqlite':
+                caught_at = caught_at.isoformat(sep=' ', timespec='seconds')
+            updates.append((caught_at, parse_number(size), parse_number(weight), parse_number(tide), catch_id))
+        c.executemany(f'UPDATE catches SET caught_at = {ph}, size_value = {ph}, weight_value = {ph}, tide_ft = {ph} WHERE id = {ph}', updates)
+        last_id = rows[-1][0]
+    c.execute('CREATE INDEX IF NOT EXISTS idx_catches_user_caught_at ON catches (user_id, caught_at)')
+
+def add_catch_status_and_jobs(c, backend):
+    """Add a catch status for background enrichment and the jobs table that drives it."""
+    if 'status' not in columns(c, backend, 'catches'):
+        c.execute("ALTER TABLE catches ADD COLUMN status TEXT DEFAULT 'ready'")
+    key = 'INTEGER PRIMARY KEY AUTOINCREMENT' if backend == 'sqlite' else 'SERIAL PRIMARY KEY'
+    c.execute(f'''CREATE TABLE IF NOT EXISTS jobs (
+        id {key},
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        run_after TIMESTAMP NOT NULL,
+        last_error TEXT,
+        created_at TIMESTAMP
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs (status, run_after)')
+
+def add_catch_stats(c, backend):
+    """Create the per-user catch_stats aggregates and fold every existing catch into them."""
+    c.execute('''CREATE TABLE IF NOT EXISTS catch_stats (
+        user_id INTEGER NOT NULL,
+        dimension TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        catches INTEGER NOT NULL DEFAULT 0,
+        sized INTEGER NOT NULL DEFAULT 0,
+        size_total REAL NOT NULL DEFAULT 0,
+        weighed INTEGER NOT NULL DEFAULT 0,
+        weight_total REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, dimension, bucket)
+    )''')
+    ph = '?' if backend == 'sqlite' else '%s'
+    upsert = UPSERT_STATS if backend == 'sqlite' else UPSERT_STATS.replace('?', '%s')
+    last_id = 0
+    while True:
+        c.execute(f'''SELECT id, user_id, date, moon_phase, tide_ft, lure, latitude, longitude, size_value, weight_value
+            FROM catches WHERE id > {ph} ORDER BY id LIMIT {BACKFILL_BATCH}''', (last_id,))
+        rows = c.fetchall()
+        if not rows:
+            break
+        c.executemany(upsert, tally(
+            (user_id, catch_buckets(parse_catch_time(date), moon_phase, tide_ft, lure, lat, lon), size, weight, 1)
+            for _, user_id, date, moon_phase, tide_ft, lure, lat, lon, size, weight in rows))
+        last_id = rows[-1][0]
+
+def add_catch_geohash(c, backend):
+    """Add a geohash column for catch coordinates, backfill it and index it by user.
+
+    Postgres compares it bytewise so a prefix is one contiguous index range.
+    """
+    if 'geohash' not in columns(c, backend, 'catches'):
+        c.execute('ALTER TABLE catches ADD COLUMN geohash TEXT' + ('' if backend == 'sqlite' else ' COLLATE "C"'))
+    ph = '?' if backend == 'sqlite' else '%s'
+    last_id = 0
+    while True:
+        c.execute(f'''SELECT id, latitude, longitude FROM catches
+            WHERE id > {ph} AND latitude IS NOT NULL AND longitude IS NOT NULL ORDER BY id LIMIT {BACKFILL_BATCH}''', (last_id,))
+        rows = c.fetchall()
+        if not rows:
+            break
+        hashes = encode_many([row[1] for row in rows], [row[2] for row in rows])
+        c.executemany(f'UPDATE catches SET geohash = {ph} WHERE id = {ph}',
+                      [(geohash, row[0]) for geohash, row in zip(hashes, rows)])
+        last_id = rows[-1][0]
+    c.execute('CREATE INDEX IF NOT EXISTS idx_catches_user_geohash ON catches (user_id, geohash)')
+
+MIGRATIONS = [
+    (1, 'create users and catches', create_tables),
+    (2, 'typed catch columns and (user_id, caught_at) index', add_typed_catch_columns),
+    (3, 'catch status and background jobs table', add_catch_status_and_jobs),
+    (4, 'per-user catch_stats aggregates', add_catch_stats),
+    (5, 'catch geohash and (user_id, geohash) index', add_catch_geohash),
+]
+
+def current_version(c):
+    c.execute('SELECT MAX(version) FROM schema_version')
+    row = c.fetchone()
+    return row[0] or 0
+
+def migrate(pool):
+    """Apply pending migrations and return the list of versions applied."""
+    backend = pool.backend
+    conn = pool.connect()
+    applied = []
+    try:
+        c = conn.cursor()
+        c.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, name TEXT)')
+        conn.commit()
+        if backend == 'postgres':
+            # Serialize workers booting at the same time
+            c.execute('SELECT pg_advisory_lock(%s)', (POSTGRES_LOCK_KEY,))
+        try:
+            for version, name, apply in MIGRATIONS:
+                if backend == 'sqlite':
+                    c.execute('BEGIN IMMEDIATE')
+                if version <= current_version(c):
+                    conn.rollback()
+                    continue
+                logging.info(f"Applying migration {version}: {name}")
+                apply(c, backend)
+                ph = '?' if backend == 'sqlite' else '%s'
+                c.execute(f'INSERT INTO schema_version (version, name) VALUES ({ph}, {ph})', (version, name))
+                conn.commit()
+                applied.append(version)
+        finally:
+            if backend == 'postgres':
+                conn.rollback()
+                c.execute('SELECT pg_advisory_unlock(%s)', (POSTGRES_LOCK_KEY,))
+                conn.commit()
+    finally:
+        conn.close()
+    return applied
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from db import create_pool
+    load_dotenv()
+    print(f"Applied migrations: {migrate(create_pool()) or 'none'}")
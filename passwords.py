@@ -0,0 +1,132 @@
+"""Password hashing off the request thread, in a bounded pool of worker processes."""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from pools import ProcessPool
+
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 8))
+HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool is saturated or a hash does not finish in time."""
+
+def hash_password(password, rounds):
+    import bcrypt
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def check_password(password, hashed):
+    import bcrypt
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+def hash_rounds(hashed):
+    """Return the cost factor of a '$2b$12$...' bcrypt hash, or None if it is not one."""
+    parts = hashed.split('$')
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    """Runs bcrypt in ``workers`` processes with at most ``max_pending`` more hashes queued.
+
+    A login storm can then use at most ``workers`` cores; requests beyond the
+    queue limit fail fast with HasherBusy instead of piling up behind it.
+    ``workers=0`` hashes inline on the calling thread, as the app used to.
+    """
+
+    def __init__(self, rounds=BCRYPT_ROUNDS, workers=HASH_WORKERS, max_pending=HASH_QUEUE,
+                 timeout=HASH_TIMEOUT, executor_factory=None):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pool = ProcessPool(workers, executor_factory=executor_factory)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers + max_pending) if workers else None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.rehashed = 0
+        self.busy_seconds = 0.0
+
+    def _run(self, fn, *args):
+        started = time.monotonic()
+        if self._slots is None:
+            result = fn(*args)
+        else:
+            if not self._slots.acquire(blocking=False):
+                with self._lock:
+                    self.rejected += 1
+                raise HasherBusy('Password hashing queue is full')
+            with self._lock:
+                self.in_flight += 1
+            try:
+                future = self._pool.submit(fn, *args)
+            except Exception:
+                self._done()
+                raise
+            future.add_done_callback(self._done)
+            try:
+                result = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                with self._lock:
+                    self.timeouts += 1
+                raise HasherBusy(f"Password hashing took longer than {self.timeout}s")
+        with self._lock:
+            self.completed += 1
+            self.busy_seconds += time.monotonic() - started
+        return result
+
+    def _done(self, future=None):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.rounds)
+
+    def verify(self, password, hashed):
+        return self._run(check_password, password, hashed)
+
+    def needs_rehash(self, hashed):
+        return hash_rounds(hashed) != self.rounds
+
+    def rehash(self, password, hashed, save):
+        """After a successful login, re-hash at the configured cost if the stored hash differs.
+
+        Best effort: a saturated pool just leaves the old hash for next time.
+        """
+        if not self.needs_rehash(hashed):
+            return False
+        try:
+            save(self.hash(password))
+        except HasherBusy:
+            return False
+        except Exception as e:
+            logging.warning(f"Could not rehash password: {e}")
+            return False
+        with self._lock:
+            self.rehashed += 1
+        return True
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rounds': self.rounds,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'rehashed': self.rehashed,
+                'avg_ms': round(self.busy_seconds / self.completed * 1000, 3) if self.completed else 0.0,
+            }
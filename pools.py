@@ -0,0 +1,40 @@
+"""Process pools for CPU-heavy work, started lazily and never forked from a threaded web worker."""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Forking a process that already runs request and job threads can copy a lock another thread holds
+START_METHOD = os.environ.get(
+    'PROCESS_START_METHOD', 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+class ProcessPool:
+    """A ProcessPoolExecutor of ``workers`` processes, created on first use in each process.
+
+    Pool processes are started with ``start_method`` (forkserver or spawn by
+    default), so they are clean interpreters rather than forks of the caller.
+    A pool inherited across a fork is replaced, never shared with the parent.
+    ``executor_factory`` builds some other executor instead, as tests do.
+    """
+
+    def __init__(self, workers, start_method=START_METHOD, executor_factory=None):
+        self.workers = workers
+        self._executor_factory = executor_factory or (lambda: ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context(start_method)))
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = self._executor_factory()
+                self._pid = os.getpid()
+            executor = self._executor
+        return executor.submit(fn, *args)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
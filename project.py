@@ -1,22 +1,45 @@
-from flask import Flask, request, send_from_directory, redirect, session, jsonify, render_template
-import psycopg2
-import sqlite3
-import bcrypt
-import requests
+import time
+# Import time in /stats is counted from here, so it includes Flask and every module below
+IMPORT_STARTED = time.perf_counter()
+from flask import Flask, request, send_from_directory, redirect, session, jsonify, render_template, Response, stream_with_context, g
+import numpy as np
 from dotenv import load_dotenv
 import os
 from datetime import datetime, timedelta, timezone
-import base64
 from math import radians, sin, cos, sqrt, atan2
 import logging
 import re
+import threading
+from jinja2 import ChoiceLoader, FileSystemLoader
+from werkzeug.exceptions import RequestEntityTooLarge
+from analytics import DIMENSIONS as ANALYTICS_DIMENSIONS, summarize
+from assets import AssetStore
+from astronomy import AstronomyTable, day_numbers, moon_phase, moon_phases
+from db import create_pool
+from export import FORMATS as EXPORT_FORMATS
+from geo import hotspots
+from images import ImageProcessor, is_content_addressed, thumbnail_names
+from imports import (IMPORT_BATCH_ROWS, ImportReport, batched, import_format, iter_records,
+                     iter_valid)
+from jobs import JobQueue, JobWorker
+import metrics
+from migrations import migrate
+from passwords import HasherBusy, PasswordHasher
+from repository import CatchRepository, UserRepository, parse_catch_time
+from stations import StationCatalog
+from tides import TideEngine, TidePredictionCache
+import upstream
+from uploads import INCOMING_DIR, UploadRejected, UploadRequest, spool_data_url
+from weather import WeatherCache, WeatherUnavailable
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__, static_folder='public', template_folder='public')
+# Photo uploads stream straight to disk instead of being buffered in memory
+app.request_class = UploadRequest
 
-# Set secret key from environment variable
+# Set secret key from environment variable; a misconfigured deploy fails here, at import, before it serves anything
 app.secret_key = os.environ.get('SECRET_KEY')
 if not app.secret_key:
     if os.environ.get('FLASK_ENV') == 'development':
@@ -24,98 +47,99 @@ if not app.secret_key:
         print("Warning: Using a temporary secret key for development.")
     else:
         raise ValueError("Error: You must set a SECRET_KEY in production!")
+if os.environ.get('FLASK_ENV') != 'development' and not os.environ.get('DATABASE_URL'):
+    raise ValueError("Error: You must set a DATABASE_URL in production!")
 
 # Production configurations
 app.config['SESSION_COOKIE_SECURE'] = True
 app.config['PERMANENT_SESSION_LIFETIME'] = 24 * 60 * 60
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 app.config['PREFERRED_URL_SCHEME'] = 'https' if os.environ.get('FLASK_ENV') != 'development' else 'http'
+# Let a fronting nginx or Apache send files itself
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
 
 # Logging setup for production
 if os.environ.get('FLASK_ENV') != 'development':
     logging.basicConfig(level=logging.INFO)
 
-# Create uploads directory
+# Migrations run at startup only when asked to; deploys run `python migrations.py` first
+MIGRATE_ON_START = os.environ.get('MIGRATE_ON_START', '1' if os.environ.get('FLASK_ENV') == 'development' else '0') != '0'
+
+# Startup timings for /stats; worker_ready_seconds is set in gunicorn workers
+startup = {'import_seconds': None, 'create_app_seconds': None, 'worker_ready_seconds': None, 'preloaded': False}
+_startup_lock = threading.Lock()
+_startup_pid = None
+_worker_pid = None
+
+# Served as project:app without create_app(), each process starts itself on its first request
+@app.before_request
+def ensure_started():
+    if _startup_pid is None or _worker_pid != os.getpid():
+        create_app()
+
+# Per-route latency for /metrics, and stacks of slow requests when PROFILE_SLOW_MS is set
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.profile = metrics.profiler.begin()
+
+@app.after_request
+def record_status(response):
+    g.status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(error=None):
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = 500 if error is not None else g.pop('status', 500)
+    metrics.registry.observe('http_request', seconds, error=status >= 500, route=route, method=request.method)
+    path = metrics.profiler.end(g.pop('profile', None), f"{request.method} {route}", seconds)
+    if path:
+        logging.warning(f"Slow request {request.method} {request.path} took {seconds * 1000:.0f} ms, stacks in {path}")
+
+# Uploads directory, created by create_app()
 uploads_dir = os.path.join('static', 'uploads')
-if not os.path.exists(uploads_dir):
-    os.makedirs(uploads_dir)
+# Photos waiting for the background worker, kept out of the public uploads folder
+incoming_dir = INCOMING_DIR
 
-# Database connection function
+# Database connection function, backed by a per-worker pool
+db_pool = create_pool()
 def get_db_connection():
-    if os.environ.get('FLASK_ENV') == 'development':
-        db_path = os.path.join(os.path.dirname(__file__), 'fishing.db')
-        conn = sqlite3.connect(db_path)
-    else:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-    return conn
+    return db_pool.connect()
+
+users = UserRepository(db_pool)
+catch_records = CatchRepository(db_pool)
+
+# bcrypt runs in a small process pool so a burst of logins cannot tie up every worker
+password_hasher = PasswordHasher()
+BUSY_MESSAGE = 'Too many sign-in attempts right now, please try again in a moment'
+BUSY_HEADERS = {'Retry-After': '1'}
 
 # Initialize database
 def init_db():
-    conn = get_db_connection()
     try:
-        c = conn.cursor()
-        if os.environ.get('FLASK_ENV') == 'development':
-            c.execute('''CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE,
-                password TEXT
-            )''')
-            c.execute('''CREATE TABLE IF NOT EXISTS catches (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                image TEXT,
-                date TEXT,
-                location TEXT,
-                lure TEXT,
-                size TEXT,
-                weight TEXT,
-                tide TEXT,
-                moon_phase TEXT,
-                latitude REAL,
-                longitude REAL,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )''')
-        else:
-            c.execute('''CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username TEXT UNIQUE,
-                password TEXT
-            )''')
-            c.execute('''CREATE TABLE IF NOT EXISTS catches (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER,
-                image TEXT,
-                date TEXT,
-                location TEXT,
-                lure TEXT,
-                size TEXT,
-                weight TEXT,
-                tide TEXT,
-                moon_phase TEXT,
-                latitude REAL,
-                longitude REAL,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )''')
-        conn.commit()
-        print("Tables created successfully")
+        applied = migrate(db_pool)
+        print(f"Database schema up to date (applied migrations: {applied or 'none'})")
     except Exception as e:
         print(f"Error initializing database: {e}")
         if os.environ.get('FLASK_ENV') != 'development':
             logging.error(f"Error initializing database: {e}")
-    finally:
-        conn.close()
 
-# Load NOAA tide stations
-stations = []
+# NOAA tide stations; a stale catalog is refreshed in the background by start_worker()
+station_catalog = StationCatalog(refresh=os.environ.get('STATION_REFRESH', '1') != '0')
 def load_stations():
-    """Load the list of NOAA tide stations with predictions."""
-    global stations
-    url = "https://api.tidesandcurrents.noaa.gov/mdapi/v1.0/webapi/stations.json?type=tidepredictions"
-    response = requests.get(url)
-    if response.status_code == 200:
-        stations = response.json()['stations']
-    else:
-        stations = []
+    """Load the local NOAA tide station catalog."""
+    station_catalog.load(refresh=False)
+
+# Local tide engine built from cached harmonic constituents, loaded by create_app()
+tide_engine = TideEngine()
+def load_tide_engine():
+    global tide_engine
+    tide_engine = TideEngine.load()
 
 # Helper functions
 def format_time(date_str):
@@ -126,6 +150,46 @@ def format_time(date_str):
     hours = hours % 12 or 12
     return f"{hours}:{minutes:02d}{period}"
 
+def parse_range_param(value):
+    """Parse a FullCalendar start/end parameter into a naive local datetime."""
+    if not value:
+        return None
+    # An unescaped '+' in a UTC offset arrives as a space
+    value = value.strip().replace(' ', '+').replace('Z', '+00:00')
+    return datetime.fromisoformat(value).replace(tzinfo=None)
+
+# First month of each meteorological season
+SEASONS = {'spring': 3, 'summer': 6, 'fall': 9, 'winter': 12}
+
+def season_range(season=None, year=None, today=None):
+    """Return [start, end) of a season, by default the current one.
+
+    Without a year it is the latest one to have started; winter runs from
+    December into the next year.
+    """
+    today = today or datetime.now()
+    if season is None:
+        season = next(name for name, month in SEASONS.items() if (today.month - month) % 12 < 3)
+    month = SEASONS[season]
+    if year is None:
+        year = today.year if datetime(today.year, month, 1) <= today else today.year - 1
+    return datetime(year, month, 1), datetime(year + (month + 2) // 12, (month + 2) % 12 + 1, 1)
+
+MAX_EVENTS_PAGE = 1000
+MAX_NEARBY_KM = 200
+MAX_NEARBY_RESULTS = 500
+MAX_ASTRONOMY_YEARS = 100
+
+def encode_events_cursor(event):
+    """Encode the (caught_at, id) keyset position after an event."""
+    return f"{event.caught_at.isoformat(timespec='seconds')}_{event.id}"
+
+def decode_events_cursor(cursor):
+    if not cursor:
+        return None
+    caught_at, catch_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(caught_at), int(catch_id)
+
 def geocode_location(location):
     """Convert an automatic 'lat, lon' location string to latitude and longitude."""
     try:
@@ -144,57 +208,228 @@ def haversine(lat1, lon1, lat2, lon2):
     c = 2 * atan2(sqrt(a), sqrt(1 - a))
     return R * c
 
-def find_nearest_station(lat, lon, stations):
+def find_nearest_station(lat, lon, index):
     """Find the tide station closest to the given coordinates."""
-    min_distance = float('inf')
-    nearest_station = None
-    for station in stations:
-        station_lat = float(station['lat'])
-        station_lon = float(station['lng'])
-        distance = haversine(lat, lon, station_lat, station_lon)
-        if distance < min_distance:
-            min_distance = distance
-            nearest_station = station
-    return nearest_station
-
-def get_tide_prediction(station_id, date_time):
-    """Get the tide level prediction for a specific station and time."""
-    begin_date = date_time.strftime("%Y%m%d %H:%M")
-    end_date = (date_time + timedelta(minutes=1)).strftime("%Y%m%d %H:%M")
-    url = f"https://api.tidesandcurrents.noaa.gov/api/prod/datagetter?product=predictions&begin_date={begin_date}&end_date={end_date}&datum=MLLW&station={station_id}&time_zone=lst_ldt&units=english&format=json"
-    response = requests.get(url)
+    matches = index.nearest(lat, lon)
+    return matches[0][0] if matches else None
+
+def load_tide_day(station_id, day):
+    """Load a station's 6-minute prediction series for one local day."""
+    station = tide_engine.get(station_id)
+    if station is not None:
+        return station.day_series(day)
+    begin_date = day.strftime("%Y%m%d 00:00")
+    end_date = (day + timedelta(days=1)).strftime("%Y%m%d 00:00")
+    url = f"{upstream.NOAA_API_URL}/api/prod/datagetter?product=predictions&begin_date={begin_date}&end_date={end_date}&datum=MLLW&station={station_id}&time_zone=lst_ldt&interval=6&units=english&format=json"
+    response = upstream.http.get(url, upstream='noaa_predictions')
     if response.status_code == 200:
         data = response.json()
         if 'predictions' in data and data['predictions']:
-            prediction = data['predictions'][0]
-            return prediction['v']
+            times = np.array([p['t'] for p in data['predictions']], dtype='datetime64[m]')
+            heights = np.array([float(p['v']) for p in data['predictions']])
+            return times, heights
     return None
 
+# Shared tide prediction cache, one day-long series per station
+tide_cache = TidePredictionCache(
+    load_tide_day,
+    maxsize=int(os.environ.get('TIDE_CACHE_SIZE', 512)),
+    ttl=int(os.environ.get('TIDE_CACHE_TTL', 24 * 60 * 60)))
+
+# Weather is cached per ~5 km grid cell and shared across users
+weather_cache = WeatherCache(os.environ.get('WEATHER_API_KEY'))
+
+def get_tide_prediction(station_id, date_time):
+    """Get the tide level prediction for a specific station and time."""
+    # date_time is the station's local wall-clock time, as NOAA's lst_ldt expects
+    tide_level = tide_cache.get(station_id, date_time.replace(tzinfo=None))
+    return f"{tide_level:.3f}" if tide_level is not None else None
+
 def get_moon_phase(date):
     """Calculate the moon phase based on the given date."""
-    known_new_moon = datetime(2000, 1, 6, 18, 14, tzinfo=timezone.utc)
-    cycle_length = 29.53058867  # Lunar cycle in days
-    days_since_new_moon = (date - known_new_moon).total_seconds() / (24 * 3600)
-    phase_fraction = (days_since_new_moon % cycle_length) / cycle_length
-    if phase_fraction < 0:
-        phase_fraction += 1
-    if phase_fraction < 0.02 or phase_fraction >= 0.98:
-        return 'New Moon'
-    elif phase_fraction < 0.23:
-        return 'Waxing Crescent'
-    elif phase_fraction < 0.27:
-        return 'First Quarter'
-    elif phase_fraction < 0.48:
-        return 'Waxing Gibbous'
-    elif phase_fraction < 0.52:
-        return 'Full Moon'
-    elif phase_fraction < 0.73:
-        return 'Waning Gibbous'
-    elif phase_fraction < 0.77:
-        return 'Last Quarter'
-    elif phase_fraction < 0.98:
-        return 'Waning Crescent'
-    return 'Unknown'
+    return moon_phase(date)
+
+# Background catch enrichment
+class EnrichmentPending(Exception):
+    """Raised when a catch cannot be enriched yet and its job should be retried."""
+
+def save_catch_image(spool_path):
+    """Store a spooled photo under its content hash, with thumbnails, and return its filename."""
+    if spool_path.endswith('.b64'):
+        # Queued before photos were decoded on upload
+        with open(spool_path) as f:
+            decoded_path = spool_data_url(f.read(), incoming_dir)
+        os.remove(spool_path)
+        if decoded_path is None:
+            return ''
+        spool_path = decoded_path
+    return image_processor.store(spool_path)
+
+def lookup_tide(lat, lon, local_time):
+    """Return the tide text for a catch, raising EnrichmentPending while it cannot be looked up yet."""
+    index = station_catalog.index
+    if len(index) == 0:
+        raise EnrichmentPending('Station catalog is not loaded yet')
+    with metrics.phase('enrich_catch', 'station_lookup'):
+        nearest_station = find_nearest_station(lat, lon, index)
+    with metrics.phase('enrich_catch', 'tide_fetch'):
+        tide_level = get_tide_prediction(nearest_station['id'], local_time)
+    if tide_level is None:
+        raise EnrichmentPending(f"No tide prediction for station {nearest_station['id']}")
+    return f"{tide_level} ft"
+
+def lookup_tides(lats, lons, local_times, fetch=True):
+    """Return tide text for many catches, grouped by nearest station.
+
+    ``local_times`` is a datetime64 array of wall-clock times. Stations with
+    local constituents predict all of their catches in one vectorized call;
+    the rest load one cached NOAA series per (station, local day), and only
+    when ``fetch`` is true. Entries are None where no tide is available yet.
+    """
+    tides = np.full(len(local_times), None, dtype=object)
+    lats, lons = np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+    known = np.flatnonzero(~(np.isnan(lats) | np.isnan(lons)))
+    index = station_catalog.index
+    if not len(known) or not len(index):
+        return tides
+    positions, _ = index.query_many(lats[known], lons[known])
+    days = local_times[known].astype('datetime64[D]')
+    order = np.lexsort((days, positions))
+    for group in np.split(order, np.flatnonzero(np.diff(positions[order])) + 1):
+        station_id = index.station(positions[group[0]])['id']
+        station = tide_engine.get(station_id)
+        try:
+            if station is not None:
+                heights = station.predict(local_times[known[group]])
+                tides[known[group]] = [f"{height:.3f} ft" for height in heights]
+                continue
+            if not fetch:
+                continue
+            for day_group in np.split(group, np.flatnonzero(np.diff(days[group].astype(np.int64))) + 1):
+                rows = known[day_group]
+                heights = tide_cache.heights(station_id, days[day_group[0]].astype(object), local_times[rows])
+                if heights is not None:
+                    tides[rows] = [f"{height:.3f} ft" for height in heights]
+        except Exception as e:
+            logging.warning(f"Tide lookup for station {station_id} failed: {e}")
+    return tides
+
+def enrich_catch(payload, last_attempt):
+    """Job handler: save a new catch's photo, then look up its tide and mark it ready.
+
+    Upstream failures raise so the job is retried with backoff; on the last
+    attempt the tide is recorded as 'Unknown' instead.
+    """
+    catch_id = payload['catch_id']
+    spool_path = payload.get('image_spool')
+    if spool_path and os.path.exists(spool_path):
+        try:
+            with metrics.phase('enrich_catch', 'image_write'):
+                image = save_catch_image(spool_path)
+        except Exception as e:
+            if not last_attempt:
+                raise
+            logging.error(f"Error saving image: {e}")
+            image = ''
+        catch_records.set_image(catch_id, image)
+    catch = catch_records.by_id(catch_id)
+    if catch is None:
+        return
+    tide = 'Unknown'
+    if catch.latitude is not None and catch.longitude is not None:
+        try:
+            tide = lookup_tide(catch.latitude, catch.longitude, parse_catch_time(catch.date))
+        except Exception as e:
+            if not last_attempt:
+                raise
+            logging.error(f"Giving up on tide for catch {catch_id}: {e}")
+    with metrics.phase('enrich_catch', 'db_update'):
+        catch_records.set_tide(catch_id, tide)
+
+def enrich_imported_catches(payload, last_attempt):
+    """Job handler: look up tides for a user's imported catches that could not get one at import time.
+
+    Retried with backoff while any are still missing; the last attempt records 'Unknown'.
+    """
+    after_id, unresolved = 0, 0
+    while True:
+        batch = catch_records.with_status(payload['user_id'], 'importing', after_id, IMPORT_BATCH_ROWS)
+        if not batch:
+            break
+        after_id = batch[-1].id
+        tides = lookup_tides([c.latitude for c in batch], [c.longitude for c in batch],
+                             np.array([c.date for c in batch], dtype='datetime64[m]'))
+        found = [(c.id, tide) for c, tide in zip(batch, tides) if tide is not None]
+        missing = [(c.id, 'Unknown') for c, tide in zip(batch, tides) if tide is None]
+        if last_attempt:
+            found += missing
+        else:
+            unresolved += len(missing)
+        catch_records.set_tides(found)
+    if unresolved:
+        raise EnrichmentPending(f"{unresolved} imported catches still have no tide")
+
+# Photos are hashed and resized in a worker process
+image_processor = ImageProcessor(uploads_dir)
+
+job_queue = JobQueue(db_pool)
+job_worker = JobWorker(job_queue, {'enrich_catch': enrich_catch, 'enrich_imported_catches': enrich_imported_catches})
+
+# Fingerprinted, precompressed pages and static files built from public/
+asset_store = AssetStore()
+
+def load_assets():
+    """Serve the asset build for public/, building it first unless ASSETS_BUILD=0."""
+    asset_store.load(build_missing=os.environ.get('ASSETS_BUILD', '1') != '0')
+    # Templates render from the rewritten pages too
+    app.jinja_loader = ChoiceLoader([FileSystemLoader(asset_store.pages_dir), FileSystemLoader(asset_store.source)])
+
+def create_app(migrate_db=None, start_threads=True):
+    """Load the app's shared read-only state once per process, then return the app.
+
+    Under ``gunicorn --preload`` (see gunicorn.conf.py) this runs once in the
+    master, and workers inherit the station index, tide constituents and
+    asset manifest copy-on-write instead of each loading their own. Migrations
+    run only if ``migrate_db``, which defaults to MIGRATE_ON_START. Background
+    threads do not survive a fork, so a preloading master passes
+    ``start_threads=False`` and each worker calls start_worker() instead.
+    """
+    global _startup_pid
+    with _startup_lock:
+        if _startup_pid is None:
+            started = time.perf_counter()
+            os.makedirs(uploads_dir, exist_ok=True)
+            os.makedirs(incoming_dir, exist_ok=True)
+            if MIGRATE_ON_START if migrate_db is None else migrate_db:
+                init_db()
+            load_stations()
+            load_tide_engine()
+            load_assets()
+            _startup_pid = os.getpid()
+            startup['create_app_seconds'] = round(time.perf_counter() - started, 4)
+            logging.info(f"App ready in {startup['create_app_seconds'] * 1000:.0f} ms "
+                         f"after {startup['import_seconds'] * 1000:.0f} ms of imports")
+    if start_threads:
+        start_worker()
+    return app
+
+def start_worker(forked_at=None):
+    """Start this process's background threads, once: the job worker unless JOB_WORKER=0, and a stale catalog refresh.
+
+    ``forked_at`` is the perf_counter() reading taken when gunicorn forked
+    this worker; the time since then is recorded as worker_ready_seconds.
+    """
+    global _worker_pid
+    with _startup_lock:
+        if _worker_pid == os.getpid():
+            return
+        _worker_pid = os.getpid()
+    startup['preloaded'] = _startup_pid != os.getpid()
+    if os.environ.get('JOB_WORKER', '1') != '0':
+        job_worker.start()
+    station_catalog.refresh_if_stale()
+    if forked_at is not None:
+        startup['worker_ready_seconds'] = round(time.perf_counter() - forked_at, 4)
 
 # Validation functions for usernames and passwords
 def validate_username(username):
@@ -225,23 +460,35 @@ def validate_password(password, confirm_password=None):
 @app.route('/')
 def index():
     if 'user' in session:
-        return send_from_directory('public', 'dashboard.html')
-    return send_from_directory('public', 'login.html')
+        return asset_store.page('dashboard.html', request)
+    return asset_store.page('login.html', request)
 
 @app.route('/static/uploads/<filename>')
 def serve_uploaded_file(filename):
-    return send_from_directory('static/uploads', filename)
+    if not is_content_addressed(filename):
+        return send_from_directory('static/uploads', filename)
+    # A content-addressed name never changes what it points to, so browsers can keep it for good
+    response = send_from_directory('static/uploads', filename, max_age=365 * 24 * 60 * 60)
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    response = asset_store.asset(filename, request)
+    if response is None:
+        return 'Page not found', 404
+    return response
 
 @app.route('/calendar')
 def calendar():
     if 'user' not in session:
         return redirect('/')
-    return send_from_directory('public', 'calendar.html')
+    return asset_store.page('calendar.html', request)
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'GET':
-        return send_from_directory('public', 'register.html')
+        return asset_store.page('register.html', request)
     elif request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
@@ -260,65 +507,54 @@ def register():
             logging.error(f"Invalid password: {password_error}")
             return jsonify({'success': False, 'message': password_error}), 400
 
-        hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-        hashed_str = hashed.decode('utf-8')
-        conn = get_db_connection()
         try:
-            c = conn.cursor()
-            if os.environ.get('FLASK_ENV') == 'development':
-                c.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, hashed_str))
-                user_id = c.lastrowid
-            else:
-                c.execute('INSERT INTO users (username, password) VALUES (%s, %s) RETURNING id', (username, hashed_str))
-                user_id = c.fetchone()[0]
-            conn.commit()
+            hashed_str = password_hasher.hash(password)
+            user_id = users.create(username, hashed_str)
             session['user'] = {'id': user_id, 'username': username}
             logging.info(f"User registered: {username}")
             return jsonify({'success': True, 'redirect': '/'}), 200
-        except (sqlite3.IntegrityError, psycopg2.IntegrityError):
+        except HasherBusy as e:
+            logging.warning(f"Registration rejected: {e}")
+            return jsonify({'success': False, 'message': BUSY_MESSAGE}), 503, BUSY_HEADERS
+        except db_pool.IntegrityError:
             logging.error(f"Username already exists: {username}")
             return jsonify({'success': False, 'message': 'Username already exists'}), 400
         except Exception as e:
             logging.error(f"Error during registration: {e}")
             return jsonify({'success': False, 'message': 'Registration failed'}), 500
-        finally:
-            conn.close()
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'GET':
-        return send_from_directory('public', 'login.html')
+        return asset_store.page('login.html', request)
     elif request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
         if not username or not password:
             logging.error("Missing username or password")
             return 'Missing username or password', 400
-        conn = get_db_connection()
         try:
-            c = conn.cursor()
-            if os.environ.get('FLASK_ENV') == 'development':
-                c.execute('SELECT id, username, password FROM users WHERE username = ?', (username,))
-            else:
-                c.execute('SELECT id, username, password FROM users WHERE username = %s', (username,))
-            user = c.fetchone()
+            user = users.by_username(username)
             if user:
-                logging.info(f"User found: {user[1]}")
-                stored_hash = user[2].encode('utf-8')
-                if bcrypt.checkpw(password.encode('utf-8'), stored_hash):
-                    session['user'] = {'id': user[0], 'username': user[1]}
+                logging.info(f"User found: {user.username}")
+                if password_hasher.verify(password, user.password):
+                    session['user'] = {'id': user.id, 'username': user.username}
                     logging.info("Password matched")
+                    if password_hasher.rehash(password, user.password,
+                                              lambda hashed: users.update_password(user.id, hashed)):
+                        logging.info(f"Rehashed password for user ID {user.id} at cost {password_hasher.rounds}")
                     return redirect('/')
                 else:
                     logging.error("Password did not match")
             else:
                 logging.error("No user found")
             return 'Invalid credentials', 401
+        except HasherBusy as e:
+            logging.warning(f"Login rejected: {e}")
+            return BUSY_MESSAGE, 503, BUSY_HEADERS
         except Exception as e:
             logging.error(f"Error during login: {e}")
             return 'Login failed', 500
-        finally:
-            conn.close()
 
 @app.route('/account', methods=['GET', 'POST'])
 def account():
@@ -344,25 +580,13 @@ def account():
             return render_template('account.html', username=session['user']['username'], message=password_error), 400
 
         # Verify old password and update if correct
-        conn = get_db_connection()
         try:
-            c = conn.cursor()
             user_id = session['user']['id']
-            if os.environ.get('FLASK_ENV') == 'development':
-                c.execute('SELECT password FROM users WHERE id = ?', (user_id,))
-            else:
-                c.execute('SELECT password FROM users WHERE id = %s', (user_id,))
-            user = c.fetchone()
+            user = users.by_id(user_id)
             if user:
-                stored_hash = user[0].encode('utf-8')
-                if bcrypt.checkpw(old_password.encode('utf-8'), stored_hash):
-                    new_hashed = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
-                    new_hashed_str = new_hashed.decode('utf-8')
-                    if os.environ.get('FLASK_ENV') == 'development':
-                        c.execute('UPDATE users SET password = ? WHERE id = ?', (new_hashed_str, user_id))
-                    else:
-                        c.execute('UPDATE users SET password = %s WHERE id = %s', (new_hashed_str, user_id))
-                    conn.commit()
+                if password_hasher.verify(old_password, user.password):
+                    new_hashed_str = password_hasher.hash(new_password)
+                    users.update_password(user_id, new_hashed_str)
                     logging.info(f"Password updated for user ID: {user_id}")
                     return render_template('account.html', username=session['user']['username'], message='Password updated successfully')
                 else:
@@ -371,11 +595,12 @@ def account():
             else:
                 logging.error("User not found")
                 return render_template('account.html', username=session['user']['username'], message='User not found'), 404
+        except HasherBusy as e:
+            logging.warning(f"Password change rejected: {e}")
+            return render_template('account.html', username=session['user']['username'], message=BUSY_MESSAGE), 503, BUSY_HEADERS
         except Exception as e:
             logging.error(f"Error updating password: {e}")
             return render_template('account.html', username=session['user']['username'], message='Failed to update password'), 500
-        finally:
-            conn.close()
 
 @app.route('/logout', methods=['POST'])
 def logout():
@@ -387,8 +612,15 @@ def catch():
     if 'user' not in session:
         return 'Not logged in', 401
     if request.method == 'GET':
-        return send_from_directory('public', 'catch.html')
+        return asset_store.page('catch.html', request)
     elif request.method == 'POST':
+        try:
+            # Parsing the form streams any 'photo' file to disk, sniffing and size-checking it on the way
+            with metrics.phase('catch', 'form_upload'):
+                photo = request.files.get('photo')
+        except UploadRejected as e:
+            logging.warning(f"Rejected photo upload: {e}")
+            return str(e), e.status
         image_data = request.form.get('image_data', '')
         date_str = request.form.get('date')
         location = request.form.get('location')
@@ -400,88 +632,74 @@ def catch():
 
         date = datetime.fromisoformat(date_str.replace('T', ' ')).replace(tzinfo=timezone.utc)
         moon_phase = get_moon_phase(date)
+        with metrics.phase('catch', 'geocode'):
+            lat, lon = geocode_location(location)
+
+        # Tide lookup and the photo are handled by the job worker so the POST never waits on NOAA
+        image_spool = None
+        if photo is not None:
+            try:
+                image_spool = photo.stream.finish()
+            except UploadRejected as e:
+                logging.warning(f"Rejected photo upload: {e}")
+                return str(e), e.status
+        elif image_data and image_data.startswith('data:image'):
+            # Older clients send the photo as a base64 data URL form field
+            try:
+                image_spool = spool_data_url(image_data, incoming_dir)
+            except Exception as e:
+                logging.error(f"Error saving image: {e}")
 
-        lat, lon = geocode_location(location)
-        tide = 'Unknown'
-        if lat is not None and lon is not None:
-            nearest_station = find_nearest_station(lat, lon, stations)
-            if nearest_station:
-                station_id = nearest_station['id']
-                tide_level = get_tide_prediction(station_id, date)
-                tide = f"{tide_level} ft" if tide_level is not None else 'Unknown'
-
-        image_path = ''
         try:
-            if image_data and image_data.startswith('data:image'):
-                comma_index = image_data.find(',')
-                if comma_index != -1:
-                    base64_data = image_data[comma_index+1:]
-                    image_bytes = base64.b64decode(base64_data)
-                    filename = f"catch_{datetime.now().strftime('%Y%m%d%H%M%S')}.png"
-                    filepath = os.path.join(uploads_dir, filename)
-                    with open(filepath, 'wb') as f:
-                        f.write(image_bytes)
-                    image_path = filename
-        except Exception as e:
-            logging.error(f"Error saving image: {e}")
-            image_path = ''
-
-        conn = get_db_connection()
-        try:
-            c = conn.cursor()
             user_id = int(session['user']['id'])
-            if os.environ.get('FLASK_ENV') == 'development':
-                c.execute('''INSERT INTO catches (
-                    user_id, image, date, location, lure, size, weight, tide, moon_phase, latitude, longitude
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                          (user_id, image_path, date_str, location, lure, size, weight, tide, moon_phase, lat, lon))
-            else:
-                c.execute('''INSERT INTO catches (
-                    user_id, image, date, location, lure, size, weight, tide, moon_phase, latitude, longitude
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
-                          (user_id, image_path, date_str, location, lure, size, weight, tide, moon_phase, lat, lon))
-            conn.commit()
+            with metrics.phase('catch', 'db_insert'), catch_records.connection() as conn:
+                catch_id = catch_records.add(user_id, '', date_str, location, lure, size, weight, 'Pending',
+                                             moon_phase, lat, lon, status='pending', conn=conn)
+                job_queue.enqueue('enrich_catch', {'catch_id': catch_id, 'image_spool': image_spool}, conn=conn)
+                conn.commit()
+            if photo is not None:
+                photo.stream.keep()
+            job_worker.notify()
             return redirect('/')
         except Exception as e:
             logging.error(f"Error saving catch: {e}")
+            if image_spool and os.path.exists(image_spool):
+                os.remove(image_spool)
             return 'Failed to save catch', 500
-        finally:
-            conn.close()
+
+@app.teardown_request
+def discard_uploads(error=None):
+    request.discard_uploads()
 
 @app.route('/catches')
 def catches():
     if 'user' not in session:
         return 'Not logged in', 401
     date = request.args.get('date')
-    conn = get_db_connection()
+    if date and not re.match(r'^\d{4}-\d{2}-\d{2}$', date):
+        return 'Invalid date', 400
     try:
-        c = conn.cursor()
-        if date:
-            if os.environ.get('FLASK_ENV') == 'development':
-                c.execute('SELECT * FROM catches WHERE user_id = ? AND date LIKE ?', (session['user']['id'], date + '%'))
-            else:
-                c.execute('SELECT * FROM catches WHERE user_id = %s AND date LIKE %s', (session['user']['id'], date + '%'))
-        else:
-            if os.environ.get('FLASK_ENV') == 'development':
-                c.execute('SELECT * FROM catches WHERE user_id = ?', (session['user']['id'],))
-            else:
-                c.execute('SELECT * FROM catches WHERE user_id = %s', (session['user']['id'],))
-        rows = c.fetchall()
+        user_id = session['user']['id']
         if date:
             catches = []
-            for row in rows:
+            with metrics.phase('catches', 'query'):
+                rows = catch_records.for_user_on_date(user_id, date)
+            for catch in rows:
                 catch_data = {
-                    'id': row[0],
-                    'image': row[2],
-                    'date': row[3],
-                    'location': row[4],
-                    'lure': row[5],
-                    'size': row[6],
-                    'weight': row[7],
-                    'tide': row[8],
-                    'moon_phase': row[9],
-                    'latitude': row[10],
-                    'longitude': row[11]
+                    'id': catch.id,
+                    'image': catch.image,
+                    'date': catch.date,
+                    'location': catch.location,
+                    'lure': catch.lure,
+                    'size': catch.size,
+                    'weight': catch.weight,
+                    'tide': catch.tide,
+                    'moon_phase': catch.moon_phase,
+                    'latitude': catch.latitude,
+                    'longitude': catch.longitude,
+                    'status': catch.status,
+                    'thumbnails': [{'width': width, **{ext: f"/static/uploads/{name}" for ext, name in names.items()}}
+                                   for width, names in thumbnail_names(catch.image)]
                 }
                 if catch_data['latitude'] and catch_data['longitude']:
                     catch_data['maps_link'] = f"https://www.google.com/maps?q={catch_data['latitude']},{catch_data['longitude']}"
@@ -490,16 +708,173 @@ def catches():
                 catches.append(catch_data)
             return jsonify(catches)
         else:
-            events = []
-            for row in rows:
-                title = format_time(row[3])
-                events.append({'id': str(row[0]), 'title': title, 'start': row[3]})
-            return jsonify(events)
+            start, end = parse_range_param(request.args.get('start')), parse_range_param(request.args.get('end'))
+            limit = request.args.get('limit', type=int)
+            with metrics.phase('catches', 'query'):
+                if limit:
+                    after = decode_events_cursor(request.args.get('after'))
+                    rows = catch_records.events_page(user_id, min(limit, MAX_EVENTS_PAGE), start, end, after)
+                else:
+                    rows = catch_records.events(user_id, start, end)
+            events = [{'id': str(row.id), 'title': format_time(row.date), 'start': row.date} for row in rows]
+            if limit:
+                next_cursor = encode_events_cursor(rows[-1]) if len(rows) == min(limit, MAX_EVENTS_PAGE) else None
+                response = jsonify({'events': events, 'next': next_cursor})
+            else:
+                response = jsonify(events)
+            # Let the browser revalidate and get a 304 when the month is unchanged
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.add_etag()
+            return response.make_conditional(request)
+    except ValueError:
+        return 'Invalid start, end or after parameter', 400
     except Exception as e:
         logging.error(f"Error fetching catches: {e}")
         return 'Failed to fetch catches', 500
-    finally:
-        conn.close()
+
+@app.route('/catches/nearby')
+def nearby_catches():
+    if 'user' not in session:
+        return 'Not logged in', 401
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        radius_km = float(request.args.get('radius_km', 5))
+        limit = min(max(int(request.args.get('limit', 50)), 1), MAX_NEARBY_RESULTS)
+    except (KeyError, ValueError):
+        return jsonify({'error': 'lat and lon are required; radius_km and limit are numbers'}), 400
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180 and 0 < radius_km <= MAX_NEARBY_KM):
+        return jsonify({'error': f'lat and lon must be coordinates and radius_km at most {MAX_NEARBY_KM}'}), 400
+    try:
+        with metrics.phase('nearby', 'query'):
+            rows = catch_records.near(session['user']['id'], lat, lon, radius_km, limit)
+    except Exception as e:
+        logging.error(f"Error fetching nearby catches: {e}")
+        return 'Failed to fetch nearby catches', 500
+    return jsonify([{
+        'id': catch.id,
+        'date': catch.date,
+        'location': catch.location,
+        'lure': catch.lure,
+        'size': catch.size,
+        'weight': catch.weight,
+        'tide': catch.tide,
+        'latitude': catch.latitude,
+        'longitude': catch.longitude,
+        'distance_km': round(distance, 3),
+    } for catch, distance in rows])
+
+@app.route('/hotspots')
+def catch_hotspots():
+    if 'user' not in session:
+        return 'Not logged in', 401
+    season = request.args.get('season')
+    if season is not None and season not in SEASONS:
+        return jsonify({'error': f"season must be one of {', '.join(SEASONS)}"}), 400
+    try:
+        start, end = parse_range_param(request.args.get('start')), parse_range_param(request.args.get('end'))
+        if start is None and end is None:
+            start, end = season_range(season, request.args.get('year', type=int))
+    except ValueError:
+        return jsonify({'error': 'Invalid start or end'}), 400
+    start, end = start or datetime.min, end or datetime.max
+    try:
+        with metrics.phase('hotspots', 'query'):
+            points = catch_records.points_between(session['user']['id'], start, end)
+        with metrics.phase('hotspots', 'cluster'):
+            clusters = hotspots(points)
+    except Exception as e:
+        logging.error(f"Error computing hotspots: {e}")
+        return 'Failed to compute hotspots', 500
+    return jsonify({
+        'start': start.isoformat(timespec='seconds') if start != datetime.min else None,
+        'end': end.isoformat(timespec='seconds') if end != datetime.max else None,
+        'catches': len(points),
+        'hotspots': clusters,
+    })
+
+@app.route('/catches/export')
+def export_catches():
+    if 'user' not in session:
+        return 'Not logged in', 401
+    export_format = request.args.get('format', 'jsonl')
+    if export_format not in EXPORT_FORMATS:
+        return 'Unsupported export format', 400
+    serialize, mimetype = EXPORT_FORMATS[export_format]
+    rows = catch_records.iter_for_user(session['user']['id'])
+    return Response(stream_with_context(serialize(rows)), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=catches.{export_format}',
+    })
+
+@app.route('/analytics')
+def analytics():
+    if 'user' not in session:
+        return 'Not logged in', 401
+    dimension = request.args.get('dimension')
+    if dimension and dimension not in ANALYTICS_DIMENSIONS:
+        return jsonify({'error': f"dimension must be one of {', '.join(ANALYTICS_DIMENSIONS)}"}), 400
+    try:
+        summary = summarize(catch_records.analytics(session['user']['id']))
+    except Exception as e:
+        logging.error(f"Error fetching analytics: {e}")
+        return 'Failed to fetch analytics', 500
+    if dimension:
+        summary['by'] = {dimension: summary['by'][dimension]}
+    return jsonify(summary)
+
+def import_batch(user_id, batch, report, conn):
+    """Enrich one batch of validated import rows and insert it in the caller's transaction."""
+    lats = np.array([np.nan if c.latitude is None else c.latitude for c in batch])
+    lons = np.array([np.nan if c.longitude is None else c.longitude for c in batch])
+    local_times = np.array([c.date for c in batch], dtype='datetime64[m]')
+    # Tides that would need NOAA are left to the job worker so the import never waits on it
+    tides = lookup_tides(lats, lons, local_times, fetch=False)
+    phases = moon_phases(local_times)
+    rows = []
+    for c, tide, phase in zip(batch, tides, phases):
+        status = 'ready'
+        if tide is None and c.latitude is not None:
+            tide, status = 'Pending', 'importing'
+            report.pending += 1
+        rows.append((user_id, '', c.date, c.location, c.lure, c.size, c.weight, tide or 'Unknown', phase,
+                     c.latitude, c.longitude, status))
+    report.imported += catch_records.add_many(rows, conn=conn)
+
+def rejected_import(message):
+    """The import report for a file refused as a whole, in the same shape as one with bad rows."""
+    report = ImportReport()
+    report.error(None, message)
+    return jsonify(report.as_dict())
+
+@app.route('/catches/import', methods=['POST'])
+def import_catches():
+    if 'user' not in session:
+        return 'Not logged in', 401
+    import_fmt = import_format(request.mimetype, request.args.get('format'))
+    if import_fmt is None:
+        return jsonify({'error': 'Send text/csv or application/x-ndjson, or pass ?format=csv or jsonl'}), 415
+    user_id = int(session['user']['id'])
+    report = ImportReport()
+    try:
+        rows = iter_valid(iter_records(request.stream, import_fmt), report)
+        # Every valid row is written in one transaction; invalid rows are reported and skipped
+        with catch_records.connection() as conn:
+            for batch in batched(rows, IMPORT_BATCH_ROWS):
+                import_batch(user_id, batch, report, conn)
+            if report.pending:
+                job_queue.enqueue('enrich_imported_catches', {'user_id': user_id}, conn=conn)
+            conn.commit()
+    except RequestEntityTooLarge:
+        limit = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+        return rejected_import(f"The file is larger than {limit} MB; nothing was imported"), 413
+    except UnicodeDecodeError:
+        return rejected_import('The file is not UTF-8 text; nothing was imported'), 400
+    except Exception as e:
+        logging.error(f"Error importing catches: {e}")
+        return jsonify({'error': 'Failed to import catches'}), 500
+    if report.pending:
+        job_worker.notify()
+    return jsonify(report.as_dict()), 200 if report.imported or not report.error_count else 400
 
 @app.route('/weather')
 def weather():
@@ -507,27 +882,92 @@ def weather():
     lon = request.args.get('lon')
     if not lat or not lon:
         return jsonify({'error': 'Missing lat or lon'}), 400
-    api_key = os.environ.get('WEATHER_API_KEY')
-    url = f'http://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={api_key}&units=imperial'
-    response = requests.get(url)
-    if response.status_code == 200:
-        return jsonify(response.json())
-    return jsonify({'error': 'Weather API error'}), 500
+    try:
+        data, source = weather_cache.get(float(lat), float(lon))
+    except ValueError:
+        return jsonify({'error': 'Invalid lat or lon'}), 400
+    except WeatherUnavailable as e:
+        logging.error(f"Weather API error: {e}")
+        return jsonify({'error': 'Weather API error'}), 500
+    response = jsonify(data)
+    response.headers['X-Cache'] = source.upper()
+    return response
+
+# Sun and moon tables are cached per local day and ~10 km cell
+astronomy_table = AstronomyTable()
+
+@app.route('/astronomy')
+def astronomy():
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        start = datetime.strptime(request.args.get('date') or datetime.now().strftime('%Y-%m-%d'), '%Y-%m-%d').date()
+        days = min(max(int(request.args.get('days', 1)), 1), 31)
+    except (KeyError, ValueError):
+        return jsonify({'error': 'lat and lon are required; date is YYYY-MM-DD and days a number'}), 400
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({'error': 'lat must be between -90 and 90 and lon between -180 and 180'}), 400
+    today = datetime.now().date()
+    if abs(start.year - today.year) > MAX_ASTRONOMY_YEARS:
+        return jsonify({'error': f'date must be within {MAX_ASTRONOMY_YEARS} years of today'}), 400
+    dates = [start + timedelta(days=offset) for offset in range(days)]
+    table = astronomy_table.lookup(day_numbers(dates), lat, lon)
+    phases = moon_phases([datetime(d.year, d.month, d.day, 12) for d in dates])
+    return jsonify([{
+        'date': d.isoformat(),
+        **{field: None if np.isnan(table[field][i]) else
+           datetime.fromtimestamp(table[field][i], timezone.utc).isoformat(timespec='seconds')
+           for field in ('sunrise', 'sunset', 'moonrise', 'moonset')},
+        'illumination': round(float(table['illumination'][i]), 3),
+        'moon_phase': phases[i],
+    } for i, d in enumerate(dates)])
+
+def collect_stats():
+    return {
+        'tide_cache': tide_cache.stats(),
+        'station_catalog': station_catalog.stats(),
+        'db_pool': db_pool.stats(),
+        'password_hasher': password_hasher.stats(),
+        'jobs': job_worker.stats(),
+        'images': image_processor.stats(),
+        'weather_cache': weather_cache.stats(),
+        'upstream': upstream.http.stats(),
+        'astronomy_table': astronomy_table.stats(),
+        'profiler': metrics.profiler.stats(),
+        'startup': startup,
+    }
+
+@app.route('/stats')
+def stats():
+    return jsonify(collect_stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition: request, phase, query and upstream latency, plus /stats as gauges."""
+    stats = collect_stats()
+    upstream_stats = stats.pop('upstream')
+    stats['upstream_breakers'] = upstream_stats['breakers']
+    return Response(metrics.registry.render(upstream_stats['latency'], stats),
+                    mimetype='text/plain; version=0.0.4')
 
 # Error handlers for production
 @app.errorhandler(404)
 def not_found(error):
     return 'Page not found', 404
 
+@app.errorhandler(UploadRejected)
+def upload_rejected(error):
+    logging.warning(f"Rejected upload: {error}")
+    return str(error), error.status
+
 @app.errorhandler(500)
 def server_error(error):
     return 'Internal server error', 500
 
-# Initialize database and load stations
-init_db()
-load_stations()
+startup['import_seconds'] = round(time.perf_counter() - IMPORT_STARTED, 4)
 
 # Run locally in development
-if os.environ.get('FLASK_ENV') == 'development':
+if __name__ == '__main__' and os.environ.get('FLASK_ENV') == 'development':
+    create_app()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -1,30 +1,83 @@
+"""Key a background colour out of images and resize them, one file or a whole folder at a time.
+
+    python public/static/logo_maker.py Striper_Log.png output.png --tolerance 12
+    python public/static/logo_maker.py static/uploads static/keyed --max-size 512 --workers 4
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from PIL import Image
 
-def make_background_transparent(image_path, output_path):
-    # Open the image
-    img = Image.open(image_path).convert("RGBA")
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif')
+
+def parse_color(value):
+    """Parse 'ffffff', '#ffffff' or '255,255,255' into an (r, g, b) tuple."""
+    value = value.strip().lstrip('#')
+    if ',' in value:
+        return tuple(int(part) for part in value.split(','))
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+def key_out(img, color=(255, 255, 255), tolerance=0):
+    """Return an RGBA copy of ``img`` with pixels within ``tolerance`` of ``color`` made transparent.
+
+    A pixel matches when every channel is within ``tolerance`` of the key
+    colour, so ``tolerance=0`` keys out exactly that colour.
+    """
+    pixels = np.array(img.convert('RGBA'))
+    # Compare each uint8 channel against its bounds rather than widening to compute distances
+    matched = np.ones(pixels.shape[:2], dtype=bool)
+    for channel, value in enumerate(color):
+        band = pixels[..., channel]
+        if value - tolerance > 0:
+            matched &= band >= value - tolerance
+        if value + tolerance < 255:
+            matched &= band <= value + tolerance
+    alpha = pixels[..., 3]
+    alpha[matched] = 0
+    return Image.fromarray(pixels, 'RGBA')
 
-    # Get the pixel data
-    data = img.getdata()
+def fit(img, max_size):
+    """Shrink ``img`` in place to fit within max_size x max_size, keeping its aspect ratio."""
+    if max_size:
+        img.thumbnail((max_size, max_size), Image.LANCZOS)
+    return img
 
-    # Create a new list for modified pixels
-    new_data = []
+def make_background_transparent(image_path, output_path, tolerance=0, color=(255, 255, 255), max_size=None):
+    """Key ``color`` out of an image file and save it as a PNG to preserve transparency."""
+    with Image.open(image_path) as img:
+        keyed = fit(key_out(img, color, tolerance), max_size)
+    keyed.save(output_path, "PNG")
+    return output_path
 
-    # Check each pixel
-    for item in data:
-        # If the pixel is white (R=255, G=255, B=255)
-        if item[0] == 255 and item[1] == 255 and item[2] == 255:
-            # Make it transparent (alpha = 0)
-            new_data.append((255, 255, 255, 0))
-        else:
-            # Keep the pixel unchanged
-            new_data.append(item)
+def _process(args):
+    return make_background_transparent(*args)
 
-    # Apply the new pixel data
-    img.putdata(new_data)
+def process_directory(src_dir, dest_dir, tolerance=0, color=(255, 255, 255), max_size=None, workers=None):
+    """Key every image in ``src_dir`` into PNGs in ``dest_dir``, one file per worker process at a time."""
+    os.makedirs(dest_dir, exist_ok=True)
+    jobs = [(os.path.join(src_dir, name), os.path.join(dest_dir, f"{os.path.splitext(name)[0]}.png"),
+             tolerance, color, max_size)
+            for name in sorted(os.listdir(src_dir)) if name.lower().endswith(IMAGE_EXTENSIONS)]
+    if workers == 1:
+        return [_process(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_process, jobs))
 
-    # Save as PNG to preserve transparency
-    img.save(output_path, "PNG")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help='image file or folder of images')
+    parser.add_argument('output', nargs='?', default='output.png', help='output PNG, or folder when source is a folder')
+    parser.add_argument('--color', type=parse_color, default=(255, 255, 255), help='colour to key out (default ffffff)')
+    parser.add_argument('--tolerance', type=int, default=0, help='largest per-channel difference still keyed out')
+    parser.add_argument('--max-size', type=int, help='shrink to fit within this many pixels')
+    parser.add_argument('--workers', type=int, help='processes for a folder (default: one per core)')
+    args = parser.parse_args(argv)
+    if os.path.isdir(args.source):
+        outputs = process_directory(args.source, args.output, args.tolerance, args.color, args.max_size, args.workers)
+        print(f"Wrote {len(outputs)} images to {args.output}")
+    else:
+        print(f"Wrote {make_background_transparent(args.source, args.output, args.tolerance, args.color, args.max_size)}")
 
-# Replace with your file paths
-make_background_transparent("//workspaces/195908002/surf-fishing-app/Striper_Log.png", "output.png")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,404 @@
+"""Data access for users and catches, with the SQL dialect resolved once at startup."""
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+from analytics import UPSERT_STATS, catch_buckets, tally, tide_bucket
+from geo import cover, distances_km, encode, encode_many, PREFIX_END
+import metrics
+
+class User(NamedTuple):
+    id: int
+    username: str
+    password: str
+
+class Catch(NamedTuple):
+    id: int
+    user_id: int
+    image: str
+    date: str
+    location: str
+    lure: str
+    size: str
+    weight: str
+    tide: str
+    moon_phase: str
+    latitude: Optional[float]
+    longitude: Optional[float]
+    status: str
+
+class CatchEvent(NamedTuple):
+    id: int
+    date: str
+    caught_at: Optional[datetime]
+
+CATCH_COLUMNS = ', '.join(Catch._fields)
+EVENT_COLUMNS = ', '.join(CatchEvent._fields)
+INSERT_CATCH = '''INSERT INTO catches (
+    user_id, image, date, location, lure, size, weight, tide, moon_phase, latitude, longitude,
+    caught_at, size_value, weight_value, tide_ft, status, geohash
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+NUMBER_RE = re.compile(r'[-+]?\d*\.?\d+')
+# Catch ids looked up per query when moving tide aggregates; short batches are padded with a repeated id
+STATS_INPUTS_BATCH = 500
+
+def parse_number(text):
+    """Return the first number in free text such as '32 in' or '3.456 ft', or None."""
+    if text is None:
+        return None
+    match = NUMBER_RE.search(str(text))
+    return float(match.group()) if match else None
+
+def parse_catch_time(text):
+    """Parse a catch's local 'YYYY-MM-DDTHH:MM' date string into a naive datetime, or None."""
+    try:
+        return datetime.fromisoformat(str(text).replace('T', ' ')).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return None
+
+class Statement:
+    """One query written with ``?`` placeholders and rendered for each backend."""
+
+    def __init__(self, name, sql, prepare=False):
+        self.name = name
+        self.sql = sql
+        self.prepare = prepare
+        self.params = sql.count('?')
+
+    def render(self, backend):
+        return self.sql if backend == 'sqlite' else self.sql.replace('?', '%s')
+
+    def prepare_sql(self):
+        parts = self.sql.split('?')
+        return parts[0] + ''.join(f'${i}{part}' for i, part in enumerate(parts[1:], start=1))
+
+class Repository:
+    """Base class binding a connection pool to its backend's SQL dialect.
+
+    On Postgres, statements marked ``prepare`` are run as server-side prepared
+    statements. Each pooled connection prepares a statement the first time it
+    runs it and records the name in its ``prepared`` set.
+    """
+
+    statements = ()
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.backend = pool.backend
+        self._sql = {s.name: s.render(self.backend) for s in self.statements}
+        self._prepared = {s.name: s for s in self.statements if s.prepare and self.backend == 'postgres'}
+
+    @contextmanager
+    def connection(self, conn=None):
+        """Check out a pooled connection, or reuse ``conn`` so several writes share its transaction."""
+        if conn is not None:
+            yield conn
+            return
+        conn = self.pool.connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def as_datetime(value):
+        """Read a TIMESTAMP column back as a datetime; SQLite returns its ISO text."""
+        if value is None or isinstance(value, datetime):
+            return value
+        return datetime.fromisoformat(value)
+
+    def timestamp(self, value):
+        """Adapt a naive datetime for a TIMESTAMP column; SQLite stores sortable ISO text."""
+        if value is None or self.backend != 'sqlite':
+            return value
+        return value.isoformat(sep=' ', timespec='seconds')
+
+    def execute(self, cursor, name, params=()):
+        """Run a named statement, timed under its name in the db_query metrics."""
+        with metrics.timer('db_query', statement=name):
+            statement = self._prepared.get(name)
+            prepared = getattr(cursor.connection, 'prepared', None)
+            if statement is None or prepared is None:
+                cursor.execute(self._sql[name], params)
+                return cursor
+            if name not in prepared:
+                cursor.execute(f"PREPARE {name} AS {statement.prepare_sql()}")
+                prepared.add(name)
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * statement.params)})" if statement.params
+                           else f"EXECUTE {name}", params)
+            return cursor
+
+    def execute_many(self, cursor, name, rows):
+        """Run a named statement once per row: one executemany on SQLite, pages of execute_batch on Postgres."""
+        with metrics.timer('db_query', statement=name):
+            if self.backend == 'sqlite':
+                cursor.executemany(self._sql[name], rows)
+            else:
+                from psycopg2.extras import execute_batch
+                execute_batch(cursor, self._sql[name], rows, page_size=1000)
+
+class UserRepository(Repository):
+    statements = (
+        Statement('user_by_username', 'SELECT id, username, password FROM users WHERE username = ?', prepare=True),
+        Statement('user_by_id', 'SELECT id, username, password FROM users WHERE id = ?', prepare=True),
+        Statement('insert_user', 'INSERT INTO users (username, password) VALUES (?, ?)'),
+        Statement('insert_user_returning', 'INSERT INTO users (username, password) VALUES (?, ?) RETURNING id'),
+        Statement('update_password', 'UPDATE users SET password = ? WHERE id = ?'),
+    )
+
+    def by_username(self, username):
+        with self.connection() as conn:
+            row = self.execute(conn.cursor(), 'user_by_username', (username,)).fetchone()
+        return User._make(row) if row else None
+
+    def by_id(self, user_id):
+        with self.connection() as conn:
+            row = self.execute(conn.cursor(), 'user_by_id', (user_id,)).fetchone()
+        return User._make(row) if row else None
+
+    def create(self, username, password_hash):
+        """Insert a user and return the new id; raises the driver's IntegrityError on duplicates."""
+        with self.connection() as conn:
+            c = conn.cursor()
+            if self.backend == 'sqlite':
+                user_id = self.execute(c, 'insert_user', (username, password_hash)).lastrowid
+            else:
+                user_id = self.execute(c, 'insert_user_returning', (username, password_hash)).fetchone()[0]
+            conn.commit()
+        return user_id
+
+    def update_password(self, user_id, password_hash):
+        with self.connection() as conn:
+            self.execute(conn.cursor(), 'update_password', (password_hash, user_id))
+            conn.commit()
+
+class CatchRepository(Repository):
+    statements = (
+        Statement('catches_by_user', f'''SELECT {CATCH_COLUMNS} FROM catches
+            WHERE user_id = ? ORDER BY caught_at, id''', prepare=True),
+        Statement('catches_by_user_between', f'''SELECT {CATCH_COLUMNS} FROM catches
+            WHERE user_id = ? AND caught_at >= ? AND caught_at < ? ORDER BY caught_at, id''', prepare=True),
+        Statement('events_by_user', f'''SELECT {EVENT_COLUMNS} FROM catches
+            WHERE user_id = ? ORDER BY caught_at, id''', prepare=True),
+        Statement('events_between', f'''SELECT {EVENT_COLUMNS} FROM catches
+            WHERE user_id = ? AND caught_at >= ? AND caught_at < ? ORDER BY caught_at, id''', prepare=True),
+        Statement('events_page', f'''SELECT {EVENT_COLUMNS} FROM catches
+            WHERE user_id = ? AND caught_at >= ? AND caught_at < ? AND (caught_at, id) > (?, ?)
+            ORDER BY caught_at, id LIMIT ?''', prepare=True),
+        Statement('export_by_user', f'SELECT {CATCH_COLUMNS} FROM catches WHERE user_id = ? ORDER BY caught_at, id'),
+        Statement('insert_catch', INSERT_CATCH, prepare=True),
+        Statement('insert_catch_returning', INSERT_CATCH + ' RETURNING id', prepare=True),
+        Statement('catch_by_id', f'SELECT {CATCH_COLUMNS} FROM catches WHERE id = ?', prepare=True),
+        Statement('set_catch_image', 'UPDATE catches SET image = ? WHERE id = ?'),
+        Statement('set_catch_tide', 'UPDATE catches SET tide = ?, tide_ft = ?, status = ? WHERE id = ?'),
+        Statement('upsert_stats', UPSERT_STATS),
+        Statement('stats_by_user', '''SELECT dimension, bucket, catches, sized, size_total, weighed, weight_total
+            FROM catch_stats WHERE user_id = ?''', prepare=True),
+        Statement('catch_stats_inputs', f'''SELECT id, user_id, tide_ft, size_value, weight_value
+            FROM catches WHERE id IN ({', '.join('?' * STATS_INPUTS_BATCH)})''', prepare=True),
+        Statement('catches_by_user_status', f'''SELECT {CATCH_COLUMNS} FROM catches
+            WHERE user_id = ? AND status = ? AND id > ? ORDER BY id LIMIT ?'''),
+        Statement('catches_by_user_geohash', f'''SELECT {CATCH_COLUMNS} FROM catches
+            WHERE user_id = ? AND geohash >= ? AND geohash < ?''', prepare=True),
+        Statement('points_by_user_between', '''SELECT latitude, longitude, size_value, weight_value, lure FROM catches
+            WHERE user_id = ? AND caught_at >= ? AND caught_at < ? AND geohash IS NOT NULL''', prepare=True),
+    )
+
+    def _params(self, user_id, image, date, location, lure, size, weight, tide, moon_phase, latitude, longitude,
+                status='ready'):
+        caught_at = self.timestamp(parse_catch_time(date))
+        return (user_id, image, date, location, lure, size, weight, tide, moon_phase, latitude, longitude,
+                caught_at, parse_number(size), parse_number(weight), parse_number(tide), status)
+
+    def add(self, user_id, image, date, location, lure, size, weight, tide, moon_phase, latitude, longitude,
+            status='ready', conn=None):
+        """Insert a catch and return its id; with ``conn`` the caller owns the transaction and commits."""
+        params = self._params(user_id, image, date, location, lure, size, weight, tide, moon_phase,
+                              latitude, longitude, status) + (encode(latitude, longitude),)
+        with self.connection(conn) as c:
+            if self.backend == 'sqlite':
+                catch_id = self.execute(c.cursor(), 'insert_catch', params).lastrowid
+            else:
+                catch_id = self.execute(c.cursor(), 'insert_catch_returning', params).fetchone()[0]
+            self._record_stats(c.cursor(), [self._stats_entry(params)])
+            if conn is None:
+                c.commit()
+        return catch_id
+
+    def add_many(self, rows, conn=None):
+        """Insert catches given as tuples of add()'s arguments (through ``status``) and return how many.
+
+        SQLite runs one executemany; Postgres sends pages of statements per
+        round trip with execute_batch. With ``conn`` the caller commits.
+        """
+        params = [self._params(*row) for row in rows]
+        if params:
+            hashes = encode_many([p[9] for p in params], [p[10] for p in params])
+            params = [p + (geohash,) for p, geohash in zip(params, hashes)]
+        with self.connection(conn) as c:
+            cursor = c.cursor()
+            self.execute_many(cursor, 'insert_catch', params)
+            self._record_stats(cursor, [self._stats_entry(p) for p in params])
+            if conn is None:
+                c.commit()
+        return len(params)
+
+    @staticmethod
+    def _stats_entry(params, sign=1):
+        (user_id, _, date, _, lure, _, _, _, moon_phase, latitude, longitude,
+         _, size_value, weight_value, tide_ft, _, _) = params
+        pairs = catch_buckets(parse_catch_time(date), moon_phase, tide_ft, lure, latitude, longitude)
+        return user_id, pairs, size_value, weight_value, sign
+
+    def _record_stats(self, cursor, entries):
+        """Fold catches into the catch_stats aggregates inside the caller's transaction."""
+        rows = tally(entries)
+        if not rows:
+            return
+        self.execute_many(cursor, 'upsert_stats', rows)
+
+    def _tide_changes(self, cursor, tides):
+        """Return stats entries moving each catch from its stored tide bucket to the new one."""
+        ids = list(dict.fromkeys(catch_id for catch_id, _ in tides))
+        inputs = {}
+        for start in range(0, len(ids), STATS_INPUTS_BATCH):
+            batch = ids[start:start + STATS_INPUTS_BATCH]
+            batch += batch[-1:] * (STATS_INPUTS_BATCH - len(batch))
+            for catch_id, *row in self.execute(cursor, 'catch_stats_inputs', batch).fetchall():
+                inputs[catch_id] = row
+        entries = []
+        for catch_id, tide in tides:
+            if catch_id not in inputs:
+                continue
+            user_id, old_ft, size_value, weight_value = inputs[catch_id]
+            old, new = tide_bucket(old_ft), tide_bucket(parse_number(tide))
+            if old != new:
+                if old is not None:
+                    entries.append((user_id, [('tide', old)], size_value, weight_value, -1))
+                if new is not None:
+                    entries.append((user_id, [('tide', new)], size_value, weight_value, 1))
+        return entries
+
+    def analytics(self, user_id):
+        """Return the user's catch_stats rows; cost depends on the number of buckets, not catches."""
+        with self.connection() as conn:
+            return self.execute(conn.cursor(), 'stats_by_user', (user_id,)).fetchall()
+
+    def near(self, user_id, lat, lon, radius_km, limit=None):
+        """Return a user's ``(catch, distance_km)`` pairs within ``radius_km`` of (lat, lon), nearest first.
+
+        Reads only the geohash cells covering the circle, one index range scan
+        each, and checks their catches' exact distances in one vectorized pass.
+        """
+        rows = []
+        with self.connection() as conn:
+            for prefix in cover(lat, lon, radius_km):
+                rows += self.execute(conn.cursor(), 'catches_by_user_geohash',
+                                     (user_id, prefix, prefix + PREFIX_END)).fetchall()
+        if not rows:
+            return []
+        catches = [Catch._make(row) for row in rows]
+        distances = distances_km(lat, lon, [c.latitude for c in catches], [c.longitude for c in catches])
+        order = [i for i in distances.argsort(kind='stable') if distances[i] <= radius_km][:limit]
+        return [(catches[i], float(distances[i])) for i in order]
+
+    def points_between(self, user_id, start, end):
+        """Return ``(latitude, longitude, size_value, weight_value, lure)`` for a user's located catches in [start, end)."""
+        with self.connection() as conn:
+            return self.execute(conn.cursor(), 'points_by_user_between',
+                                (user_id, self.timestamp(start), self.timestamp(end))).fetchall()
+
+    def by_id(self, catch_id):
+        with self.connection() as conn:
+            row = self.execute(conn.cursor(), 'catch_by_id', (catch_id,)).fetchone()
+        return Catch._make(row) if row else None
+
+    def set_image(self, catch_id, image):
+        with self.connection() as conn:
+            self.execute(conn.cursor(), 'set_catch_image', (image, catch_id))
+            conn.commit()
+
+    def set_tide(self, catch_id, tide, status='ready'):
+        """Record a catch's tide text and its numeric value, and mark the catch with ``status``."""
+        self.set_tides([(catch_id, tide)], status)
+
+    def set_tides(self, tides, status='ready'):
+        """Record many ``(catch_id, tide)`` pairs in one transaction, moving their tide aggregates."""
+        params = [(tide, parse_number(tide), status, catch_id) for catch_id, tide in tides]
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            self._record_stats(cursor, self._tide_changes(cursor, tides))
+            self.execute_many(cursor, 'set_catch_tide', params)
+            conn.commit()
+
+    def with_status(self, user_id, status, after_id=0, limit=1000):
+        """Return up to ``limit`` of a user's catches in ``status`` with ids above ``after_id``, oldest first."""
+        with self.connection() as conn:
+            rows = self.execute(conn.cursor(), 'catches_by_user_status', (user_id, status, after_id, limit)).fetchall()
+        return [Catch._make(row) for row in rows]
+
+    def for_user(self, user_id):
+        with self.connection() as conn:
+            rows = self.execute(conn.cursor(), 'catches_by_user', (user_id,)).fetchall()
+        return [Catch._make(row) for row in rows]
+
+    def for_user_between(self, user_id, start, end):
+        """Return a user's catches with start <= caught_at < end, as an indexed range scan."""
+        with self.connection() as conn:
+            rows = self.execute(conn.cursor(), 'catches_by_user_between',
+                                (user_id, self.timestamp(start), self.timestamp(end))).fetchall()
+        return [Catch._make(row) for row in rows]
+
+    def for_user_on_date(self, user_id, date):
+        """Return a user's catches on a YYYY-MM-DD day."""
+        start = datetime.strptime(date, '%Y-%m-%d')
+        return self.for_user_between(user_id, start, start + timedelta(days=1))
+
+    def events(self, user_id, start=None, end=None):
+        """Return the calendar columns of a user's catches, optionally within [start, end)."""
+        with self.connection() as conn:
+            if start is None and end is None:
+                rows = self.execute(conn.cursor(), 'events_by_user', (user_id,)).fetchall()
+            else:
+                start, end = start or datetime.min, end or datetime.max
+                rows = self.execute(conn.cursor(), 'events_between',
+                                    (user_id, self.timestamp(start), self.timestamp(end))).fetchall()
+        return [CatchEvent(catch_id, date, self.as_datetime(caught_at)) for catch_id, date, caught_at in rows]
+
+    def events_page(self, user_id, limit, start=None, end=None, after=None):
+        """Return up to ``limit`` events ordered by (caught_at, id) after the ``after`` key.
+
+        Keyset pagination: each page seeks straight to its first row through the
+        (user_id, caught_at) index instead of counting past an OFFSET.
+        """
+        start, end = start or datetime.min, end or datetime.max
+        after_time, after_id = after or (start, 0)
+        with self.connection() as conn:
+            rows = self.execute(conn.cursor(), 'events_page', (
+                user_id, self.timestamp(start), self.timestamp(end),
+                self.timestamp(after_time), after_id, limit)).fetchall()
+        return [CatchEvent(catch_id, date, self.as_datetime(caught_at)) for catch_id, date, caught_at in rows]
+
+    def iter_for_user(self, user_id, batch_size=1000):
+        """Yield all of a user's catches in caught_at order without loading them all at once.
+
+        Postgres streams through a named (server-side) cursor fetching
+        ``batch_size`` rows per round trip; SQLite steps its cursor lazily.
+        The pooled connection is held until the generator finishes or is closed.
+        """
+        with self.connection() as conn:
+            if self.backend == 'postgres':
+                cursor = conn.cursor(name=f'export_{user_id}')
+                cursor.itersize = batch_size
+            else:
+                cursor = conn.cursor()
+            try:
+                self.execute(cursor, 'export_by_user', (user_id,))
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield Catch._make(row)
+            finally:
+                cursor.close()
@@ -0,0 +1,331 @@
+"""NOAA tide station lookups backed by a precomputed spatial index."""
+import heapq
+import logging
+import os
+import threading
+import time
+import numpy as np
+from upstream import NOAA_API_URL
+
+EARTH_RADIUS_KM = 6371.0
+LEAF_SIZE = 64
+BATCH_CHUNK = 1024
+
+STATIONS_URL = f"{NOAA_API_URL}/mdapi/v1.0/webapi/stations.json?type=tidepredictions"
+CATALOG_PATH = os.environ.get(
+    'STATION_CATALOG_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'stations.npy'))
+CATALOG_MAX_AGE = float(os.environ.get('STATION_CATALOG_MAX_AGE', 7 * 24 * 60 * 60))
+CATALOG_ID_WIDTH = 10
+
+def to_unit_vectors(lats, lons):
+    """Convert latitude/longitude arrays in degrees to xyz points on the unit sphere."""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+def chord_to_km(chord):
+    """Convert a straight-line distance on the unit sphere to great-circle kilometers."""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0.0, 1.0))
+
+class StationIndex:
+    """k-d tree over station unit vectors answering nearest and k-nearest queries.
+
+    Coordinates are parsed into float arrays once when the index is built, so a
+    query never touches the original station dicts or calls trig per station.
+    Chord length on the unit sphere is monotonic in great-circle distance, which
+    lets the tree prune with plain Euclidean bounding boxes.
+    """
+
+    def __init__(self, ids, lats, lons, names=None):
+        self.ids = np.asarray(ids)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.names = np.asarray(names) if names is not None else None
+        points = to_unit_vectors(self.lats, self.lons)
+        self._order = np.arange(len(points))
+        self._start, self._end, self._left, self._right = [], [], [], []
+        self._lo, self._hi = [], []
+        if len(points):
+            self._build(points, 0, len(points))
+        # Store points in tree order so every node covers one contiguous slice
+        self._points = points[self._order]
+
+    @classmethod
+    def from_stations(cls, stations):
+        """Build an index from NOAA station dicts, skipping entries without coordinates."""
+        ids, lats, lons, names = [], [], [], []
+        for station in stations:
+            try:
+                lat = float(station['lat'])
+                lon = float(station['lng'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            ids.append(str(station['id']))
+            lats.append(lat)
+            lons.append(lon)
+            names.append(station.get('name', ''))
+        return cls(ids, lats, lons, names)
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _build(self, points, start, end):
+        node = len(self._start)
+        subset = points[self._order[start:end]]
+        lo, hi = subset.min(axis=0), subset.max(axis=0)
+        self._start.append(start)
+        self._end.append(end)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._lo.append(tuple(lo.tolist()))
+        self._hi.append(tuple(hi.tolist()))
+        if end - start > LEAF_SIZE:
+            dim = int(np.argmax(hi - lo))
+            mid = (start + end) // 2
+            split = np.argpartition(subset[:, dim], mid - start)
+            self._order[start:end] = self._order[start:end][split]
+            self._left[node] = self._build(points, start, mid)
+            self._right[node] = self._build(points, mid, end)
+        return node
+
+    def _box_distance(self, node, x, y, z):
+        lo, hi = self._lo[node], self._hi[node]
+        d2 = 0.0
+        for q, low, high in ((x, lo[0], hi[0]), (y, lo[1], hi[1]), (z, lo[2], hi[2])):
+            if q < low:
+                d2 += (low - q) ** 2
+            elif q > high:
+                d2 += (q - high) ** 2
+        return d2
+
+    def station(self, i):
+        """Return the station at original position ``i`` as a NOAA-style dict."""
+        station_id = self.ids[i]
+        if isinstance(station_id, bytes):
+            station_id = station_id.decode('ascii')
+        station = {'id': str(station_id), 'lat': float(self.lats[i]), 'lng': float(self.lons[i])}
+        if self.names is not None:
+            name = self.names[i]
+            station['name'] = name.decode('utf-8') if isinstance(name, bytes) else str(name)
+        return station
+
+    def query(self, lat, lon, k=1):
+        """Return up to ``k`` (position, distance_km) pairs ordered nearest first."""
+        if not len(self) or k < 1:
+            return []
+        query_point = to_unit_vectors([lat], [lon])[0]
+        x, y, z = query_point.tolist()
+        best = []  # max-heap of (-squared chord, position)
+        frontier = [(0.0, 0)]
+        while frontier:
+            box_d2, node = heapq.heappop(frontier)
+            if len(best) == k and box_d2 >= -best[0][0]:
+                break
+            left = self._left[node]
+            if left < 0:
+                start, end = self._start[node], self._end[node]
+                d2 = ((self._points[start:end] - query_point) ** 2).sum(axis=1)
+                take = min(k, len(d2))
+                for j in np.argpartition(d2, take - 1)[:take]:
+                    item = (-float(d2[j]), int(self._order[start + j]))
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item[0] > best[0][0]:
+                        heapq.heapreplace(best, item)
+            else:
+                for child in (left, self._right[node]):
+                    heapq.heappush(frontier, (self._box_distance(child, x, y, z), child))
+        best.sort(reverse=True)
+        return [(i, float(chord_to_km(np.sqrt(-d2)))) for d2, i in best]
+
+    def nearest(self, lat, lon, k=1):
+        """Return up to ``k`` (station, distance_km) pairs ordered nearest first."""
+        return [(self.station(i), distance) for i, distance in self.query(lat, lon, k)]
+
+    def query_many(self, lats, lons):
+        """Return arrays of nearest positions and distances in km for many points at once.
+
+        Batches are answered with a chunked dot product against every station,
+        which beats walking the tree once per point when thousands of points
+        are looked up together.
+        """
+        points = to_unit_vectors(lats, lons)
+        positions = np.empty(len(points), dtype=np.int64)
+        distances = np.empty(len(points), dtype=np.float64)
+        if not len(self):
+            positions.fill(-1)
+            distances.fill(np.inf)
+            return positions, distances
+        for start in range(0, len(points), BATCH_CHUNK):
+            chunk = points[start:start + BATCH_CHUNK]
+            similarity = chunk @ self._points.T
+            best = similarity.argmax(axis=1)
+            cos_angle = np.clip(similarity[np.arange(len(chunk)), best], -1.0, 1.0)
+            positions[start:start + BATCH_CHUNK] = self._order[best]
+            distances[start:start + BATCH_CHUNK] = EARTH_RADIUS_KM * np.arccos(cos_angle)
+        return positions, distances
+
+# On-disk station catalog
+def save_catalog(stations, path=CATALOG_PATH):
+    """Write NOAA station dicts to ``path`` as one .npy record holding id, lat and lon columns.
+
+    Each column is stored contiguously, so ``load_catalog`` can memory-map the
+    file and every gunicorn worker reads the same page-cache pages. The file
+    is replaced atomically, so readers never observe a partial write.
+    """
+    index = StationIndex.from_stations(stations)
+    count = len(index)
+    dtype = np.dtype([('id', f'S{CATALOG_ID_WIDTH}', (count,)), ('lat', '<f8', (count,)), ('lon', '<f8', (count,))])
+    record = np.zeros((), dtype=dtype)
+    record['id'] = np.char.encode(index.ids.astype(str), 'ascii') if count else []
+    record['lat'] = index.lats
+    record['lon'] = index.lons
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, record)
+    os.replace(tmp_path, path)
+    return count
+
+def load_catalog(path=CATALOG_PATH):
+    """Memory-map a catalog written by ``save_catalog`` and return (ids, lats, lons), or None."""
+    try:
+        record = np.load(path, mmap_mode='r')
+    except (FileNotFoundError, ValueError, OSError) as e:
+        if not isinstance(e, FileNotFoundError):
+            logging.error(f"Unreadable station catalog {path}: {e}")
+        return None
+    if record.dtype.names is None or record.ndim:
+        return None
+    return record['id'], record['lat'], record['lon']
+
+def catalog_age(path=CATALOG_PATH):
+    """Return the catalog's age in seconds, or None when it does not exist."""
+    try:
+        return max(0.0, time.time() - os.path.getmtime(path))
+    except OSError:
+        return None
+
+def fetch_stations():
+    """Fetch the list of NOAA tide stations with predictions."""
+    from upstream import http
+    response = http.get(STATIONS_URL, upstream='noaa_stations', timeout=(http.timeout[0], 30))
+    response.raise_for_status()
+    return response.json()['stations']
+
+class StationCatalog:
+    """StationIndex backed by the on-disk catalog, with optional background refresh from NOAA.
+
+    Startup only memory-maps the local file. When it is missing or older than
+    ``max_age`` and refreshing is enabled, one worker (coordinated through a
+    lock file) downloads a new catalog in a background thread; every worker
+    picks up the replaced file on its next lookup after a cheap mtime check.
+    """
+
+    LOCK_TIMEOUT = 10 * 60
+    RELOAD_CHECK_INTERVAL = 60
+
+    def __init__(self, path=CATALOG_PATH, max_age=CATALOG_MAX_AGE, refresh=True, fetch=fetch_stations):
+        self.path = path
+        self.max_age = max_age
+        self.refresh_enabled = refresh
+        self.fetch = fetch
+        self._index = StationIndex([], [], [])
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.refresh_thread = None
+
+    @property
+    def index(self):
+        now = time.monotonic()
+        if now - self._checked_at > self.RELOAD_CHECK_INTERVAL:
+            self._checked_at = now
+            try:
+                if os.path.getmtime(self.path) != self._mtime:
+                    self.load()
+            except OSError:
+                pass
+        return self._index
+
+    def load(self, refresh=True):
+        """Load the local catalog into a fresh StationIndex and, if ``refresh``, start a refresh when it is stale."""
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                mtime = None
+            columns = load_catalog(self.path)
+            if columns is not None:
+                self._index = StationIndex(*columns)
+                self._mtime = mtime
+        age = self.age()
+        if columns is None:
+            logging.warning(f"No station catalog at {self.path}; tide lookups are unavailable until it is fetched")
+        else:
+            logging.info(f"Loaded {len(self._index)} tide stations from {self.path} (age {age / 3600:.1f} h)")
+        if refresh:
+            self.refresh_if_stale()
+        return self._index
+
+    def age(self):
+        return catalog_age(self.path)
+
+    def refresh(self):
+        """Download the station list, rewrite the catalog and swap in the new index."""
+        lock_path = f"{self.path}.lock"
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        try:
+            lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if (catalog_age(lock_path) or 0) < self.LOCK_TIMEOUT:
+                return False
+            os.remove(lock_path)
+            return self.refresh()
+        try:
+            count = save_catalog(self.fetch(), self.path)
+            logging.info(f"Refreshed station catalog with {count} stations")
+        except Exception as e:
+            logging.error(f"Error refreshing station catalog: {e}")
+            return False
+        finally:
+            os.close(lock_fd)
+            os.remove(lock_path)
+        self.load()
+        return True
+
+    def refresh_if_stale(self):
+        """Start a background refresh when refreshing is enabled and the catalog is missing or older than ``max_age``."""
+        age = self.age()
+        if self.refresh_enabled and (age is None or age > self.max_age):
+            return self.start_background_refresh()
+        return None
+
+    def start_background_refresh(self):
+        if self.refresh_thread is not None and self.refresh_thread.is_alive():
+            return self.refresh_thread
+        self.refresh_thread = threading.Thread(target=self.refresh, name='station-catalog-refresh', daemon=True)
+        self.refresh_thread.start()
+        return self.refresh_thread
+
+    def stats(self):
+        age = self.age()
+        return {'stations': len(self._index), 'age_seconds': round(age) if age is not None else None,
+                'stale': age is None or age > self.max_age}
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Manage the local NOAA tide station catalog.')
+    parser.add_argument('command', choices=['refresh', 'info'])
+    parser.add_argument('--path', default=CATALOG_PATH)
+    args = parser.parse_args(argv)
+    catalog = StationCatalog(args.path, refresh=False)
+    if args.command == 'refresh' and not catalog.refresh():
+        raise SystemExit(1)
+    catalog.load()
+    print(catalog.stats())
+
+if __name__ == '__main__':
+    main()
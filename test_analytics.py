@@ -0,0 +1,62 @@
+from datetime import datetime
+from analytics import catch_buckets, location_bucket, summarize, tally, tide_bucket
+from repository import parse_catch_time
+
+def rescan(catches, user_id):
+    """Aggregate a user's catches from scratch, the way catch_stats should already have them."""
+    conn = catches.pool.connect()
+    try:
+        rows = conn.execute('''SELECT date, moon_phase, tide_ft, lure, latitude, longitude, size_value, weight_value
+            FROM catches WHERE user_id = ?''', (user_id,)).fetchall()
+    finally:
+        conn.close()
+    return sorted(tally((user_id, catch_buckets(parse_catch_time(r[0]), *r[1:6]), r[6], r[7], 1) for r in rows))
+
+def stored(catches, user_id):
+    return sorted((user_id,) + tuple(row) for row in catches.analytics(user_id) if row[2])
+
+def test_buckets():
+    assert tide_bucket(2.538) == '2' and tide_bucket(-0.4) == '-1' and tide_bucket(None) is None
+    assert location_bucket(41.4312, -71.4561) == '41.45,-71.45' and location_bucket(None, 1) is None
+    pairs = catch_buckets(datetime(2025, 5, 1, 6, 30), 'Full Moon', None, '  SP   Minnow ', 41.5, -71.3)
+    assert pairs == [('total', 'all'), ('moon_phase', 'Full Moon'), ('lure', 'sp minnow'), ('month', '05'),
+                     ('hour', '06'), ('location', '41.50,-71.30')]
+
+def test_every_write_keeps_the_aggregates_in_step(catches):
+    catches.add(1, '', '2025-05-01T06:30', 'a', 'SP Minnow', '32 in', '12 lb', '2.5 ft', 'Full Moon', 41.5, -71.3)
+    pending = catches.add(1, '', '2025-05-02T19:10', 'b', 'Eel', '28', '', 'Pending', 'Waning Gibbous', 41.5, -71.3,
+                          status='pending')
+    catches.add_many([(1, '', '2025-06-02T05:00', 'c', 'eel', '40', '25', '-0.3 ft', 'New Moon', None, None, 'ready'),
+                      (2, '', '2025-06-02T05:00', 'c', 'Eel', '40', '25', 'Unknown', 'New Moon', None, None, 'ready')])
+    assert stored(catches, 1) == rescan(catches, 1)
+    catches.set_tide(pending, '3.1 ft')
+    catches.set_tides([(1, '3.9 ft')])
+    assert stored(catches, 1) == rescan(catches, 1)
+    assert stored(catches, 2) == rescan(catches, 2)
+
+def test_bulk_tide_updates_read_their_catches_in_batches(catches):
+    rows = [(1, '', f'2025-05-{day % 28 + 1:02d}T06:00', 'Beach', 'Eel', '30 in', '10 lb', 'Pending', 'Full Moon',
+             None, None, 'importing') for day in range(1200)]
+    catches.add_many(rows)
+    conn = catches.pool.connect()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        catches.set_tides([(catch_id, f'{catch_id % 5}.5 ft') for catch_id in range(1, 1201)])
+    finally:
+        conn.set_trace_callback(None)
+        conn.close()
+    assert sum(sql.startswith('SELECT') for sql in statements) == 3
+    assert stored(catches, 1) == rescan(catches, 1)
+
+def test_summary_orders_buckets(catches):
+    for date, lure, phase in [('2025-05-01T06:30', 'Eel', 'Full Moon'), ('2025-05-01T22:00', 'Eel', 'New Moon'),
+                              ('2025-04-01T06:00', 'Bucktail', 'Full Moon')]:
+        catches.add(1, '', date, 'Beach', lure, '30 in', '10 lb', '1.2 ft', phase, None, None)
+    summary = summarize(catches.analytics(1))
+    assert summary['total'] == 3
+    assert [b['bucket'] for b in summary['by']['moon_phase']] == ['New Moon', 'Full Moon']
+    assert [(b['bucket'], b['catches']) for b in summary['by']['lure']] == [('eel', 2), ('bucktail', 1)]
+    assert [b['bucket'] for b in summary['by']['hour']] == ['06', '22']
+    assert summary['by']['tide'] == [{'bucket': '1', 'catches': 3, 'avg_size': 30.0, 'avg_weight': 10.0}]
+    assert summary['by']['location'] == []
@@ -0,0 +1,86 @@
+import gzip
+import os
+import pytest
+from flask import Flask, request
+from PIL import Image
+from assets import IMMUTABLE, AssetStore, build
+
+PAGE = '<html><body style="background: url(\'/public/static/fish.jpg\')">{}<script src="/public/static/app.js"></script></body></html>'
+BROWSER = {'Accept-Encoding': 'gzip, deflate, br', 'Accept': 'image/avif,image/webp,*/*;q=0.8'}
+
+@pytest.fixture
+def source(tmp_path):
+    static = tmp_path / 'public' / 'static'
+    (static / 'uploads').mkdir(parents=True)
+    Image.effect_noise((400, 300), 60).convert('RGB').save(static / 'fish.jpg', quality=95)
+    (static / 'app.js').write_text('function cast() { return "striper"; }\n' * 200)
+    (static / 'uploads' / 'old.png').write_bytes(b'not an asset')
+    (tmp_path / 'public' / 'dashboard.html').write_text(PAGE.format('Tight lines ' * 100))
+    return str(tmp_path / 'public')
+
+@pytest.fixture
+def client(source, tmp_path):
+    store = AssetStore(source, str(tmp_path / 'build'))
+    assert store.load()
+    app = Flask(__name__)
+
+    @app.route('/assets/<path:filename>')
+    def serve_asset(filename):
+        return store.asset(filename, request) or ('Page not found', 404)
+
+    @app.route('/')
+    def index():
+        return store.page('dashboard.html', request)
+
+    client = app.test_client()
+    client.store = store
+    return client
+
+def test_build_fingerprints_rewrites_and_is_reused(source, tmp_path):
+    out = str(tmp_path / 'build')
+    root = build(source, out)
+    names = sorted(os.listdir(os.path.join(root, 'static')))
+    assert [name.split('.', 1)[0] for name in names] == ['app'] * 3 + ['fish'] * 2
+    assert not any('old' in name for name in names)
+    page = open(os.path.join(root, 'pages', 'dashboard.html')).read()
+    assert '/public/static/' not in page and page.count('/assets/') == 2
+    with gzip.open(os.path.join(root, 'pages', 'dashboard.html.gz'), 'rt') as f:
+        assert f.read() == page
+    mtime = os.path.getmtime(os.path.join(root, 'manifest.json'))
+    assert build(source, out) == root and os.path.getmtime(os.path.join(root, 'manifest.json')) == mtime
+    with open(os.path.join(source, 'static', 'app.js'), 'a') as f:
+        f.write('// changed\n')
+    rebuilt = build(source, out)
+    assert rebuilt != root and sorted(os.listdir(out)) == sorted([os.path.basename(root), os.path.basename(rebuilt)])
+
+def test_assets_are_negotiated_and_immutable(client):
+    js, jpg = client.store.url('/public/static/app.js'), client.store.url('/public/static/fish.jpg')
+    brotli_js = client.get(js, headers=BROWSER)
+    assert brotli_js.headers['Content-Encoding'] == 'br' and brotli_js.mimetype == 'text/javascript'
+    assert brotli_js.headers['Cache-Control'] == IMMUTABLE and brotli_js.headers['Vary'] == 'Accept-Encoding'
+    gzip_js = client.get(js, headers={'Accept-Encoding': 'gzip'})
+    assert gzip_js.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(gzip_js.data).decode().startswith('function cast()')
+    plain = client.get(js, headers={'Accept-Encoding': 'br;q=0, identity'})
+    assert 'Content-Encoding' not in plain.headers and plain.data.startswith(b'function cast()')
+    webp = client.get(jpg, headers=BROWSER)
+    assert webp.mimetype == 'image/webp' and webp.data[8:12] == b'WEBP' and webp.headers['Vary'] == 'Accept'
+    assert client.get(jpg, headers={'Accept': '*/*'}).mimetype == 'image/jpeg'
+    assert client.get('/assets/fish.jpg').status_code == 404
+    assert client.get('/assets/../../public/dashboard.html').status_code == 404
+
+def test_pages_are_revalidated(client):
+    page = client.get('/', headers=BROWSER)
+    assert page.headers['Cache-Control'] == 'no-cache' and page.headers['Content-Encoding'] == 'br'
+    again = client.get('/', headers=dict(BROWSER, **{'If-None-Match': page.headers['ETag']}))
+    assert again.status_code == 304 and not again.data
+
+def test_unbuilt_sources_are_served_as_is(source, tmp_path):
+    store = AssetStore(source, str(tmp_path / 'missing'))
+    assert not store.load(build_missing=False)
+    app = Flask(__name__)
+    with app.test_request_context('/'):
+        response = store.page('dashboard.html', request)
+        response.direct_passthrough = False
+        assert b'/public/static/fish.jpg' in response.data
+    assert store.url('/public/static/fish.jpg') == '/public/static/fish.jpg'
@@ -0,0 +1,58 @@
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+import pytest
+from astronomy import (AstronomyTable, NEW_MOON_EPOCH, SYNODIC_MONTH, catch_astronomy, day_numbers, moon_illumination,
+                       moon_phase, moon_phases, moon_times, sun_times)
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+def test_batched_phases_match_the_scalar_boundaries():
+    times = [NEW_MOON_EPOCH + timedelta(days=SYNODIC_MONTH * f) for f in np.arange(-1, 2, 0.005)]
+    assert list(moon_phases(times)) == [moon_phase(t) for t in times]
+    assert moon_phase(NEW_MOON_EPOCH + timedelta(days=SYNODIC_MONTH * 0.5)) == 'Full Moon'
+    with pytest.raises(TypeError):
+        moon_phase('2025-05-12')
+
+def test_illumination_peaks_at_full_moon():
+    fraction, phase = moon_illumination([utc(2025, 5, 12, 16, 56), utc(2025, 5, 27, 3, 2)])
+    assert fraction[0] > 0.99 and fraction[1] < 0.01
+    assert phase[0] == pytest.approx(0.5, abs=0.02)
+
+def test_boston_midsummer_rise_and_set():
+    # Published times for Boston on 2025-06-21: sun 05:08/20:25 EDT, moon 01:45/16:43 EDT
+    sunrise, sunset = sun_times(day_numbers([date(2025, 6, 21)]), 42.35, -71.05)
+    moonrise, moonset = moon_times(day_numbers([date(2025, 6, 21)]), 42.35, -71.05)
+    for value, expected in ((sunrise, utc(2025, 6, 21, 9, 8)), (sunset, utc(2025, 6, 22, 0, 25)),
+                            (moonrise, utc(2025, 6, 21, 5, 45)), (moonset, utc(2025, 6, 21, 20, 43))):
+        assert abs(value[0] - expected) < 180
+
+def test_polar_days_have_no_sunrise():
+    sunrise, sunset = sun_times(day_numbers([date(2025, 6, 21), date(2025, 12, 21)]), 80.0, 15.0)
+    assert np.isnan(sunrise).all() and np.isnan(sunset).all()
+
+def test_table_computes_each_day_and_cell_once():
+    table = AstronomyTable(grid=0.1)
+    days = day_numbers([date(2025, 6, 21)] * 3 + [date(2025, 6, 23)])
+    rows = table.lookup(days, [42.31, 42.33, 42.29, 42.31], -71.05)
+    assert rows['sunrise'][0] == rows['sunrise'][1] == rows['sunrise'][2] != rows['sunrise'][3]
+    assert table.stats()['size'] == 1 and table.computed_days == 16  # one block holds both days
+    table.lookup(days, 42.3, -71.05)
+    assert table.computed_days == 16
+    earlier = table.lookup(day_numbers([date(2025, 6, 10), date(2025, 6, 21)]), 42.3, -71.05)
+    assert table.computed_days == 32 and earlier['sunrise'][1] == rows['sunrise'][0]
+    assert table.day(date(2025, 6, 21), 42.3, -71.05)['sunrise'].hour == 9
+
+def test_catch_astronomy_handles_catches_without_coordinates():
+    times = np.array(['2025-05-12T17:00', '2025-06-21T06:30'], dtype='datetime64[s]')
+    result = catch_astronomy(times, [41.5, np.nan], [-71.3, np.nan], AstronomyTable())
+    assert list(result['moon_phase']) == ['Full Moon', 'Waning Crescent']
+    assert not np.isnan(result['sunrise'][0]) and np.isnan(result['sunrise'][1])
+    assert result['illumination'][0] > 0.99
+
+def test_table_computes_only_the_blocks_asked_for():
+    table = AstronomyTable(grid=0.1)
+    table.lookup(day_numbers([date(2026, 6, 1)]), 42.3, -71.05)
+    far = table.lookup(day_numbers([date(1, 1, 2)]), 42.3, -71.05)
+    assert table.computed_days == 32 and table.stats()['size'] == 2
+    assert not np.isnan(far['illumination'][0])
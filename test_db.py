@@ -0,0 +1,86 @@
+import threading
+import time
+import pytest
+from db import ConnectionPool, PoolTimeout, SQLiteConnections
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.rollbacks = 0
+        self.broken = False
+    def cursor(self):
+        if self.broken:
+            raise RuntimeError('server closed the connection unexpectedly')
+        return self
+    def execute(self, sql):
+        pass
+    def fetchone(self):
+        return (1,)
+    def rollback(self):
+        self.rollbacks += 1
+    def close(self):
+        self.closed = 1
+
+@pytest.fixture
+def opened():
+    return []
+
+@pytest.fixture
+def pool(opened):
+    def connect():
+        opened.append(FakeConnection())
+        return opened[-1]
+    return ConnectionPool(connect, maxsize=2, timeout=0.2, max_idle=60, check_after=0)
+
+def test_reuses_released_connections(pool, opened):
+    conn = pool.connect()
+    conn.close()
+    conn.close()  # double close is harmless
+    pool.connect().close()
+    assert len(opened) == 1
+    assert opened[0].rollbacks >= 2
+    assert pool.stats()['checkouts'] == 2
+
+def test_waits_then_times_out_when_exhausted(pool):
+    first, second = pool.connect(), pool.connect()
+    with pytest.raises(PoolTimeout):
+        pool.connect()
+    threading.Timer(0.05, first.close).start()
+    third = pool.connect()
+    stats = pool.stats()
+    assert stats['timeouts'] == 1 and stats['waits'] == 1 and stats['max_wait_ms'] > 40
+    second.close()
+    third.close()
+
+def test_unhealthy_connections_are_replaced_on_checkout(pool, opened):
+    pool.connect().close()
+    opened[0].broken = True
+    pool.connect().close()
+    assert len(opened) == 2
+    assert opened[0].closed
+    assert pool.stats()['discarded'] == 1
+
+def test_idle_connections_are_reaped(pool, opened):
+    pool.max_idle = 0.01
+    pool.connect().close()
+    time.sleep(0.02)
+    pool.connect().close()
+    assert opened[0].closed and len(opened) == 2
+
+def test_sqlite_reuses_one_wal_connection_per_thread(tmp_path):
+    connections = SQLiteConnections(str(tmp_path / 'test.db'))
+    conn = connections.connect()
+    raw = conn._conn
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    conn.execute('CREATE TABLE t (x INTEGER)')
+    conn.execute('INSERT INTO t VALUES (1)')
+    conn.close()  # uncommitted work is rolled back, the connection stays open
+    again = connections.connect()
+    assert again._conn is raw
+    assert again.execute('SELECT count(*) FROM t').fetchone()[0] == 0
+    other = []
+    thread = threading.Thread(target=lambda: other.append(connections.connect()._conn))
+    thread.start()
+    thread.join()
+    assert other[0] is not raw
+    assert connections.stats()['connections'] == 2
@@ -0,0 +1,45 @@
+import csv
+import io
+import json
+import os
+import pytest
+from export import iter_csv, iter_jsonl
+
+EXPORT_ROWS = 500_000
+MEMORY_CEILING = 16 * 1024 * 1024
+
+def seed(catches, user_id, count):
+    conn = catches.pool.connect()
+    conn.execute('''WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < ?)
+        INSERT INTO catches (user_id, image, date, location, lure, size, weight, tide, moon_phase,
+            latitude, longitude, caught_at)
+        SELECT ?, '', strftime('%Y-%m-%dT%H:%M', '2025-05-01', i || ' minutes'), '41.5, -71.3', 'Bucktail',
+            '32 in', '12 lb', '2.1 ft', 'Full Moon', 41.5, -71.3,
+            strftime('%Y-%m-%d %H:%M:%S', '2025-05-01', i || ' minutes') FROM n''', (count, user_id))
+    conn.commit()
+    conn.close()
+
+def rss_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def test_jsonl_and_csv_round_trip(catches):
+    seed(catches, 1, 3)
+    seed(catches, 2, 1)
+    lines = ''.join(iter_jsonl(catches.iter_for_user(1), chunk_rows=2)).splitlines()
+    assert [json.loads(line)['lure'] for line in lines] == ['Bucktail'] * 3
+    rows = list(csv.DictReader(io.StringIO(''.join(iter_csv(catches.iter_for_user(1), chunk_rows=2)))))
+    assert len(rows) == 3 and rows[0]['size'] == '32 in' and rows[0]['latitude'] == '41.5'
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/statm'), reason='needs /proc to sample RSS')
+def test_export_memory_stays_flat_for_500k_catches(catches):
+    seed(catches, 1, EXPORT_ROWS)
+    baseline = peak = rss_bytes()
+    lines = bytes_out = 0
+    for chunk in iter_jsonl(catches.iter_for_user(1)):
+        lines += chunk.count('\n')
+        bytes_out += len(chunk)
+        peak = max(peak, rss_bytes())
+    assert lines == EXPORT_ROWS
+    assert bytes_out > 4 * MEMORY_CEILING  # far more than was ever held at once
+    assert peak - baseline < MEMORY_CEILING
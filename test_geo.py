@@ -0,0 +1,58 @@
+import random
+from datetime import datetime
+import numpy as np
+import pytest
+from geo import COVER_CELLS, PREFIX_END, cluster, cover, distances_km, encode, encode_many, hotspots
+
+def test_encode_matches_reference_geohashes():
+    assert encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    assert encode(42.6, -5.6, 5) == 'ezs42'
+    assert encode(None, -71.4) is None
+    rng = random.Random(3)
+    points = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(200)]
+    assert encode_many(*zip(*points)) == [encode(lat, lon) for lat, lon in points]
+    assert encode_many([41.5, float('nan')], [-71.3, -71.3])[1] is None
+
+@pytest.mark.parametrize('lat, lon, radius_km', [(41.45, -71.45, 5), (41.45, -71.45, 0.05), (64.1, -21.9, 30),
+                                                  (-33.9, 151.2, 120), (0.0, 179.99, 2)])
+def test_cover_contains_every_point_within_the_radius(lat, lon, radius_km):
+    prefixes = cover(lat, lon, radius_km)
+    assert len(prefixes) <= COVER_CELLS
+    rng = np.random.default_rng(7)
+    degrees = radius_km / 111.2
+    lats = lat + rng.uniform(-degrees, degrees, 5000)
+    lons = lon + rng.uniform(-degrees, degrees, 5000) / np.cos(np.radians(lat))
+    inside = distances_km(lat, lon, lats, lons) <= radius_km
+    for geohash in encode_many(lats[inside], (lons[inside] + 180) % 360 - 180):
+        assert any(prefix <= geohash < prefix + PREFIX_END for prefix in prefixes)
+
+def test_cluster_joins_neighbouring_cells_only():
+    labels = cluster([41.0, 41.0005, 41.001, 42.0, 42.0004, 10.0, 10.0],
+                     [-71.0, -71.0, -71.001, -70.0, -70.0, 179.9999, -179.9999])
+    assert labels[0] == labels[1] == labels[2] and labels[3] == labels[4] and labels[5] == labels[6]
+    assert len({labels[0], labels[3], labels[5]}) == 3
+
+def test_near_and_hotspots_agree_with_a_brute_force_scan(catches):
+    rng = random.Random(11)
+    spots = [(41.43, -71.45), (41.37, -71.49), (41.62, -71.21)]
+    rows = []
+    for i in range(600):
+        lat, lon = rng.choice(spots)
+        lat, lon = lat + rng.gauss(0, 0.0004), lon + rng.gauss(0, 0.0004)
+        rows.append((1 if i % 5 else 2, '', f'2025-07-{i % 28 + 1:02d}T06:00', '', rng.choice(['Eel', 'Bucktail']),
+                     f'{rng.randint(20, 45)} in', '', '', 'Full Moon', lat, lon, 'ready'))
+    rows.append((1, '', '2025-07-01T06:00', '', 'Eel', '', '', '', 'Full Moon', None, None, 'ready'))
+    catches.add_many(rows)
+    catches.add(1, '', '2025-07-02T05:00', '', 'Tin', '', '', '', 'Full Moon', 41.4301, -71.4501)
+    found = catches.near(1, 41.43, -71.45, 3)
+    own = [c for c in catches.for_user(1) if c.latitude is not None]
+    expected = sorted(distances_km(41.43, -71.45, [c.latitude], [c.longitude])[0] for c in own)
+    assert [round(d, 9) for _, d in found] == [round(d, 9) for d in expected if d <= 3]
+    assert all(c.user_id == 1 for c, _ in found) and len(catches.near(1, 41.43, -71.45, 3, limit=5)) == 5
+    points = catches.points_between(1, datetime(2025, 7, 1), datetime(2025, 8, 1))
+    result = hotspots(points)
+    assert [h['catches'] for h in result] == sorted((h['catches'] for h in result), reverse=True)
+    assert sum(h['catches'] for h in result) == len(points) == len(own)
+    for hotspot in result:
+        assert min(distances_km(hotspot['latitude'], hotspot['longitude'], *zip(*spots))) < 0.1
+        assert hotspot['top_lure'] in ('eel', 'bucktail', 'tin') and 20 <= hotspot['avg_size'] <= 45
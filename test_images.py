@@ -0,0 +1,57 @@
+import os
+import pytest
+from PIL import Image
+from images import ImageProcessor, file_digest, is_content_addressed, store_photo, thumbnail_names
+
+@pytest.fixture
+def uploads(tmp_path):
+    path = tmp_path / 'uploads'
+    path.mkdir()
+    return str(path)
+
+def photo(tmp_path, name='upload.png', size=(1600, 1200), color=(30, 90, 160)):
+    path = str(tmp_path / name)
+    Image.new('RGB', size, color).save(path)
+    return path
+
+def test_photo_is_stored_by_hash_with_thumbnails(tmp_path, uploads):
+    src = photo(tmp_path)
+    digest = file_digest(src)
+    filename = store_photo(src, uploads)
+    assert filename == f"{digest}.png" and is_content_addressed(filename)
+    assert not os.path.exists(src)
+    for width, names in thumbnail_names(filename):
+        for ext, name in names.items():
+            with Image.open(os.path.join(uploads, name)) as thumb:
+                assert thumb.format == {'webp': 'WEBP', 'jpg': 'JPEG'}[ext]
+                assert max(thumb.size) == width and thumb.size[0] > thumb.size[1]
+
+def test_reupload_is_deduplicated(tmp_path, uploads):
+    first = store_photo(photo(tmp_path, 'a.png'), uploads)
+    stored = sorted(os.listdir(uploads))
+    mtimes = [os.path.getmtime(os.path.join(uploads, name)) for name in stored]
+    second = photo(tmp_path, 'b.png')
+    assert store_photo(second, uploads) == first
+    assert not os.path.exists(second)
+    assert sorted(os.listdir(uploads)) == stored
+    assert [os.path.getmtime(os.path.join(uploads, name)) for name in stored] == mtimes
+
+def test_small_photos_are_not_upscaled(tmp_path, uploads):
+    filename = store_photo(photo(tmp_path, size=(200, 100)), uploads)
+    (_, names), _ = thumbnail_names(filename)
+    with Image.open(os.path.join(uploads, names['webp'])) as thumb:
+        assert thumb.size == (200, 100)
+
+def test_processor_runs_in_a_worker_process(tmp_path, uploads):
+    processor = ImageProcessor(uploads, workers=1)
+    try:
+        filename = processor.store(photo(tmp_path))
+    finally:
+        processor.shutdown()
+    assert os.path.exists(os.path.join(uploads, filename))
+    assert processor.stats() == {'workers': 1, 'stored': 1, 'failed': 0}
+
+def test_older_uploads_have_no_thumbnails():
+    assert thumbnail_names('catch_20250501063000.png') == []
+    assert not is_content_addressed('catch_20250501063000.png')
+    assert thumbnail_names('0123456789abcdef0123456789abcdef_320.webp') == []
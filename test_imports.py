@@ -0,0 +1,43 @@
+import io
+import json
+from imports import ImportReport, ImportedCatch, batched, import_format, iter_records, iter_valid
+
+CSV = b'''\xef\xbb\xbfdate,location,lure,size,weight,latitude,longitude
+2025-05-01T06:30,"41.5, -71.3",SP Minnow,32 in,12 lb,,
+2025-05-01 07:00,Beach,Eel,28,9,41.4,-71.5
+not a date,Beach,Eel,28,9,,
+2025-05-02T05:00,"Point Judith, RI",Bucktail,30,10,,
+2025-05-02T05:00,Beach,,30,10,,
+2025-05-02T05:00,Beach,Eel,30,10,95,-71
+'''
+
+def run(data, fmt, **kwargs):
+    report = ImportReport(**kwargs.pop('report', {}))
+    rows = list(iter_valid(iter_records(io.BytesIO(data), fmt), report, **kwargs))
+    return rows, report
+
+def test_csv_rows_are_validated_one_by_one():
+    rows, report = run(CSV, 'csv')
+    assert rows == [
+        ImportedCatch(2, '2025-05-01T06:30', '41.5, -71.3', 'SP Minnow', '32 in', '12 lb', 41.5, -71.3),
+        ImportedCatch(3, '2025-05-01T07:00', 'Beach', 'Eel', '28', '9', 41.4, -71.5),
+        ImportedCatch(5, '2025-05-02T05:00', 'Point Judith, RI', 'Bucktail', '30', '10', None, None),
+    ]
+    assert [(e['line'], e['error'].split(' ')[0]) for e in report.errors] == [
+        (4, 'Invalid'), (6, 'Missing'), (7, 'latitude')]
+
+def test_json_lines_report_bad_lines_and_stop_at_the_row_limit():
+    lines = [json.dumps({'date': '2025-05-01T06:30', 'location': 'Beach', 'lure': 'Eel', 'size': '1', 'weight': '2'}),
+             '[1, 2]', '{oops', '', json.dumps({'date': '2025-05-01T06:30', 'location': 'Beach', 'lure': 'Eel',
+                                                'size': '1', 'weight': '2'}), '{}']
+    rows, report = run('\n'.join(lines).encode(), 'jsonl', max_rows=4, report={'max_errors': 2})
+    assert [row.line for row in rows] == [1, 5]
+    assert report.error_count == 3 and len(report.errors) == 2
+    assert report.as_dict()['errors'][0] == {'line': 2, 'error': 'Expected a JSON object'}
+
+def test_format_and_batches():
+    assert import_format('text/csv') == 'csv'
+    assert import_format('application/x-ndjson') == 'jsonl'
+    assert import_format('text/csv', 'jsonl') == 'jsonl'
+    assert import_format('application/json') is None and import_format('text/csv', 'xml') is None
+    assert [len(b) for b in batched(range(7), 3)] == [3, 3, 1]
@@ -0,0 +1,80 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+from jobs import JobQueue, JobWorker, backoff_seconds
+
+class Clock:
+    def __init__(self):
+        self.now = datetime(2025, 5, 1, 12, 0)
+    def __call__(self):
+        return self.now
+    def advance(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def queue(pool, clock):
+    return JobQueue(pool, clock=clock)
+
+def test_jobs_run_once_and_are_removed(queue):
+    seen = []
+    worker = JobWorker(queue, {'enrich_catch': lambda payload, last: seen.append(payload)})
+    queue.enqueue('enrich_catch', {'catch_id': 1})
+    queue.enqueue('enrich_catch', {'catch_id': 2}, delay=60)
+    assert worker.run_pending() == 1
+    assert seen == [{'catch_id': 1}]
+    assert queue.counts() == {'queued': 1}
+
+def test_failures_back_off_then_fail(queue, clock):
+    calls = []
+    def flaky(payload, last_attempt):
+        calls.append(last_attempt)
+        raise ConnectionError('NOAA unavailable')
+    worker = JobWorker(queue, {'enrich_catch': flaky}, max_attempts=3, backoff=lambda attempts: 10 * attempts)
+    queue.enqueue('enrich_catch', {'catch_id': 1})
+    assert worker.run_pending() == 1
+    clock.advance(9)
+    assert worker.run_once() is None  # still backing off
+    clock.advance(1)
+    assert worker.run_once().attempts == 2
+    clock.advance(20)
+    assert worker.run_once().attempts == 3
+    assert calls == [False, False, True]
+    assert queue.counts() == {'failed': 1}
+    assert (worker.retried, worker.failed) == (2, 1)
+
+def test_unknown_kind_fails_immediately(queue):
+    worker = JobWorker(queue, {})
+    queue.enqueue('resize_photo', {})
+    worker.run_pending()
+    assert queue.counts() == {'failed': 1}
+
+def test_expired_lease_is_reclaimed(queue, clock):
+    queue.enqueue('enrich_catch', {'catch_id': 1})
+    assert queue.claim(lease=60).attempts == 1  # worker dies without finishing
+    assert queue.claim(lease=60) is None
+    clock.advance(61)
+    assert queue.claim(lease=60).attempts == 2
+
+def test_worker_thread_runs_notified_jobs(queue):
+    done = []
+    worker = JobWorker(queue, {'enrich_catch': lambda payload, last: done.append(payload)}, poll_interval=30)
+    queue.clock = lambda: datetime(2025, 5, 1, 12, 0)
+    worker.start()
+    try:
+        queue.enqueue('enrich_catch', {'catch_id': 7})
+        worker.notify()
+        deadline = time.monotonic() + 5
+        while not done and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        worker.stop(timeout=5)
+    assert done == [{'catch_id': 7}]
+
+def test_backoff_grows_and_is_capped():
+    assert 15 <= backoff_seconds(1, base=30, cap=3600) <= 30
+    assert 60 <= backoff_seconds(3, base=30, cap=3600) <= 120
+    assert backoff_seconds(20, base=30, cap=3600) <= 3600
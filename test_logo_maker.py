@@ -0,0 +1,35 @@
+import os
+import numpy as np
+from PIL import Image
+from public.static.logo_maker import key_out, main, parse_color, process_directory
+
+def image(pixels):
+    return Image.fromarray(np.array(pixels, dtype=np.uint8), 'RGB')
+
+def test_key_out_exact_and_with_tolerance():
+    img = image([[[255, 255, 255], [250, 252, 255], [10, 20, 30]]])
+    assert np.asarray(key_out(img))[0, :, 3].tolist() == [0, 255, 255]
+    assert np.asarray(key_out(img, tolerance=5))[0, :, 3].tolist() == [0, 0, 255]
+    assert np.asarray(key_out(img, color=(10, 20, 30)))[0, :, 3].tolist() == [255, 255, 0]
+    assert np.asarray(key_out(img, tolerance=5))[0, 1, :3].tolist() == [250, 252, 255]
+
+def test_parse_color():
+    assert parse_color('#ffffff') == parse_color('255,255,255') == (255, 255, 255)
+
+def test_folder_is_keyed_and_resized(tmp_path):
+    src = tmp_path / 'src'
+    src.mkdir()
+    for name in ('a.png', 'b.jpg'):
+        Image.new('RGB', (800, 400), (255, 255, 255)).save(src / name)
+    (src / 'notes.txt').write_text('not an image')
+    outputs = process_directory(str(src), str(tmp_path / 'out'), max_size=200, workers=1)
+    assert [os.path.basename(path) for path in outputs] == ['a.png', 'b.png']
+    with Image.open(outputs[0]) as keyed:
+        assert keyed.size == (200, 100) and keyed.getextrema()[3] == (0, 0)
+
+def test_cli_single_file(tmp_path, capsys):
+    Image.new('RGB', (4, 4), (255, 255, 255)).save(tmp_path / 'logo.png')
+    main([str(tmp_path / 'logo.png'), str(tmp_path / 'out.png')])
+    assert 'out.png' in capsys.readouterr().out
+    with Image.open(tmp_path / 'out.png') as keyed:
+        assert keyed.mode == 'RGBA'
@@ -0,0 +1,42 @@
+import os
+import time
+import pytest
+from metrics import Metrics, SlowRequestProfiler, render_stats
+
+def test_render_is_prometheus_text():
+    registry = Metrics()
+    with registry.timer('http_request', route='/catch', method='POST'):
+        pass
+    with pytest.raises(ValueError):
+        with registry.phase('catch', 'db_insert'):
+            raise ValueError
+    registry.observe('db_query', 0.002, statement='insert_catch')
+    text = registry.render({'noaa_predictions': {'count': 1, 'sum': 0.3, 'errors': 1, 'buckets': {'0.5': 1, '+Inf': 1}}})
+    lines = text.splitlines()
+    assert '# TYPE striperlog_http_request_duration_seconds histogram' in lines
+    assert 'striperlog_http_request_duration_seconds_count{route="/catch",method="POST"} 1' in lines
+    assert 'striperlog_phase_errors_total{operation="catch",phase="db_insert"} 1' in lines
+    assert 'striperlog_db_query_duration_seconds_bucket{statement="insert_catch",le="0.0025"} 1' in lines
+    assert 'striperlog_db_query_duration_seconds_bucket{statement="insert_catch",le="0.001"} 0' in lines
+    assert 'striperlog_upstream_request_errors_total{upstream="noaa_predictions"} 1' in lines
+
+def test_stats_become_gauges():
+    lines = render_stats({'db_pool': {'backend': 'sqlite', 'checkouts': 3, 'wait': {'p99_ms': 1.5}}, 'ok': True})
+    assert lines[2:] == ['striperlog_component_stat{component="db_pool",key="checkouts"} 3',
+                         'striperlog_component_stat{component="db_pool",key="wait.p99_ms"} 1.5']
+
+def test_profiler_dumps_collapsed_stacks_of_slow_requests_only(tmp_path):
+    profiler = SlowRequestProfiler(threshold_ms=30, interval_ms=1, directory=str(tmp_path), keep=1)
+    assert profiler.end(profiler.begin(), 'GET /fast', 0.001) is None
+    for name in ('POST /catch', 'GET /catches'):
+        token = profiler.begin()
+        started = time.perf_counter()
+        while time.perf_counter() - started < 0.05:
+            sum(range(1000))
+        path = profiler.end(token, name, time.perf_counter() - started)
+    assert os.listdir(tmp_path) == [os.path.basename(path)] and path.endswith('GET_catches.folded')
+    with open(path) as f:
+        stack, count = f.readline().rsplit(' ', 1)
+    assert 'test_profiler_dumps_collapsed_stacks_of_slow_requests_only (test_metrics.py:' in stack
+    assert int(count) > 0
+    assert profiler.stats()['dumped'] == 2 and not SlowRequestProfiler(threshold_ms=0).begin()
@@ -0,0 +1,81 @@
+import pytest
+from db import SQLiteConnections
+from migrations import MIGRATIONS, migrate
+
+LEGACY_SCHEMA = '''
+CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, password TEXT);
+CREATE TABLE catches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, image TEXT, date TEXT, location TEXT,
+    lure TEXT, size TEXT, weight TEXT, tide TEXT, moon_phase TEXT, latitude REAL, longitude REAL,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+'''
+
+@pytest.fixture
+def pool(tmp_path):
+    return SQLiteConnections(str(tmp_path / 'fishing.db'))
+
+def query(pool, sql, params=()):
+    conn = pool.connect()
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+def test_fresh_database_gets_every_migration_once(pool):
+    assert migrate(pool) == [version for version, _, _ in MIGRATIONS]
+    assert migrate(pool) == []
+    indexes = [row[1] for row in query(pool, "PRAGMA index_list('catches')")]
+    assert 'idx_catches_user_caught_at' in indexes
+
+def test_existing_rows_are_backfilled(pool):
+    conn = pool.connect()
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany('INSERT INTO catches (user_id, date, size, weight, tide) VALUES (?, ?, ?, ?, ?)', [
+        (1, '2025-04-03T13:37', '34"', '15 lbs', '2.871 ft'),
+        (1, '2025-04-04T05:10', 'big', '', 'Unknown'),
+    ])
+    conn.commit()
+    conn.close()
+    migrate(pool)
+    assert query(pool, 'SELECT caught_at, size_value, weight_value, tide_ft FROM catches ORDER BY id') == [
+        ('2025-04-03 13:37:00', 34.0, 15.0, 2.871),
+        ('2025-04-04 05:10:00', None, None, None),
+    ]
+
+def test_day_query_uses_the_composite_index(pool):
+    migrate(pool)
+    plan = query(pool, '''EXPLAIN QUERY PLAN SELECT id FROM catches
+        WHERE user_id = ? AND caught_at >= ? AND caught_at < ?''', (1, '2025-05-01', '2025-05-02'))
+    assert 'idx_catches_user_caught_at' in ' '.join(str(row[-1]) for row in plan)
+
+def test_existing_catches_are_folded_into_catch_stats(pool):
+    conn = pool.connect()
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany('INSERT INTO catches (user_id, date, lure, size, weight, tide) VALUES (?, ?, ?, ?, ?, ?)', [
+        (1, '2025-04-03T13:37', 'Eel', '34"', '15 lbs', '2.871 ft'),
+        (1, '2025-04-04T05:10', 'eel ', 'big', '', 'Unknown'),
+    ])
+    conn.commit()
+    conn.close()
+    migrate(pool)
+    assert query(pool, '''SELECT dimension, bucket, catches, sized, size_total FROM catch_stats
+        ORDER BY dimension, bucket''') == [
+        ('hour', '05', 1, 0, 0.0), ('hour', '13', 1, 1, 34.0), ('lure', 'eel', 2, 1, 34.0),
+        ('month', '04', 2, 1, 34.0), ('tide', '2', 1, 1, 34.0), ('total', 'all', 2, 1, 34.0),
+    ]
+
+def test_existing_catches_get_an_indexed_geohash(pool):
+    conn = pool.connect()
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany('INSERT INTO catches (user_id, date, latitude, longitude) VALUES (?, ?, ?, ?)', [
+        (1, '2025-04-03T13:37', 57.64911, 10.40744),
+        (1, '2025-04-04T05:10', None, None),
+    ])
+    conn.commit()
+    conn.close()
+    migrate(pool)
+    assert query(pool, 'SELECT geohash FROM catches ORDER BY id') == [('u4pruydqq',), (None,)]
+    plan = query(pool, 'EXPLAIN QUERY PLAN SELECT id FROM catches WHERE user_id = ? AND geohash >= ? AND geohash < ?',
+                 (1, 'u4pr', 'u4pr~'))
+    assert 'idx_catches_user_geohash' in ' '.join(str(row[-1]) for row in plan)
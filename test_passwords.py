@@ -0,0 +1,57 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from passwords import HasherBusy, PasswordHasher, hash_password, hash_rounds
+
+def test_hashes_and_verifies_in_worker_processes():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=1)
+    try:
+        hashed = hasher.hash('Striper2024!')
+        assert hash_rounds(hashed) == 4
+        assert hasher.verify('Striper2024!', hashed)
+        assert not hasher.verify('wrong password', hashed)
+        assert hasher.stats()['completed'] == 3
+    finally:
+        hasher.shutdown()
+
+def test_rejects_when_workers_and_queue_are_full():
+    release = threading.Event()
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=1,
+                            executor_factory=lambda: ThreadPoolExecutor(max_workers=1))
+    callers = ThreadPoolExecutor(max_workers=2)
+    try:
+        pending = [callers.submit(hasher._run, release.wait) for _ in range(2)]
+        while hasher.stats()['in_flight'] < 2:
+            time.sleep(0.001)
+        with pytest.raises(HasherBusy):
+            hasher.verify('Striper2024!', hash_password('Striper2024!', 4))
+        assert hasher.stats()['rejected'] == 1
+    finally:
+        release.set()
+        callers.shutdown()
+    assert all(future.result() for future in pending)
+    assert hasher.verify('Striper2024!', hash_password('Striper2024!', 4))
+    assert hasher.stats()['in_flight'] == 0
+    hasher.shutdown()
+
+def test_slow_hash_times_out_as_busy():
+    release = threading.Event()
+    hasher = PasswordHasher(workers=1, max_pending=0, timeout=0.05,
+                            executor_factory=lambda: ThreadPoolExecutor(max_workers=1))
+    try:
+        with pytest.raises(HasherBusy):
+            hasher._run(release.wait)
+        assert hasher.stats()['timeouts'] == 1
+    finally:
+        release.set()
+        hasher.shutdown()
+
+def test_rehash_on_login_only_when_cost_differs():
+    hasher = PasswordHasher(rounds=5, workers=0)
+    saved = []
+    old = hash_password('Striper2024!', 4)
+    assert hasher.rehash('Striper2024!', old, saved.append)
+    assert hash_rounds(saved[0]) == 5 and hasher.verify('Striper2024!', saved[0])
+    assert not hasher.rehash('Striper2024!', saved[0], saved.append)
+    assert len(saved) == 1 and hasher.stats()['rehashed'] == 1
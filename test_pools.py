@@ -0,0 +1,19 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pools import START_METHOD, ProcessPool
+
+def test_pool_runs_in_fresh_processes_started_without_fork():
+    pool = ProcessPool(1)
+    try:
+        assert pool.submit(os.getpid).result(timeout=30) != os.getpid()
+        assert pool._executor._mp_context.get_start_method() == START_METHOD != 'fork'
+    finally:
+        pool.shutdown()
+
+def test_pool_is_created_once_per_process():
+    created = []
+    pool = ProcessPool(1, executor_factory=lambda: created.append(1) or ThreadPoolExecutor(max_workers=1))
+    assert pool.submit(sum, [1, 2]).result() == 3
+    assert pool.submit(sum, [3]).result() == 3
+    assert len(created) == 1
+    pool.shutdown()
@@ -1,3 +1,6 @@
+import os
+import subprocess
+import sys
 import pytest
 from datetime import datetime, timezone, timedelta
 from project import get_moon_phase
@@ -70,5 +73,35 @@ def test_invalid_date_type():
         get_moon_phase("not_a_date")  # should raise an error due to invalid subtraction
 
 
-# note to self further study pytest syntax this took way too much time and research.
+# importing the module must not touch the database or start threads
+def test_import_leaves_startup_to_create_app():
+    import project
+    assert project.startup['import_seconds'] > 0
+    assert project.startup['create_app_seconds'] is None
+    assert project.job_worker.thread is None
+
+# a production deploy without its secrets must fail when the app is imported, not on every request
+def test_import_fails_without_production_config():
+    env = {key: value for key, value in os.environ.items() if key not in ('FLASK_ENV', 'SECRET_KEY', 'DATABASE_URL')}
+    for missing, extra in (('SECRET_KEY', {}), ('DATABASE_URL', {'SECRET_KEY': 'secret'})):
+        result = subprocess.run([sys.executable, '-c', 'import project'], env={**env, **extra}, capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        assert result.returncode != 0 and missing in result.stderr
+
+
+# only /catch spools and sniffs photos; a file posted to any other form is left alone
+def test_non_image_file_on_other_routes_is_not_rejected(tmp_path):
+    code = ("import io, project\n"
+            "project.create_app(migrate_db=True, start_threads=False)\n"
+            "response = project.app.test_client().post('/register', content_type='multipart/form-data', data={\n"
+            "    'username': 'angler', 'password': 'Sup3r-secret!', 'confirm_password': 'Sup3r-secret!',\n"
+            "    'attachment': (io.BytesIO(b'<html>' * 5000), 'notes.html')})\n"
+            "print(response.status_code)")
+    env = dict(os.environ, FLASK_ENV='development', SECRET_KEY='test', STATION_REFRESH='0', JOB_WORKER='0',
+               SQLITE_PATH=str(tmp_path / 'fishing.db'), STATION_CATALOG_PATH=str(tmp_path / 'stations.npy'),
+               TIDE_CONSTITUENTS_PATH=str(tmp_path / 'tides.json'),
+               PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, cwd=tmp_path)
+    assert result.stdout.split()[-1] == '200', result.stderr
 
+# note to self further study pytest syntax this took way too much time and research.
@@ -0,0 +1,109 @@
+import sqlite3
+from datetime import datetime
+import pytest
+from repository import Catch, CatchEvent, CatchRepository, Statement, User, UserRepository, parse_number
+
+def test_users_round_trip(pool):
+    users = UserRepository(pool)
+    user_id = users.create('angler', 'hash')
+    assert users.by_username('angler') == User(user_id, 'angler', 'hash')
+    users.update_password(user_id, 'new-hash')
+    assert users.by_id(user_id).password == 'new-hash'
+    assert users.by_username('nobody') is None
+    with pytest.raises(sqlite3.IntegrityError):
+        users.create('angler', 'other')
+
+def test_catches_by_user_and_day(pool):
+    catches = CatchRepository(pool)
+    catches.add(1, 'a.png', '2025-05-01T06:30', '41.5, -71.3', 'SP Minnow', '32 in', '12 lb', '3.1 ft', 'Full Moon', 41.5, -71.3)
+    catches.add(1, '', '2025-05-02T19:10', 'Beach', 'Bucktail', '28', '9', 'Unknown', 'Full Moon', None, None)
+    catches.add(2, '', '2025-05-01T07:00', 'Beach', 'Eel', '40', '25', 'Unknown', 'Full Moon', None, None)
+    day = catches.for_user_on_date(1, '2025-05-01')
+    assert len(day) == 1 and isinstance(day[0], Catch)
+    assert (day[0].lure, day[0].latitude) == ('SP Minnow', 41.5)
+    assert [c.date for c in catches.for_user(1)] == ['2025-05-01T06:30', '2025-05-02T19:10']
+    conn = pool.connect()
+    typed = conn.execute('SELECT caught_at, size_value, weight_value, tide_ft FROM catches WHERE id = 1').fetchone()
+    conn.close()
+    assert typed == ('2025-05-01 06:30:00', 32.0, 12.0, 3.1)
+
+def test_parse_number():
+    assert parse_number('32 in') == 32.0
+    assert parse_number('3.456 ft') == 3.456
+    assert parse_number('-0.4 ft') == -0.4
+    assert parse_number('Unknown') is None
+
+class FakePostgresConnection:
+    def __init__(self):
+        self.prepared = set()
+        self.executed = []
+    def cursor(self):
+        return FakeCursor(self)
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+    def execute(self, sql, params=()):
+        self.connection.executed.append((sql, tuple(params)))
+    def fetchone(self):
+        return (7, 'angler', 'hash')
+
+class FakePostgresPool:
+    backend = 'postgres'
+    def __init__(self):
+        self.conn = FakePostgresConnection()
+    def connect(self):
+        conn = self.conn
+        conn.close = lambda: None
+        return conn
+
+def test_postgres_hot_queries_are_prepared_once_per_connection():
+    pool = FakePostgresPool()
+    users = UserRepository(pool)
+    assert users.by_username('angler').id == 7
+    users.by_username('angler')
+    assert pool.conn.executed == [
+        ('PREPARE user_by_username AS SELECT id, username, password FROM users WHERE username = $1', ()),
+        ('EXECUTE user_by_username (%s)', ('angler',)),
+        ('EXECUTE user_by_username (%s)', ('angler',)),
+    ]
+
+def test_statement_rendering():
+    statement = Statement('s', 'SELECT * FROM t WHERE a = ? AND b LIKE ?')
+    assert statement.render('sqlite') == 'SELECT * FROM t WHERE a = ? AND b LIKE ?'
+    assert statement.render('postgres') == 'SELECT * FROM t WHERE a = %s AND b LIKE %s'
+    assert statement.prepare_sql() == 'SELECT * FROM t WHERE a = $1 AND b LIKE $2'
+
+def test_events_by_range_and_keyset_pages(pool):
+    catches = CatchRepository(pool)
+    for date in ['2025-04-20T05:00', '2025-05-01T06:30', '2025-05-01T06:30', '2025-05-20T08:15', '2025-06-02T09:00']:
+        catches.add(1, '', date, 'Beach', 'Eel', '30', '10', 'Unknown', 'Full Moon', None, None)
+    may = catches.events(1, datetime(2025, 5, 1), datetime(2025, 6, 1))
+    assert [e.id for e in may] == [2, 3, 4]
+    assert may[0] == CatchEvent(2, '2025-05-01T06:30', datetime(2025, 5, 1, 6, 30))
+    assert len(catches.events(1)) == 5
+
+    pages, after = [], None
+    while True:
+        page = catches.events_page(1, 2, after=after)
+        if not page:
+            break
+        pages.append([e.id for e in page])
+        after = (page[-1].caught_at, page[-1].id)
+    assert pages == [[1, 2], [3, 4], [5]]
+
+def test_bulk_insert_and_status_batches(pool):
+    catches = CatchRepository(pool)
+    rows = [(1, '', f'2025-05-0{day}T06:30', 'Beach', 'Eel', '30 in', '10 lb', 'Pending', 'Full Moon', 41.5, -71.3,
+             'importing') for day in range(1, 6)]
+    assert catches.add_many(rows) == 5
+    first = catches.with_status(1, 'importing', limit=3)
+    assert [c.id for c in first] == [1, 2, 3]
+    assert [c.id for c in catches.with_status(1, 'importing', after_id=3)] == [4, 5]
+    catches.set_tides([(1, '2.5 ft'), (2, 'Unknown')])
+    assert [(c.tide, c.status) for c in catches.for_user(1)][:3] == [('2.5 ft', 'ready'), ('Unknown', 'ready'),
+                                                                     ('Pending', 'importing')]
+    conn = pool.connect()
+    typed = conn.execute('SELECT caught_at, size_value, tide_ft FROM catches WHERE id = 1').fetchone()
+    conn.close()
+    assert typed == ('2025-05-01 06:30:00', 30.0, 2.5)
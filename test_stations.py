@@ -0,0 +1,89 @@
+import os
+import random
+from math import radians, sin, cos, sqrt, atan2
+import numpy as np
+import pytest
+from stations import StationCatalog, StationIndex, load_catalog, save_catalog
+
+# reference great-circle distance, same formula as project.haversine
+def haversine(lat1, lon1, lat2, lon2):
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
+    return 6371 * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+@pytest.fixture
+def stations():
+    rng = random.Random(42)
+    return [{'id': str(8400000 + i), 'name': f'Station {i}',
+             'lat': str(rng.uniform(-60, 70)), 'lng': str(rng.uniform(-180, 180))}
+            for i in range(3000)]
+
+def brute_force(stations, lat, lon):
+    return sorted((haversine(lat, lon, float(s['lat']), float(s['lng'])), s['id']) for s in stations)
+
+def test_nearest_matches_linear_scan(stations):
+    index = StationIndex.from_stations(stations)
+    rng = random.Random(7)
+    for _ in range(200):
+        lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        station, distance = index.nearest(lat, lon)[0]
+        expected_distance, expected_id = brute_force(stations, lat, lon)[0]
+        assert station['id'] == expected_id
+        assert distance == pytest.approx(expected_distance, abs=1e-6)
+
+def test_k_nearest_ordered(stations):
+    index = StationIndex.from_stations(stations)
+    matches = index.nearest(41.5, -71.3, k=5)
+    assert [s['id'] for s, _ in matches] == [i for _, i in brute_force(stations, 41.5, -71.3)[:5]]
+    distances = [d for _, d in matches]
+    assert distances == sorted(distances)
+
+def test_query_many_matches_single_queries(stations):
+    index = StationIndex.from_stations(stations)
+    lats, lons = [10.0, -33.9, 41.5], [179.9, 18.4, -71.3]
+    positions, distances = index.query_many(lats, lons)
+    for lat, lon, position, distance in zip(lats, lons, positions, distances):
+        (expected, expected_distance), = index.query(lat, lon)
+        assert position == expected
+        assert distance == pytest.approx(expected_distance, abs=1e-3)
+
+def test_skips_bad_coordinates_and_handles_empty():
+    index = StationIndex.from_stations([{'id': '1', 'lat': 'n/a', 'lng': '0'}, {'id': '2', 'lat': 1, 'lng': 2}])
+    assert len(index) == 1
+    assert index.nearest(0, 0)[0][0]['id'] == '2'
+    assert StationIndex.from_stations([]).nearest(0, 0) == []
+
+def test_catalog_round_trip_is_memory_mapped(stations, tmp_path):
+    path = str(tmp_path / 'stations.npy')
+    assert save_catalog(stations, path) == 3000
+    ids, lats, lons = load_catalog(path)
+    assert isinstance(lats, np.memmap) and lats.flags['C_CONTIGUOUS']
+    index = StationIndex(ids, lats, lons)
+    assert index.nearest(41.5, -71.3)[0][0]['id'] == brute_force(stations, 41.5, -71.3)[0][1]
+    assert load_catalog(str(tmp_path / 'missing.npy')) is None
+
+def test_catalog_refreshes_in_background_when_missing(stations, tmp_path):
+    path = str(tmp_path / 'stations.npy')
+    catalog = StationCatalog(path, fetch=lambda: stations)
+    assert len(catalog.load()) == 0
+    catalog.refresh_thread.join(timeout=10)
+    assert len(catalog.index) == 3000
+    assert catalog.stats()['stale'] is False
+    assert not os.path.exists(path + '.lock')
+
+def test_catalog_load_can_leave_the_refresh_for_later(stations, tmp_path):
+    catalog = StationCatalog(str(tmp_path / 'stations.npy'), fetch=lambda: stations)
+    assert len(catalog.load(refresh=False)) == 0
+    assert catalog.refresh_thread is None
+    catalog.refresh_if_stale().join(timeout=10)
+    assert len(catalog.index) == 3000
+    assert catalog.refresh_if_stale() is None
+
+def test_catalog_refresh_can_be_disabled(tmp_path):
+    def fetch():
+        raise AssertionError('network fetch should be skipped')
+    catalog = StationCatalog(str(tmp_path / 'stations.npy'), refresh=False, fetch=fetch)
+    assert len(catalog.load()) == 0
+    assert catalog.refresh_thread is None
+    assert catalog.stats() == {'stations': 0, 'age_seconds': None, 'stale': True}
@@ -0,0 +1,102 @@
+import json
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pytest
+from tides import TideEngine, TidePredictionCache, TideStation, local_to_utc_seconds, to_unix_seconds
+
+M2_PERIOD_HOURS = 360 / 28.9841042
+
+# constituents in the shape NOAA's harcon endpoint provides (amplitude ft, Greenwich phase deg)
+FIXTURE = {
+    'stations': {
+        '8443970': {
+            'name': 'Boston, MA',
+            'datum_offset': 5.09,
+            'utc_offset': -5,
+            'observes_dst': True,
+            'constituents': {
+                'M2': [4.52, 110.9], 'N2': [1.03, 79.4], 'S2': [0.71, 151.6], 'K1': [0.46, 200.1],
+                'O1': [0.37, 185.0], 'K2': [0.19, 148.2], 'M4': [0.09, 47.3], 'XX9': [1.0, 0.0],
+            },
+        },
+    },
+}
+
+@pytest.fixture
+def engine(tmp_path):
+    path = tmp_path / 'tide_constituents.json'
+    path.write_text(json.dumps(FIXTURE))
+    return TideEngine.load(str(path))
+
+def test_loads_fixture_and_skips_unknown_constituents(engine):
+    assert '8443970' in engine
+    assert 'XX9' not in engine.get('8443970').names
+    assert engine.predict('0000000', [datetime(2024, 6, 1)]) is None
+
+def test_missing_file_gives_empty_engine(tmp_path):
+    assert len(TideEngine.load(str(tmp_path / 'missing.json'))) == 0
+
+def test_s2_peaks_at_greenwich_midnight():
+    # V(S2) is zero at 00:00 UT, so a zero phase lag gives a crest then
+    station = TideStation('s2', {'S2': [1.0, 0.0]}, datum_offset=2.0)
+    midnight = datetime(2024, 3, 14, tzinfo=timezone.utc).timestamp()
+    heights = station.predict_utc([midnight, midnight + 3 * 3600])
+    assert heights[0] == pytest.approx(3.0)
+    assert heights[1] == pytest.approx(2.0, abs=1e-9)
+
+def test_m2_repeats_every_m2_period():
+    station = TideStation('m2', {'M2': [3.0, 42.0]})
+    start = datetime(2024, 7, 4, tzinfo=timezone.utc).timestamp()
+    heights = station.predict_utc([start, start + M2_PERIOD_HOURS * 3600])
+    assert heights[0] == pytest.approx(heights[1], abs=1e-3)
+
+def test_batch_matches_single_predictions(engine):
+    times = [datetime(2025, 5, 1, 6, 30) + timedelta(minutes=37 * i) for i in range(50)]
+    batch = engine.predict('8443970', times)
+    singles = [engine.predict('8443970', [t])[0] for t in times]
+    np.testing.assert_allclose(batch, singles)
+
+def test_day_series_range_and_mean(engine):
+    times, heights = engine.get('8443970').day_series(datetime(2025, 5, 1))
+    assert len(times) == 241
+    assert str(times[0]) == '2025-05-01T00:00:00'
+    assert str(times[-1]) == '2025-05-02T00:00:00'
+    # semidiurnal station: about two highs and two lows around the datum offset
+    assert heights.max() - heights.min() > 5
+    assert 3.5 < heights.mean() < 6.5
+
+def test_local_time_follows_us_daylight_saving():
+    winter = to_unix_seconds([datetime(2025, 1, 15, 12, 0)])
+    summer = to_unix_seconds([datetime(2025, 7, 15, 12, 0)])
+    assert local_to_utc_seconds(winter, -5, True)[0] - winter[0] == 5 * 3600
+    assert local_to_utc_seconds(summer, -5, True)[0] - summer[0] == 4 * 3600
+    assert local_to_utc_seconds(summer, -10, False)[0] - summer[0] == 10 * 3600
+
+def test_prediction_cache_loads_each_day_once_and_interpolates(engine):
+    calls = []
+    def loader(station_id, day):
+        calls.append((station_id, day))
+        return engine.get(station_id).day_series(day)
+    cache = TidePredictionCache(loader)
+    first = datetime(2025, 5, 1, 7, 3)
+    for minutes in range(0, 600, 17):
+        when = first + timedelta(minutes=minutes)
+        expected = engine.predict('8443970', [when])[0]
+        assert cache.get('8443970', when) == pytest.approx(expected, abs=0.02)
+    assert calls == [('8443970', first.date())]
+    stats = cache.stats()
+    assert stats['misses'] == 1 and stats['hits'] == len(range(0, 600, 17)) - 1
+
+def test_prediction_cache_does_not_store_failures():
+    cache = TidePredictionCache(lambda station_id, day: None)
+    assert cache.get('1', datetime(2025, 1, 1, 12)) is None
+    assert cache.get('1', datetime(2025, 1, 1, 12)) is None
+    assert cache.stats()['size'] == 0
+
+def test_prediction_cache_batches_a_day_and_can_skip_loading(engine):
+    cache = TidePredictionCache(lambda station_id, day: engine.get(station_id).day_series(day))
+    times = np.array(['2025-05-01T06:30', '2025-05-01T18:45'], dtype='datetime64[m]')
+    assert cache.heights('8443970', times[0].astype(object).date(), times, load=False) is None
+    heights = cache.heights('8443970', times[0].astype(object).date(), times)
+    assert heights == pytest.approx(engine.predict('8443970', times), abs=0.02)
+    assert cache.stats()['size'] == 1
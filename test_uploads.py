@@ -0,0 +1,101 @@
+import base64
+import io
+import os
+import pytest
+from flask import Flask, request
+from uploads import ImageSpool, NotAnImage, UploadRejected, UploadRequest, sniff_image, spool_data_url
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 4
+JPEG = b'\xff\xd8\xff\xe0' + b'\x00' * 8
+
+@pytest.fixture
+def incoming(tmp_path):
+    return str(tmp_path / 'incoming')
+
+@pytest.fixture
+def client(incoming):
+    class TestRequest(UploadRequest):
+        incoming_dir = incoming
+        max_image_bytes = 4 * 1024 * 1024
+        image_endpoints = frozenset({'upload'})
+    app = Flask(__name__)
+    app.request_class = TestRequest
+    writes = []
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        try:
+            photo = request.files.get('photo')
+        except UploadRejected as e:
+            return str(e), e.status
+        writes.append(photo.stream.size)
+        path = photo.stream.finish()
+        if request.form.get('keep') != '1':
+            return 'not kept', 400
+        photo.stream.keep()
+        return os.path.basename(path)
+
+    @app.route('/profile', methods=['POST'])
+    def profile():
+        return request.files['resume'].read()
+
+    @app.teardown_request
+    def cleanup(error=None):
+        request.discard_uploads()
+
+    client = app.test_client()
+    client.writes = writes
+    return client
+
+def post(client, payload, **fields):
+    return client.post('/upload', data=dict(fields, photo=(io.BytesIO(payload), 'catch.png')),
+                       content_type='multipart/form-data')
+
+def test_sniff_image():
+    assert sniff_image(PNG) == 'png'
+    assert sniff_image(JPEG) == 'jpg'
+    assert sniff_image(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == 'webp'
+    assert sniff_image(b'<html><body>') is None
+
+def test_multipart_photo_is_streamed_to_disk(client, incoming):
+    payload = JPEG + os.urandom(3 * 1024 * 1024)
+    response = post(client, payload, keep='1')
+    assert response.status_code == 200
+    name = response.get_data(as_text=True)
+    assert name.endswith('.jpg') and os.listdir(incoming) == [name]
+    with open(os.path.join(incoming, name), 'rb') as f:
+        assert f.read() == payload
+
+def test_oversized_and_non_image_uploads_are_refused_mid_stream(client, incoming):
+    assert post(client, PNG + b'\x00' * (5 * 1024 * 1024), keep='1').status_code == 413
+    assert post(client, b'<html><body>' * 1000, keep='1').status_code == 415
+    assert client.writes == []
+    assert os.listdir(incoming) == []
+
+def test_files_on_other_endpoints_are_not_spooled_as_images(client, incoming):
+    response = client.post('/profile', data={'resume': (io.BytesIO(b'<html>' * 5000), 'cv.html')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200 and response.data == b'<html>' * 5000
+    assert not os.path.exists(incoming)
+
+def test_uploads_the_request_does_not_keep_are_removed(client, incoming):
+    assert post(client, PNG * 10).status_code == 400
+    assert os.listdir(incoming) == []
+
+def test_legacy_data_url_is_decoded_in_chunks(incoming):
+    payload = PNG + os.urandom(200 * 1024)
+    path = spool_data_url('data:image/png;base64,' + base64.b64encode(payload).decode(), incoming)
+    assert path.endswith('.png')
+    with open(path, 'rb') as f:
+        assert f.read() == payload
+    with pytest.raises(NotAnImage):
+        spool_data_url('data:image/png;base64,not*base64!', incoming)
+    assert spool_data_url('data:image/png;base64,', incoming) is None
+    assert os.listdir(incoming) == [os.path.basename(path)]
+
+def test_spool_never_buffers_the_payload(incoming):
+    spool = ImageSpool(incoming, max_bytes=1024)
+    spool.write(PNG)
+    with pytest.raises(UploadRejected):
+        spool.write(b'\x00' * 1024)
+    assert os.listdir(incoming) == []
@@ -0,0 +1,103 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from upstream import CircuitBreaker, CircuitOpen, LatencyHistogram, UpstreamClient
+
+class FakeUpstream(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.calls += 1
+            server.clients.add(self.client_address)
+        time.sleep(server.delay)
+        body = b'{"ok": true}'
+        self.send_response(server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeUpstream)
+    server.lock = threading.Lock()
+    server.calls, server.clients, server.delay, server.status = 0, set(), 0, 200
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    server.url = f'http://127.0.0.1:{server.server_port}/data'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+class Clock:
+    now = 1000.0
+    def __call__(self):
+        return self.now
+
+def test_breaker_opens_then_lets_one_probe_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failures=3, reset_after=30, clock=clock)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    clock.now += 30
+    assert breaker.allow() and breaker.state == 'half_open'
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+    assert breaker.stats() == {'state': 'closed', 'consecutive_failures': 0, 'opened': 2, 'rejected': 3}
+
+def test_histogram_buckets_are_cumulative():
+    histogram = LatencyHistogram(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(seconds, error=seconds > 1)
+    snapshot = histogram.snapshot()
+    assert snapshot['buckets'] == {'0.1': 1, '1.0': 3, '+Inf': 4}
+    assert snapshot['count'] == 4 and snapshot['errors'] == 1 and snapshot['sum'] == pytest.approx(4.25)
+
+def test_requests_reuse_one_connection_and_are_timed(server):
+    client = UpstreamClient()
+    for _ in range(3):
+        assert client.get(server.url, upstream='fake').json() == {'ok': True}
+    assert len(server.clients) == 1
+    stats = client.stats()
+    assert stats['latency']['fake']['count'] == 3 and stats['latency']['fake']['errors'] == 0
+    assert stats['breakers'][f'127.0.0.1:{server.server_port}']['state'] == 'closed'
+
+def test_read_timeout_and_server_errors_open_the_breaker(server):
+    clock = Clock()
+    client = UpstreamClient(read_timeout=0.2, failures=2, reset_after=30, clock=clock)
+    server.delay = 1
+    started = time.monotonic()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.get(server.url)
+    assert time.monotonic() - started < 0.9
+    server.delay, server.status = 0, 503
+    assert client.get(server.url).status_code == 503
+    calls = server.calls
+    with pytest.raises(CircuitOpen):
+        client.get(server.url)
+    assert server.calls == calls  # rejected without touching the host
+    server.status = 200
+    clock.now += 30
+    assert client.get(server.url).status_code == 200
+    assert client.breaker(f'127.0.0.1:{server.server_port}').state == 'closed'
+
+def test_client_errors_do_not_count_against_the_host(server):
+    client = UpstreamClient(failures=1)
+    server.status = 404
+    for _ in range(3):
+        assert client.get(server.url).status_code == 404
+    assert client.stats()['breakers'][f'127.0.0.1:{server.server_port}']['state'] == 'closed'
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+from upstream import UpstreamClient
+from weather import WeatherCache, WeatherUnavailable
+
+class FakeWeather(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is visible
+
+    def do_GET(self):
+        server = self.server
+        query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        with server.lock:
+            server.calls.append(query)
+            server.clients.add(self.client_address)
+        time.sleep(server.delay)
+        status, body = (503, b'{}') if server.failing else (200, json.dumps(
+            {'name': 'Narragansett', 'main': {'temp': 61.5}, 'coord': query, 'call': len(server.calls)}).encode())
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeWeather)
+    server.lock = threading.Lock()
+    server.calls, server.clients, server.delay, server.failing = [], set(), 0, False
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+class Clock:
+    now = 1000.0
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def weather(server, clock):
+    return WeatherCache('test-key', url=f'http://127.0.0.1:{server.server_port}/weather',
+                        grid=0.05, ttl=600, stale_ttl=3600, timeout=5, clock=clock)
+
+def wait_for(predicate):
+    deadline = time.monotonic() + 5
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+def test_nearby_coordinates_share_one_cached_call(weather, server):
+    data, source = weather.get(41.4312, -71.4561)
+    assert source == 'miss' and data['main']['temp'] == 61.5
+    assert server.calls[0]['lat'] == '41.4500' and server.calls[0]['lon'] == '-71.4500'
+    assert server.calls[0]['appid'] == 'test-key' and server.calls[0]['units'] == 'imperial'
+    assert weather.get(41.4411, -71.4399) == (data, 'hit')
+    weather.get(41.5, -71.4561)
+    assert len(server.calls) == 2
+    assert len(server.clients) == 1  # one pooled keep-alive connection
+
+def test_concurrent_misses_are_coalesced(weather, server):
+    server.delay = 0.2
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(weather.get(41.43, -71.45))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(server.calls) == 1
+    assert len(results) == 10 and all(data['call'] == 1 for data, _ in results)
+    assert weather.stats()['coalesced'] == 9
+
+def test_stale_is_served_while_revalidating(weather, server, clock):
+    first, _ = weather.get(41.43, -71.45)
+    clock.now += 601
+    assert weather.get(41.43, -71.45) == (first, 'stale')
+    assert wait_for(lambda: len(server.calls) == 2 and weather.get(41.43, -71.45)[1] == 'hit')
+    assert weather.get(41.43, -71.45)[0]['call'] == 2
+
+def test_stale_survives_upstream_errors_until_it_expires(weather, server, clock):
+    first, _ = weather.get(41.43, -71.45)
+    server.failing = True
+    clock.now += 601
+    assert weather.get(41.43, -71.45) == (first, 'stale')
+    assert wait_for(lambda: weather.stats()['upstream_errors'] == 1)
+    assert weather.get(41.43, -71.45) == (first, 'stale')
+    clock.now += 3600
+    with pytest.raises(WeatherUnavailable):
+        weather.get(41.43, -71.45)
+
+def test_miss_with_upstream_down_raises(weather, server):
+    server.failing = True
+    with pytest.raises(WeatherUnavailable):
+        weather.get(41.43, -71.45)
+    server.failing = False
+    assert weather.get(41.43, -71.45)[1] == 'miss'  # errors are not cached
+
+def test_impossible_coordinates_are_rejected_before_any_call(weather, server):
+    for lat, lon in ((float('inf'), 0), (float('nan'), 0), (500, 0), (0, -181)):
+        with pytest.raises(ValueError):
+            weather.get(lat, lon)
+    assert server.calls == []
+
+def test_async_misses_are_coalesced_and_revalidated_on_the_loop(weather, server, clock):
+    server.delay = 0.2
+    weather.http = UpstreamClient()
+
+    async def scenario():
+        results = await asyncio.gather(*(weather.aget(41.43, -71.45) for _ in range(10)))
+        assert await weather.aget(41.4411, -71.4399) == (results[0][0], 'hit')
+        clock.now += 601
+        assert await weather.aget(41.43, -71.45) == (results[0][0], 'stale')
+        await asyncio.sleep(0.4)
+        server.failing = True
+        with pytest.raises(WeatherUnavailable):
+            await weather.aget(42.0, -70.0)
+        await weather.http.aclose()
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(source == 'miss' and data['call'] == 1 for data, source in results)
+    assert weather.get(41.43, -71.45)[0]['call'] == 2
+    assert weather.stats()['coalesced'] == 9 and weather.stats()['upstream_errors'] == 1
+    latency = weather.http.stats()['latency']['openweathermap']
+    assert latency['count'] == 3 and latency['errors'] == 1
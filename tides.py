@@ -0,0 +1,328 @@
+"""Local tide predictions computed from cached NOAA harmonic constituents.
+
+Heights follow NOAA's harmonic method: for every constituent
+``h(t) = Z0 + sum(f * A * cos(V(t) + u - G))`` where ``A`` and ``G`` are the
+station's amplitude and Greenwich phase lag, ``V`` is the equilibrium argument
+built from Doodson numbers and ``f``/``u`` are the 18.6-year nodal corrections.
+Everything is evaluated with NumPy, so a whole day or a batch of timestamps
+costs about the same as a single prediction.
+
+Constituents are read from a local JSON file. NOAA is only needed to refresh
+that file offline::
+
+    python tides.py refresh 8443970 8454000
+"""
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from cache import TTLCache
+from upstream import NOAA_API_URL
+
+CONSTITUENTS_PATH = os.environ.get(
+    'TIDE_CONSTITUENTS_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'tide_constituents.json'))
+NOAA_METADATA_URL = NOAA_API_URL + "/mdapi/prod/webapi/stations/{station_id}{resource}.json"
+
+# Doodson numbers (tau, s, h, p, N', p1), phase offset in degrees and the nodal
+# factors they draw on as (base constituent, multiplier) pairs
+CONSTITUENTS = {
+    'M2': ((2, 0, 0, 0, 0, 0), 0, (('M2', 1),)),
+    'S2': ((2, 2, -2, 0, 0, 0), 0, ()),
+    'N2': ((2, -1, 0, 1, 0, 0), 0, (('M2', 1),)),
+    'K1': ((1, 1, 0, 0, 0, 0), 90, (('K1', 1),)),
+    'M4': ((4, 0, 0, 0, 0, 0), 0, (('M2', 2),)),
+    'O1': ((1, -1, 0, 0, 0, 0), -90, (('O1', 1),)),
+    'M6': ((6, 0, 0, 0, 0, 0), 0, (('M2', 3),)),
+    'MK3': ((3, 1, 0, 0, 0, 0), 90, (('M2', 1), ('K1', 1))),
+    'S4': ((4, 4, -4, 0, 0, 0), 0, ()),
+    'MN4': ((4, -1, 0, 1, 0, 0), 0, (('M2', 2),)),
+    'NU2': ((2, -1, 2, -1, 0, 0), 0, (('M2', 1),)),
+    'S6': ((6, 6, -6, 0, 0, 0), 0, ()),
+    'MU2': ((2, -2, 2, 0, 0, 0), 0, (('M2', 1),)),
+    '2N2': ((2, -2, 0, 2, 0, 0), 0, (('M2', 1),)),
+    'OO1': ((1, 3, 0, 0, 0, 0), 90, (('OO1', 1),)),
+    'LAM2': ((2, 1, -2, 1, 0, 0), 180, (('M2', 1),)),
+    'S1': ((1, 1, -1, 0, 0, 0), 180, ()),
+    'M1': ((1, 0, 0, 1, 0, 0), 90, ()),
+    'J1': ((1, 2, 0, -1, 0, 0), 90, (('J1', 1),)),
+    'MM': ((0, 1, 0, -1, 0, 0), 0, (('MM', 1),)),
+    'SSA': ((0, 0, 2, 0, 0, 0), 0, ()),
+    'SA': ((0, 0, 1, 0, 0, 0), 0, ()),
+    'MSF': ((0, 2, -2, 0, 0, 0), 0, (('M2', -1),)),
+    'MF': ((0, 2, 0, 0, 0, 0), 0, (('MF', 1),)),
+    'RHO': ((1, -2, 2, -1, 0, 0), -90, (('O1', 1),)),
+    'Q1': ((1, -2, 0, 1, 0, 0), -90, (('O1', 1),)),
+    'T2': ((2, 2, -3, 0, 0, 1), 0, ()),
+    'R2': ((2, 2, -1, 0, 0, -1), 180, ()),
+    '2Q1': ((1, -3, 0, 2, 0, 0), -90, (('O1', 1),)),
+    'P1': ((1, 1, -2, 0, 0, 0), -90, ()),
+    '2SM2': ((2, 4, -4, 0, 0, 0), 0, (('M2', -1),)),
+    'M3': ((3, 0, 0, 0, 0, 0), 0, (('M2', 1.5),)),
+    'L2': ((2, 1, 0, -1, 0, 0), 180, (('M2', 1),)),
+    '2MK3': ((3, -1, 0, 0, 0, 0), -90, (('M2', 2), ('K1', -1))),
+    'K2': ((2, 2, 0, 0, 0, 0), 0, (('K2', 1),)),
+    'M8': ((8, 0, 0, 0, 0, 0), 0, (('M2', 4),)),
+    'MS4': ((4, 2, -2, 0, 0, 0), 0, (('M2', 1),)),
+}
+NODAL_BASES = ('M2', 'K1', 'O1', 'K2', 'J1', 'OO1', 'MM', 'MF')
+
+def to_unix_seconds(times):
+    """Convert datetimes or datetime64 values to float UNIX seconds; naive datetimes are UTC."""
+    values = np.asarray(times)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[s]').astype(np.int64).astype(np.float64)
+    if np.issubdtype(values.dtype, np.number):
+        return values.astype(np.float64)
+    flat = [t if t.tzinfo else t.replace(tzinfo=timezone.utc) for t in values.ravel()]
+    return np.array([t.timestamp() for t in flat], dtype=np.float64).reshape(values.shape)
+
+def astronomical_arguments(seconds):
+    """Return Doodson arguments (tau, s, h, p, N', p1) in degrees and the lunar node N."""
+    days = seconds / 86400.0 - 10957.5  # days since J2000.0
+    T = days / 36525.0
+    s = 218.3164477 + 481267.88123421 * T
+    h = 280.46646 + 36000.76983 * T
+    p = 83.3532465 + 4069.0137287 * T
+    N = 125.04452 - 1934.136261 * T
+    p1 = 282.93735 + 1.71946 * T
+    tau = 15.0 * ((seconds % 86400.0) / 3600.0) + h - s
+    return np.stack((tau, s, h, p, -N, p1), axis=-1), N
+
+def nodal_corrections(N):
+    """Return arrays of nodal factors f and phase corrections u (degrees) per base constituent."""
+    N = np.radians(N)
+    cos1, cos2, cos3 = np.cos(N), np.cos(2 * N), np.cos(3 * N)
+    sin1, sin2, sin3 = np.sin(N), np.sin(2 * N), np.sin(3 * N)
+    f = {
+        'M2': 1.0004 - 0.0373 * cos1 + 0.0002 * cos2,
+        'K1': 1.0060 + 0.1150 * cos1 - 0.0088 * cos2 + 0.0006 * cos3,
+        'O1': 1.0089 + 0.1871 * cos1 - 0.0147 * cos2 + 0.0014 * cos3,
+        'K2': 1.0241 + 0.2863 * cos1 + 0.0083 * cos2 - 0.0015 * cos3,
+        'J1': 1.0129 + 0.1676 * cos1 - 0.0170 * cos2 + 0.0016 * cos3,
+        'OO1': 1.1027 + 0.6504 * cos1 + 0.0317 * cos2 - 0.0014 * cos3,
+        'MM': 1.0000 - 0.1300 * cos1 + 0.0013 * cos2,
+        'MF': 1.0429 + 0.4135 * cos1 - 0.0040 * cos2,
+    }
+    u = {
+        'M2': -2.14 * sin1,
+        'K1': -8.86 * sin1 + 0.68 * sin2 - 0.07 * sin3,
+        'O1': 10.80 * sin1 - 1.34 * sin2 + 0.19 * sin3,
+        'K2': -17.74 * sin1 + 0.68 * sin2 - 0.04 * sin3,
+        'J1': -12.94 * sin1 + 1.34 * sin2 - 0.19 * sin3,
+        'OO1': -36.68 * sin1 + 4.02 * sin2 - 0.57 * sin3,
+        'MM': np.zeros_like(N),
+        'MF': -23.74 * sin1 + 2.68 * sin2 - 0.38 * sin3,
+    }
+    return (np.stack([f[name] for name in NODAL_BASES], axis=-1),
+            np.stack([u[name] for name in NODAL_BASES], axis=-1))
+
+def us_dst_bounds(year):
+    """Return local wall-clock (start, end) datetimes of US daylight saving time for a year."""
+    march = datetime(year, 3, 1)
+    start = march + timedelta(days=(6 - march.weekday()) % 7 + 7, hours=2)
+    november = datetime(year, 11, 1)
+    end = november + timedelta(days=(6 - november.weekday()) % 7, hours=2)
+    return start, end
+
+def local_to_utc_seconds(wall_seconds, utc_offset, observes_dst):
+    """Convert local standard/daylight wall-clock seconds (NOAA's lst_ldt) to UTC seconds."""
+    wall_seconds = np.asarray(wall_seconds, dtype=np.float64)
+    shift = np.full(wall_seconds.shape, -utc_offset * 3600.0)
+    if observes_dst and wall_seconds.size:
+        years = wall_seconds.astype('datetime64[s]').astype('datetime64[Y]').astype(np.int64) + 1970
+        for year in np.unique(years):
+            start, end = us_dst_bounds(int(year))
+            start_s = start.replace(tzinfo=timezone.utc).timestamp()
+            end_s = end.replace(tzinfo=timezone.utc).timestamp()
+            in_dst = (years == year) & (wall_seconds >= start_s) & (wall_seconds < end_s)
+            shift[in_dst] -= 3600.0
+    return wall_seconds + shift
+
+class TideStation:
+    """Harmonic constituents for one station and vectorized predictions from them."""
+
+    def __init__(self, station_id, constituents, datum_offset=0.0, utc_offset=0, observes_dst=False):
+        self.station_id = str(station_id)
+        self.datum_offset = float(datum_offset)
+        self.utc_offset = float(utc_offset)
+        self.observes_dst = bool(observes_dst)
+        names = []
+        for name in constituents:
+            if name in CONSTITUENTS:
+                names.append(name)
+            else:
+                logging.warning(f"Ignoring unsupported tide constituent {name} for station {station_id}")
+        self.names = names
+        self.amplitudes = np.array([constituents[n][0] for n in names], dtype=np.float64)
+        self.phases = np.array([constituents[n][1] for n in names], dtype=np.float64)
+        self._doodson = np.array([CONSTITUENTS[n][0] for n in names], dtype=np.float64).reshape(-1, 6)
+        self._offsets = np.array([CONSTITUENTS[n][1] for n in names], dtype=np.float64)
+        self._nodal = np.zeros((len(names), len(NODAL_BASES)))
+        for row, name in enumerate(names):
+            for base, multiplier in CONSTITUENTS[name][2]:
+                self._nodal[row, NODAL_BASES.index(base)] = multiplier
+
+    def predict_utc(self, seconds):
+        """Return predicted heights above MLLW (feet) at UTC UNIX seconds."""
+        seconds = np.asarray(seconds, dtype=np.float64)
+        args, N = astronomical_arguments(seconds)
+        base_f, base_u = nodal_corrections(N)
+        f = np.exp(np.log(base_f) @ np.abs(self._nodal).T)
+        u = base_u @ self._nodal.T
+        V = args @ self._doodson.T + self._offsets
+        angles = np.radians(V + u - self.phases)
+        return self.datum_offset + (f * self.amplitudes * np.cos(angles)).sum(axis=-1)
+
+    def predict(self, local_times):
+        """Return predicted heights for wall-clock times in the station's local time zone."""
+        wall = to_unix_seconds(local_times)
+        return self.predict_utc(local_to_utc_seconds(wall, self.utc_offset, self.observes_dst))
+
+    def day_series(self, day, interval_minutes=6):
+        """Return (local datetime64 times, heights) for one local day, both midnights included."""
+        start = np.datetime64(day.strftime('%Y-%m-%d'), 's')
+        times = start + np.arange(0, 24 * 60 + 1, interval_minutes).astype('timedelta64[m]')
+        return times, self.predict(times)
+
+class TideEngine:
+    """Collection of TideStation models loaded from the local constituent file."""
+
+    def __init__(self, stations=None):
+        self.stations = {station.station_id: station for station in (stations or [])}
+
+    @classmethod
+    def load(cls, path=CONSTITUENTS_PATH):
+        """Load station constituents from JSON, returning an empty engine when the file is missing."""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            logging.warning(f"No tide constituent file at {path}; predictions will fall back to NOAA")
+            return cls()
+        stations = []
+        for station_id, entry in data.get('stations', {}).items():
+            stations.append(TideStation(
+                station_id, entry['constituents'], entry.get('datum_offset', 0.0),
+                entry.get('utc_offset', 0), entry.get('observes_dst', False)))
+        return cls(stations)
+
+    def __contains__(self, station_id):
+        return str(station_id) in self.stations
+
+    def __len__(self):
+        return len(self.stations)
+
+    def get(self, station_id):
+        return self.stations.get(str(station_id))
+
+    def predict(self, station_id, local_times):
+        """Return predicted heights for a station, or None when its constituents are not cached."""
+        station = self.get(station_id)
+        if station is None:
+            return None
+        return station.predict(local_times)
+
+class TidePredictionCache:
+    """Shared cache of daily prediction series per station, interpolated for each lookup.
+
+    The first lookup for a (station, local day) pair loads the whole day's
+    6-minute series through ``loader(station_id, day)``, which returns
+    ``(times, heights)`` or None. Later lookups for that day, from any user,
+    are answered by linear interpolation without touching the loader.
+    """
+
+    def __init__(self, loader, maxsize=512, ttl=24 * 3600):
+        self.loader = loader
+        self.series = TTLCache(maxsize, ttl)
+
+    def _series(self, station_id, day, load=True):
+        key = (str(station_id), day)
+        series = self.series.get(key)
+        if series is None and load:
+            loaded = self.loader(station_id, day)
+            if loaded is None:
+                return None
+            times, heights = loaded
+            series = (to_unix_seconds(times), np.asarray(heights, dtype=np.float64))
+            self.series.set(key, series)
+        return series
+
+    def get(self, station_id, local_time):
+        """Return the interpolated height at a naive local datetime, or None if unavailable."""
+        series = self._series(station_id, local_time.date())
+        if series is None:
+            return None
+        return float(np.interp(to_unix_seconds([local_time])[0], *series))
+
+    def heights(self, station_id, day, local_times, load=True):
+        """Return interpolated heights for many local times on one local day, or None if unavailable.
+
+        The day's series is loaded once for the whole batch; with
+        ``load=False`` only a series that is already cached is used.
+        """
+        series = self._series(station_id, day, load)
+        if series is None:
+            return None
+        return np.interp(to_unix_seconds(local_times), *series)
+
+    def stats(self):
+        return self.series.stats()
+
+# Offline refresh of the constituent cache
+def fetch_station_constituents(station_id):
+    """Fetch one station's constituents, MSL-above-MLLW offset and time zone from NOAA."""
+    from upstream import http
+    def get(resource, **params):
+        url = NOAA_METADATA_URL.format(station_id=station_id, resource=resource)
+        response = http.get(url, params=params, upstream='noaa_metadata', timeout=(http.timeout[0], 30))
+        response.raise_for_status()
+        return response.json()
+    harcon = get('/harcon', units='english')
+    datums = {d['name']: d['value'] for d in get('/datums', units='english').get('datums', [])}
+    details = get('')['stations'][0]
+    constituents = {c['name']: [c['amplitude'], c['phase_GMT']]
+                    for c in harcon['HarmonicConstituents'] if c['amplitude']}
+    return {
+        'name': details.get('name', ''),
+        'datum_offset': datums['MSL'] - datums['MLLW'],
+        'utc_offset': details.get('timezonecorr', 0),
+        'observes_dst': bool(details.get('observedst', False)),
+        'constituents': constituents,
+    }
+
+def refresh_constituents(station_ids, path=CONSTITUENTS_PATH):
+    """Fetch constituents for the given stations from NOAA and merge them into the local file."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        data = {'stations': {}}
+    for station_id in station_ids:
+        try:
+            data['stations'][str(station_id)] = fetch_station_constituents(station_id)
+            print(f"Refreshed constituents for station {station_id}")
+        except Exception as e:
+            print(f"Error refreshing constituents for station {station_id}: {e}")
+    data['refreshed_at'] = datetime.now(timezone.utc).isoformat()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+    return data
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    refresh = subcommands.add_parser('refresh', help='fetch constituents for stations from NOAA')
+    refresh.add_argument('station_ids', nargs='+')
+    refresh.add_argument('--path', default=CONSTITUENTS_PATH)
+    args = parser.parse_args(argv)
+    if args.command == 'refresh':
+        refresh_constituents(args.station_ids, args.path)
+
+if __name__ == '__main__':
+    main()
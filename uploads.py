@@ -0,0 +1,157 @@
+"""Streaming photo uploads, written to disk as they arrive and checked before they are kept."""
+import base64
+import binascii
+import os
+import uuid
+from flask import Request
+
+INCOMING_DIR = os.path.join('static', 'incoming')
+MAX_IMAGE_BYTES = int(os.environ.get('UPLOAD_MAX_IMAGE_BYTES', 10 * 1024 * 1024))
+SNIFF_BYTES = 12
+DECODE_CHUNK = 64 * 1024  # base64 characters per step, a multiple of 4
+
+class UploadRejected(Exception):
+    """Base class for uploads refused while streaming; ``status`` is the HTTP status to answer with."""
+    status = 400
+
+class ImageTooLarge(UploadRejected):
+    status = 413
+
+class NotAnImage(UploadRejected):
+    status = 415
+
+def sniff_image(head):
+    """Return the file extension for PNG, JPEG, GIF or WebP magic bytes, or None."""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+class ImageSpool:
+    """Writable upload target that streams an image to a ``.part`` file in the incoming folder.
+
+    The first bytes are sniffed and the running size is checked on every
+    write, so a non-image or oversized upload is refused before the rest of
+    it is read. ``finish()`` renames the file to its real extension, and a
+    request deletes its spools at teardown unless they were ``keep()``-ed.
+    """
+
+    def __init__(self, directory=INCOMING_DIR, max_bytes=MAX_IMAGE_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{uuid.uuid4().hex}.part")
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.kind = None
+        self.kept = False
+        self._head = b''
+        self._file = open(self.path, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise ImageTooLarge(f"Photo is larger than {self.max_bytes // (1024 * 1024)} MB")
+        if self.kind is None and len(self._head) < SNIFF_BYTES:
+            self._head += data[:SNIFF_BYTES - len(self._head)]
+            if len(self._head) == SNIFF_BYTES:
+                self._sniff()
+        return self._file.write(data)
+
+    def _sniff(self):
+        self.kind = sniff_image(self._head)
+        if self.kind is None:
+            self.discard()
+            raise NotAnImage('Photo must be a PNG, JPEG, GIF or WebP image')
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def readline(self, *args):
+        return self._file.readline(*args)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def finish(self):
+        """Close the upload and return its final path, or None when it was empty."""
+        self._file.close()
+        if self.size == 0:
+            self.discard()
+            return None
+        if self.kind is None:
+            self._sniff()
+        final_path = f"{os.path.splitext(self.path)[0]}.{self.kind}"
+        os.replace(self.path, final_path)
+        self.path = final_path
+        return final_path
+
+    def keep(self):
+        """Hand the finished file over to the caller so request teardown leaves it alone."""
+        self.kept = True
+        return self.path
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def spool_data_url(image_data, directory=INCOMING_DIR, max_bytes=MAX_IMAGE_BYTES):
+    """Decode a legacy ``data:image/...;base64,`` form value to the incoming folder in chunks.
+
+    Returns the spooled path, or None for an empty image.
+    """
+    comma_index = image_data.find(',')
+    if comma_index == -1:
+        raise NotAnImage('Photo data is not a data URL')
+    spool = ImageSpool(directory, max_bytes)
+    try:
+        for start in range(comma_index + 1, len(image_data), DECODE_CHUNK):
+            spool.write(base64.b64decode(image_data[start:start + DECODE_CHUNK]))
+        return spool.finish()
+    except binascii.Error as e:
+        spool.discard()
+        raise NotAnImage(f"Photo data is not valid base64: {e}")
+    except Exception:
+        spool.discard()
+        raise
+
+class UploadRequest(Request):
+    """Request whose multipart file fields stream into ImageSpools on photo upload endpoints.
+
+    Werkzeug does not tell the stream factory which field a file belongs to,
+    so spooling is chosen per endpoint; files posted anywhere else get
+    Werkzeug's default stream and are never checked as images.
+    """
+
+    incoming_dir = INCOMING_DIR
+    max_image_bytes = MAX_IMAGE_BYTES
+    image_endpoints = frozenset({'catch'})
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint not in self.image_endpoints:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        spool = ImageSpool(self.incoming_dir, self.max_image_bytes)
+        self.__dict__.setdefault('spools', []).append(spool)
+        return spool
+
+    def discard_uploads(self):
+        """Delete any spooled upload the request did not keep."""
+        for spool in self.__dict__.pop('spools', []):
+            if not spool.kept:
+                spool.discard()
@@ -0,0 +1,238 @@
+"""Shared HTTP client for NOAA and OpenWeatherMap: pooled keep-alive, timeouts, circuit breakers and latency histograms."""
+import asyncio
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('UPSTREAM_READ_TIMEOUT', 10))
+BREAKER_FAILURES = int(os.environ.get('UPSTREAM_BREAKER_FAILURES', 5))
+BREAKER_RESET = float(os.environ.get('UPSTREAM_BREAKER_RESET', 30))
+POOL_SIZE = int(os.environ.get('UPSTREAM_POOL_SIZE', 16))
+ASYNC_POOL_SIZE = int(os.environ.get('UPSTREAM_ASYNC_POOL_SIZE', 256))
+# Base URL of NOAA's tide APIs; point it at a stand-in for load tests
+NOAA_API_URL = os.environ.get('NOAA_API_URL', 'https://api.tidesandcurrents.noaa.gov').rstrip('/')
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class CircuitOpen(requests.exceptions.ConnectionError):
+    """Raised without contacting a host whose circuit breaker is open."""
+
+class CircuitBreaker:
+    """Per-host breaker: opens after ``failures`` consecutive failures and half-opens after ``reset_after`` seconds.
+
+    While half-open a single probe request is let through; its success closes
+    the breaker and its failure opens it for another ``reset_after`` seconds.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET, clock=time.monotonic):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.clock = clock
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.opened = 0
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'open' and self.clock() - self.opened_at >= self.reset_after:
+                self.state = 'half_open'
+                self._probing = False
+            if self.state == 'closed' or (self.state == 'half_open' and not self._probing):
+                self._probing = self.state == 'half_open'
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or self.consecutive_failures >= self.failures:
+                if self.state != 'open':
+                    self.opened += 1
+                self.state = 'open'
+                self.opened_at = self.clock()
+            self._probing = False
+
+    def stats(self):
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self.consecutive_failures,
+                    'opened': self.opened, 'rejected': self.rejected}
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed bucket bounds in seconds, Prometheus style."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, error=False):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.counts[i] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+            self.sum += seconds
+            self.count += 1
+            if error:
+                self.errors += 1
+
+    def snapshot(self):
+        """Return count, sum, errors and cumulative bucket counts keyed by upper bound ('+Inf' last)."""
+        with self._lock:
+            cumulative, running = {}, 0
+            for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+                running += count
+                cumulative[str(bound)] = running
+            return {'count': self.count, 'sum': round(self.sum, 6), 'errors': self.errors, 'buckets': cumulative}
+
+class UpstreamClient:
+    """requests.Session wrapper shared by every upstream call in a process.
+
+    Each request gets ``(connect, read)`` timeouts unless it passes its own,
+    goes through its host's CircuitBreaker, and has its latency recorded
+    under an ``upstream`` name (the host by default). Connection errors,
+    timeouts, 5xx and 429 responses count as failures. The session is
+    recreated after a fork so workers never share sockets with their parent.
+
+    ``arequest`` is the same for the ASGI app's coroutines: an aiohttp
+    ClientSession per event loop, with up to ``async_pool_size`` connections,
+    sharing the breakers and histograms of the blocking calls.
+    """
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, failures=BREAKER_FAILURES,
+                 reset_after=BREAKER_RESET, pool_size=POOL_SIZE, async_pool_size=ASYNC_POOL_SIZE, clock=time.monotonic):
+        self.timeout = (connect_timeout, read_timeout)
+        self.failures = failures
+        self.reset_after = reset_after
+        self.pool_size = pool_size
+        self.async_pool_size = async_pool_size
+        self.clock = clock
+        self.breakers = {}
+        self.histograms = {}
+        self._session = None
+        self._pid = None
+        self._async_session = None
+        self._async_loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session, self._pid = session, os.getpid()
+            return self._session
+
+    def breaker(self, host):
+        with self._lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(self.failures, self.reset_after, self.clock)
+            return self.breakers[host]
+
+    def histogram(self, upstream):
+        with self._lock:
+            if upstream not in self.histograms:
+                self.histograms[upstream] = LatencyHistogram()
+            return self.histograms[upstream]
+
+    @property
+    def async_session(self):
+        """The aiohttp.ClientSession for the running event loop, created on first use in it."""
+        import aiohttp
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.async_pool_size)
+            self._async_session, self._async_loop = aiohttp.ClientSession(connector=connector), loop
+        return self._async_session
+
+    def _start(self, url, upstream):
+        host = urlsplit(url).netloc
+        breaker = self.breaker(host)
+        if not breaker.allow():
+            raise CircuitOpen(f"Circuit breaker for {host} is open")
+        return breaker, self.histogram(upstream or host), time.perf_counter()
+
+    @staticmethod
+    def _finish(breaker, histogram, started, status=None):
+        failed = status is None or status >= 500 or status == 429
+        histogram.observe(time.perf_counter() - started, error=failed)
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def request(self, method, url, upstream=None, timeout=None, **kwargs):
+        breaker, histogram, started = self._start(url, upstream)
+        try:
+            response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+        except requests.RequestException:
+            self._finish(breaker, histogram, started)
+            raise
+        self._finish(breaker, histogram, started, response.status_code)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    async def arequest(self, method, url, upstream=None, timeout=None, **kwargs):
+        """Coroutine version of request() returning an aiohttp response whose body has been read.
+
+        Failures raise aiohttp.ClientError or asyncio.TimeoutError rather than requests exceptions.
+        """
+        import aiohttp
+        if kwargs.get('params'):
+            # requests leaves out None-valued params; aiohttp refuses them
+            kwargs['params'] = {key: value for key, value in kwargs['params'].items() if value is not None}
+        breaker, histogram, started = self._start(url, upstream)
+        connect, read = timeout or self.timeout
+        try:
+            response = await self.async_session.request(
+                method, url, timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read), **kwargs)
+            await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self._finish(breaker, histogram, started)
+            raise
+        self._finish(breaker, histogram, started, response.status)
+        return response
+
+    async def aget(self, url, **kwargs):
+        return await self.arequest('GET', url, **kwargs)
+
+    async def aclose(self):
+        """Close the running event loop's aiohttp session, if it has one."""
+        if self._async_session is not None and self._async_loop is asyncio.get_running_loop():
+            await self._async_session.close()
+            self._async_session = self._async_loop = None
+
+    def stats(self):
+        with self._lock:
+            breakers, histograms = dict(self.breakers), dict(self.histograms)
+        return {
+            'latency': {name: histogram.snapshot() for name, histogram in histograms.items()},
+            'breakers': {host: breaker.stats() for host, breaker in breakers.items()},
+        }
+
+# The process-wide client every upstream call goes through
+http = UpstreamClient()
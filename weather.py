@@ -0,0 +1,197 @@
+"""Cached OpenWeatherMap proxy: grid-snapped keys, single-flight misses and stale-while-revalidate."""
+import asyncio
+import logging
+import os
+import threading
+import time
+import upstream
+from cache import TTLCache
+
+WEATHER_URL = os.environ.get('WEATHER_API_URL', 'http://api.openweathermap.org/data/2.5/weather')
+WEATHER_GRID = float(os.environ.get('WEATHER_GRID_DEGREES', 0.05))
+WEATHER_TTL = float(os.environ.get('WEATHER_CACHE_TTL', 10 * 60))
+WEATHER_STALE_TTL = float(os.environ.get('WEATHER_STALE_TTL', 60 * 60))
+WEATHER_CACHE_SIZE = int(os.environ.get('WEATHER_CACHE_SIZE', 4096))
+WEATHER_TIMEOUT = float(os.environ.get('WEATHER_TIMEOUT', 10))
+
+class WeatherUnavailable(Exception):
+    """Raised when there is no cached weather for a cell and the upstream request failed."""
+
+class _Flight:
+    """One upstream request that concurrent callers for the same cell wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class WeatherCache:
+    """Weather for a lat/lon, shared by everyone in the same grid cell.
+
+    Coordinates are snapped to a ``grid``-degree cell (0.05 degrees is about
+    5 km) and the cell centre is what gets fetched. Answers are fresh for
+    ``ttl`` seconds. After that, for up to ``stale_ttl`` seconds, the stale
+    answer is returned at once while one background request refreshes it,
+    and it keeps being served if that refresh fails. Concurrent misses for a
+    cell share a single upstream request. Requests go through the shared
+    upstream client unless another one is passed as ``http``.
+
+    ``aget`` does the same on an event loop for the ASGI app. Its misses and
+    refreshes are tasks instead of threads, so a cell's waiters hold no thread.
+    """
+
+    def __init__(self, api_key, url=WEATHER_URL, grid=WEATHER_GRID, ttl=WEATHER_TTL, stale_ttl=WEATHER_STALE_TTL,
+                 maxsize=WEATHER_CACHE_SIZE, timeout=WEATHER_TIMEOUT, http=None, clock=time.monotonic):
+        self.api_key = api_key
+        self.url = url
+        self.grid = grid
+        self.ttl = ttl
+        self.timeout = timeout
+        self.clock = clock
+        self.entries = TTLCache(maxsize, max(ttl, stale_ttl), clock)
+        self.http = http or upstream.http
+        self._flights = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+
+    def cell(self, lat, lon):
+        """Return the grid cell key for a coordinate; raises ValueError unless it is a real point on Earth."""
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError(f"Coordinates out of range: {lat}, {lon}")
+        return round(lat / self.grid), round(lon / self.grid)
+
+    def get(self, lat, lon):
+        """Return ``(weather, source)`` for a coordinate, where source is 'hit', 'stale' or 'miss'.
+
+        Raises WeatherUnavailable when nothing is cached and the upstream fails.
+        """
+        key = self.cell(lat, lon)
+        cached = self._cached(key)
+        if cached is not None:
+            if cached[1] == 'stale':
+                self._start_flight(key, background=True)
+            return cached
+        flight = self._start_flight(key)
+        if not flight.done.wait(self.timeout + 1):
+            raise WeatherUnavailable('Timed out waiting for the weather service')
+        if flight.error is not None:
+            raise WeatherUnavailable(str(flight.error))
+        return flight.result, 'miss'
+
+    async def aget(self, lat, lon):
+        """Coroutine version of get() for the ASGI app."""
+        key = self.cell(lat, lon)
+        cached = self._cached(key)
+        if cached is not None:
+            if cached[1] == 'stale':
+                self._start_task(key)
+            return cached
+        try:
+            return await asyncio.wait_for(asyncio.shield(self._start_task(key)), self.timeout + 1), 'miss'
+        except asyncio.TimeoutError:
+            raise WeatherUnavailable('Timed out waiting for the weather service')
+
+    def _cached(self, key):
+        """Return ``(data, 'hit' or 'stale')`` for a cached cell, or None after counting a miss."""
+        entry = self.entries.get(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        fetched_at, data = entry
+        fresh = self.clock() - fetched_at < self.ttl
+        with self._lock:
+            if fresh:
+                self.fresh_hits += 1
+            else:
+                self.stale_hits += 1
+        return data, 'hit' if fresh else 'stale'
+
+    def _start_flight(self, key, background=False):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight
+            flight = self._flights[key] = _Flight()
+        if background:
+            threading.Thread(target=self._fly, args=(key, flight), name='weather-refresh', daemon=True).start()
+        else:
+            self._fly(key, flight)
+        return flight
+
+    def _fly(self, key, flight):
+        try:
+            flight.result = self.fetch(*key)
+            self.entries.set(key, (self.clock(), flight.result))
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.upstream_errors += 1
+            logging.warning(f"Weather request for cell {key} failed: {e}")
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _start_task(self, key):
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is not None:
+                self.coalesced += 1
+                return task
+            task = self._tasks[key] = asyncio.ensure_future(self._afly(key))
+        # Background refreshes are never awaited; retrieve their errors so asyncio does not warn
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _afly(self, key):
+        try:
+            data = await self.afetch(*key)
+            self.entries.set(key, (self.clock(), data))
+            return data
+        except Exception as e:
+            with self._lock:
+                self.upstream_errors += 1
+            logging.warning(f"Weather request for cell {key} failed: {e}")
+            raise WeatherUnavailable(str(e))
+        finally:
+            with self._lock:
+                del self._tasks[key]
+
+    def _request(self, lat_cell, lon_cell):
+        with self._lock:
+            self.upstream_calls += 1
+        params = {'lat': f"{lat_cell * self.grid:.4f}", 'lon': f"{lon_cell * self.grid:.4f}",
+                  'appid': self.api_key, 'units': 'imperial'}
+        return {'params': params, 'upstream': 'openweathermap', 'timeout': (upstream.CONNECT_TIMEOUT, self.timeout)}
+
+    def fetch(self, lat_cell, lon_cell):
+        """Fetch the current weather at a cell's centre from OpenWeatherMap."""
+        response = self.http.get(self.url, **self._request(lat_cell, lon_cell))
+        response.raise_for_status()
+        return response.json()
+
+    async def afetch(self, lat_cell, lon_cell):
+        response = await self.http.aget(self.url, **self._request(lat_cell, lon_cell))
+        response.raise_for_status()
+        return await response.json()
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'fresh_hits': self.fresh_hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'upstream_calls': self.upstream_calls,
+                'upstream_errors': self.upstream_errors,
+            }
+        stats['size'] = len(self.entries)
+        return stats